@@ -2,6 +2,9 @@
 
 # Classes
 from la.deflarry import larry
+from la.deflabel import ArrayLabel, RangeLabel
+from la.deflazy import lazy
+from la.defgrouper import Grouper
 
 try:
     from la.io import IO
@@ -26,6 +29,7 @@ except (ImportError, ValueError):
     
 try:
     # Namespace cleaning
-    del deflarry, flabel, func, io, missing, testing, util, version
+    del (deflabel, deflarry, deflazy, defgrouper, flabel, func, io, missing,
+         testing, util, version)
 except:
     pass     
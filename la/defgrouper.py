@@ -0,0 +1,240 @@
+"Group by operations on larrys that reuse one factorization of the groups"
+
+import numpy as np
+import bottleneck as bn
+
+from la.deflarry import larry
+from la.farray.group import (unique_group, _group2d, _groupunfactor,
+                             _groupsegments, _groupmean, _groupsum,
+                             _groupcount, _groupstd, _groupreduce,
+                             _groupranking)
+
+__all__ = ['Grouper']
+
+
+class Grouper(object):
+    """
+    Group membership, factorized once, for repeated group operations.
+
+    The larry methods group_mean, group_median and group_ranking align the
+    group larry to the larry and find the unique groups on every call. A
+    Grouper does that work once: the group of each label is coded as an
+    integer when the Grouper is created, and the codes (and the order that
+    sorts the elements by group) of a label along `axis` are kept and
+    reused as long as the larrys passed to the Grouper have that label.
+
+    Each group operation returns a larry with the label of the input where
+    every element is replaced by the statistic of its group along `axis`;
+    elements whose group is None are NaN. The results of mean, median and
+    ranking are identical to those of the larry methods group_mean,
+    group_median and group_ranking.
+
+    Parameters
+    ----------
+    group : larry
+        A 1d larry of the group (e.g. sector) of each label. Use None for
+        labels that are not in a group.
+    axis : int, {default: 0}
+        The axis of the larrys that the groups are along.
+
+    Attributes
+    ----------
+    groups : list
+        The unique groups, sorted, not including None.
+    axis : int
+        The axis of the larrys that the groups are along.
+
+    Examples
+    --------
+    >>> group = larry(['a', 'b', 'a'], [['x', 'y', 'z']])
+    >>> grouper = la.Grouper(group)
+    >>> lar = larry([1.0, 2.0, 4.0], [['x', 'y', 'z']])
+    >>> grouper.mean(lar)
+    label_0
+        x
+        y
+        z
+    x
+    array([ 2.5,  2. ,  2.5])
+    >>> grouper.demean(lar)
+    label_0
+        x
+        y
+        z
+    x
+    array([-1.5,  0. ,  1.5])
+
+    """
+
+    def __init__(self, group, axis=0):
+        if not isinstance(group, larry):
+            raise TypeError, 'group must be a larry'
+        if group.ndim != 1:
+            raise ValueError, 'group must be a 1d larry'
+        groups = group.x.tolist()
+        self.groups = unique_group(groups)
+        self.axis = axis
+        code = dict(zip(self.groups, range(len(self.groups))))
+        self._code = dict((lab, code.get(g, -1)) for lab, g in
+                          zip(group._label[0], groups))
+        # Factorization of the last label seen; see _factor
+        self._label = None
+        self._factors = None
+
+    # Group operations ------------------------------------------------------
+
+    def mean(self, lar):
+        """
+        Group mean of each element of `lar`, ignoring NaNs.
+
+        Parameters
+        ----------
+        lar : larry
+            Input data. The labels along `axis` must be a subset of the
+            labels of the group larry.
+
+        Returns
+        -------
+        y : larry
+            A larry with the label of `lar` where every element is replaced
+            by the mean of its group.
+
+        """
+        return self._apply(lar, _groupmean)
+
+    def median(self, lar):
+        "Group median of each element of `lar`, ignoring NaNs."
+        return self._reduce(lar, bn.nanmedian)
+
+    def ranking(self, lar, norm='-1,1'):
+        """
+        Ranking of each element of `lar` within its group.
+
+        Parameters
+        ----------
+        lar : larry
+            Input data. The labels along `axis` must be a subset of the
+            labels of the group larry.
+        norm : str
+            A string that specifies the normalization:
+            '0,N-1'     Zero to N-1 ranking
+            '-1,1'      Scale zero to N-1 ranking to be between -1 and 1
+            'gaussian'  Rank data then scale to a Gaussian distribution
+
+        Returns
+        -------
+        y : larry
+            The ranked data, see la.farray.group_ranking.
+
+        """
+        def func(xt, rows, codes, ng, srows, bounds):
+            return _groupranking(xt, srows, bounds, norm)
+        return self._apply(lar, func, segments=True)
+
+    def sum(self, lar):
+        "Group sum of each element of `lar`; NaN if all NaN in the group."
+        return self._apply(lar, _groupsum)
+
+    def count(self, lar):
+        "Number of non-NaN elements in the group of each element of `lar`."
+        return self._apply(lar, _groupcount)
+
+    def min(self, lar):
+        "Group minimum of each element of `lar`, ignoring NaNs."
+        return self._reduce(lar, bn.nanmin)
+
+    def max(self, lar):
+        "Group maximum of each element of `lar`, ignoring NaNs."
+        return self._reduce(lar, bn.nanmax)
+
+    def std(self, lar, ddof=0):
+        """
+        Group standard deviation of each element of `lar`, ignoring NaNs.
+
+        Parameters
+        ----------
+        lar : larry
+            Input data. The labels along `axis` must be a subset of the
+            labels of the group larry.
+        ddof : int, optional
+            Means Delta Degrees of Freedom. The divisor used in the
+            calculation is N - ddof, where N represents the number of
+            non-NaN elements in the group. By default ddof is zero.
+
+        Returns
+        -------
+        y : larry
+            A larry with the label of `lar` where every element is replaced
+            by the standard deviation of its group.
+
+        """
+        def func(xt, rows, codes, ng):
+            return _groupstd(xt, rows, codes, ng, ddof)
+        return self._apply(lar, func)
+
+    def demean(self, lar):
+        "Subtract the group mean from each element of `lar`."
+        y = self.mean(lar)
+        np.subtract(lar.x, y.x, y.x)
+        return y
+
+    def zscore(self, lar):
+        """
+        Group z-score of each element of `lar`.
+
+        The group mean is subtracted from each element and the result is
+        divided by the standard deviation (ddof=0) of the group.
+
+        """
+        y = self.demean(lar)
+        std = self.std(lar)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            np.divide(y.x, std.x, y.x)
+        return y
+
+    # Utility ---------------------------------------------------------------
+
+    def _factor(self, lar):
+        """
+        Codes and sort order of the groups of the labels of `lar` along
+        `axis`: (rows, codes, ng, srows, bounds), see _groupfactor and
+        _groupsegments. The factorization of the last label is reused.
+
+        """
+        if not isinstance(lar, larry):
+            raise TypeError, 'lar must be a larry'
+        label = lar._label[self.axis]
+        if label == self._label:
+            return self._factors
+        try:
+            codes = [self._code[lab] for lab in label]
+        except KeyError:
+            raise IndexError, 'label is not a subset of group label'
+        codes = np.array(codes, dtype=np.intp)
+        ng = len(self.groups)
+        rows = np.flatnonzero(codes >= 0)
+        codes = codes[rows]
+        srows, bounds = _groupsegments(rows, codes, ng)
+        self._factors = (rows, codes, ng, srows, bounds)
+        # A copy in case the label is later changed in place
+        self._label = list(label)
+        return self._factors
+
+    def _apply(self, lar, func, segments=False):
+        "larry of func(xt, rows, codes, ng[, srows, bounds])."
+        factors = self._factor(lar)
+        if not segments:
+            factors = factors[:3]
+        xt = _group2d(lar.x, self.axis)
+        y = func(xt, *factors)
+        y = _groupunfactor(y, lar.shape, self.axis)
+        return larry(y, lar._sharelabel(), validate=False)
+
+    def _reduce(self, lar, func):
+        "larry of the reduction func(block, axis=0) of each group."
+        def reduce(xt, rows, codes, ng, srows, bounds):
+            return _groupreduce(func, xt, srows, bounds)
+        return self._apply(lar, reduce, segments=True)
+
+    def __repr__(self):
+        return 'Grouper(%d groups, axis=%d)' % (len(self.groups), self.axis)
@@ -0,0 +1,837 @@
+"Label classes"
+
+import datetime
+from itertools import islice, imap
+from operator import lt
+
+import numpy as np
+
+
+class Label(list):
+    """
+    List of the label elements along one axis of a larry.
+
+    A Label is a list. The only difference is that a Label keeps a cached
+    dictionary that maps each label element to its index and cached flags
+    that record whether the label is sorted and whether its elements are
+    unique. They are computed the first time they are needed and are thrown
+    away whenever the Label is changed in place (append, sort, item
+    assignment, etc.). So repeated lookups, such as aligning many larrys
+    against the same label, cost one dictionary lookup per element instead
+    of rebuilding the map each time.
+
+    A slice label[i:j] of a Label is a Label that keeps the unique and
+    sorted flags, so a larry made from a slice of a verified label is not
+    checked for duplicates again. Slicing with a step or with a slice
+    object gives a list; use labelslice to keep the flags.
+
+    Examples
+    --------
+    >>> from la.deflabel import Label
+    >>> label = Label(['a', 'b', 'c'])
+    >>> label.index('c')
+    2
+    >>> label.indexmap() == {'a': 0, 'b': 1, 'c': 2}
+    True
+    >>> label.append('d')
+    >>> label.index('d')
+    3
+
+    """
+
+    __slots__ = ('_indexmap', '_issorted', '_unique', '_hash', '_arraylabel',
+                 '_version')
+
+    def __init__(self, iterable=()):
+        list.__init__(self, iterable)
+        self._indexmap = None
+        self._issorted = None
+        self._unique = None
+        self._hash = None
+        self._arraylabel = None
+        # Number of times the label was changed in place
+        self._version = 0
+
+    def _changed(self):
+        "Drop the cached values; called by methods that change the label."
+        self._version += 1
+        self._indexmap = None
+        self._issorted = None
+        self._unique = None
+        self._hash = None
+        self._arraylabel = None
+
+    def indexmap(self):
+        """
+        Dictionary that maps each label element to its index.
+
+        The dictionary is cached; do not modify it. If an element appears
+        more than once the index of the first occurrence is used, which is
+        what list.index returns.
+
+        Examples
+        --------
+        >>> from la.deflabel import Label
+        >>> Label(['a', 'b']).indexmap() == {'a': 0, 'b': 1}
+        True
+
+        """
+        d = self._indexmap
+        if d is None:
+            n = len(self)
+            d = dict(zip(reversed(self), xrange(n - 1, -1, -1)))
+            self._indexmap = d
+        return d
+
+    def issorted(self):
+        """
+        True if the label elements are unique and in ascending order.
+
+        The result is cached.
+
+        Examples
+        --------
+        >>> from la.deflabel import Label
+        >>> Label([1, 2, 3]).issorted()
+        True
+        >>> Label([1, 3, 2]).issorted()
+        False
+
+        """
+        flag = self._issorted
+        if flag is None:
+            try:
+                flag = all(imap(lt, self, islice(self, 1, None)))
+            except TypeError:
+                # Elements that cannot be compared, such as dates and ints
+                flag = False
+            self._issorted = flag
+        return flag
+
+    def isunique(self):
+        """
+        True if the label elements are unique.
+
+        The result is cached. The elements must be hashable.
+
+        Examples
+        --------
+        >>> from la.deflabel import Label
+        >>> Label(['a', 'b']).isunique()
+        True
+        >>> Label(['a', 'a']).isunique()
+        False
+
+        """
+        flag = self._unique
+        if flag is None:
+            flag = self._issorted or len(frozenset(self)) == len(self)
+            self._unique = flag
+        return flag
+
+    def asarraylabel(self):
+        """
+        The label as an ArrayLabel if it is numeric, else None.
+
+        A label is numeric if its elements are all ints, all floats (none
+        of them NaN) or all datetime.date objects. The result is cached so
+        that mapping and joining numeric labels can use vectorized Numpy
+        code without converting the label each time.
+
+        Examples
+        --------
+        >>> from la.deflabel import Label
+        >>> Label([3, 1, 2]).asarraylabel()
+        ArrayLabel([3, 1, 2])
+        >>> Label([1, 2.0]).asarraylabel() is None
+        True
+
+        """
+        label = self._arraylabel
+        if label is None:
+            label = False
+            if len(self) > 0:
+                typ = type(list.__getitem__(self, 0))
+                kind = _NUMERICKINDS.get(typ)
+                if kind is not None and set(imap(type, self)) == set([typ]):
+                    label = ArrayLabel(self, kind)
+                    if kind == 'float' and np.isnan(label.values).any():
+                        label = False
+                    else:
+                        label._issorted = self._issorted
+                        label._unique = self._unique
+            self._arraylabel = label
+        if label is False:
+            return None
+        return label
+
+    def contenthash(self):
+        "Hash of the label elements; cached. The elements must be hashable."
+        h = self._hash
+        if h is None:
+            h = hash(tuple(self))
+            self._hash = h
+        return h
+
+    def index(self, value, *args):
+        "Index of the first occurrence of value; a cached lookup."
+        if args:
+            return list.index(self, value, *args)
+        try:
+            return self.indexmap()[value]
+        except KeyError:
+            raise ValueError, '%r is not in label' % (value,)
+        except TypeError:
+            # Unhashable value
+            return list.index(self, value)
+
+    def __contains__(self, value):
+        try:
+            return value in self.indexmap()
+        except TypeError:
+            return list.__contains__(self, value)
+
+    def __reduce__(self):
+        return (Label, (list(self),))
+
+    def copy(self):
+        """
+        Copy of the label that shares the cached values (index, etc.).
+
+        Examples
+        --------
+        >>> from la.deflabel import Label
+        >>> label = Label(['a', 'b'])
+        >>> label2 = label.copy()
+        >>> label2 == label, label2 is label
+        (True, False)
+
+        """
+        label = Label(self)
+        label._indexmap = self._indexmap
+        label._issorted = self._issorted
+        label._unique = self._unique
+        label._hash = self._hash
+        label._arraylabel = self._arraylabel
+        return label
+
+    # Slices label[i:j] of a Label are Labels that keep the unique and sorted
+    # flags. There is no __getitem__ so that indexing an element stays at C
+    # speed; see labelslice for slice objects.
+
+    def __getslice__(self, i, j):
+        return self._slice(list.__getslice__(self, i, j), None)
+
+    def _slice(self, items, step):
+        "Label of the sliced items with the flags that a slice preserves."
+        label = Label(items)
+        if self._unique or self._issorted:
+            label._unique = True
+            if self._issorted and (step is None or step > 0):
+                label._issorted = True
+        return label
+
+    # Methods that change the label in place must drop the cached values
+
+    def __setitem__(self, index, value):
+        self._changed()
+        list.__setitem__(self, index, value)
+
+    def __delitem__(self, index):
+        self._changed()
+        list.__delitem__(self, index)
+
+    def __setslice__(self, i, j, sequence):
+        self._changed()
+        list.__setslice__(self, i, j, sequence)
+
+    def __delslice__(self, i, j):
+        self._changed()
+        list.__delslice__(self, i, j)
+
+    def __iadd__(self, other):
+        self._changed()
+        return list.__iadd__(self, other)
+
+    def __imul__(self, n):
+        self._changed()
+        return list.__imul__(self, n)
+
+    def append(self, value):
+        self._changed()
+        list.append(self, value)
+
+    def extend(self, iterable):
+        self._changed()
+        list.extend(self, iterable)
+
+    def insert(self, index, value):
+        self._changed()
+        list.insert(self, index, value)
+
+    def pop(self, *args):
+        self._changed()
+        return list.pop(self, *args)
+
+    def remove(self, value):
+        self._changed()
+        list.remove(self, value)
+
+    def reverse(self):
+        self._changed()
+        list.reverse(self)
+
+    def sort(self, *args, **kwargs):
+        self._changed()
+        list.sort(self, *args, **kwargs)
+
+
+class ArrayLabel(object):
+    """
+    Label of an int, float or date axis stored as a 1d Numpy array.
+
+    An ArrayLabel takes much less memory than a list of Python objects and
+    lets alignment, mapping, morphing and sorting use vectorized Numpy code.
+    It has the read-only interface of a list (len, iteration, indexing,
+    slicing, index, in, ==); elements are returned as Python ints, floats
+    or datetime.date objects. datetime.date elements are stored as int64
+    ordinals. An ArrayLabel cannot be changed in place, so it can be shared
+    by larrys without copying.
+
+    Parameters
+    ----------
+    label : {list, array_like, ArrayLabel}
+        The label elements: ints, floats, or datetime.date objects.
+    kind : {None, 'int', 'float', 'date'}, optional
+        By default (None) the kind of label is found from `label`. Use
+        'date' with an array of ordinals to create a date label.
+
+    Examples
+    --------
+    >>> import datetime
+    >>> from la import larry, ArrayLabel
+    >>> d = datetime.date
+    >>> label = ArrayLabel([d(2010, 1, 1), d(2010, 1, 4), d(2010, 1, 5)])
+    >>> label.kind
+    'date'
+    >>> label[1]
+    datetime.date(2010, 1, 4)
+    >>> label.index(d(2010, 1, 5))
+    2
+    >>> y = larry([1, 2, 3], [label])
+
+    """
+
+    __slots__ = ('_values', '_kind', '_issorted', '_unique', '_sorter',
+                 '_hash')
+
+    def __init__(self, label, kind=None):
+        if type(label) is ArrayLabel:
+            values = label._values
+            if kind is None:
+                kind = label._kind
+        elif kind == 'date' or (kind is None and _isdatelist(label)):
+            if type(label) is not np.ndarray:
+                label = map(_toordinal, label)
+            values = np.array(label, dtype=np.int64)
+            kind = 'date'
+        else:
+            values = np.array(label)
+            if values.size == 0 and type(label) is not np.ndarray:
+                values = values.astype(np.int64)
+            if values.dtype.kind in 'iu':
+                values = values.astype(np.int64)
+                k = 'int'
+            elif values.dtype.kind == 'f':
+                values = values.astype(np.float64)
+                k = 'float'
+            else:
+                msg = 'ArrayLabel only supports int, float and date labels.'
+                raise TypeError, msg
+            if kind is None:
+                kind = k
+            elif kind != k:
+                raise TypeError, '`label` is not of kind %s' % kind
+        if values.ndim != 1:
+            raise ValueError, 'ArrayLabel must be 1d.'
+        if kind not in ('int', 'float', 'date'):
+            raise ValueError, 'kind must be one of int, float, date.'
+        if values.flags.writeable:
+            values.flags.writeable = False
+        self._values = values
+        self._kind = kind
+        self._issorted = None
+        self._unique = None
+        self._sorter = None
+        self._hash = None
+
+    @classmethod
+    def _fromarray(cls, values, kind):
+        "Wrap a 1d int64 or float64 array of label values without checks."
+        label = object.__new__(cls)
+        if values.flags.writeable:
+            values = values.view()
+            values.flags.writeable = False
+        label._values = values
+        label._kind = kind
+        label._issorted = None
+        label._unique = None
+        label._sorter = None
+        label._hash = None
+        return label
+
+    @property
+    def values(self):
+        "Read-only array of label values (ordinals for a date label)."
+        return self._values
+
+    @property
+    def kind(self):
+        "Kind of label: 'int', 'float', or 'date'."
+        return self._kind
+
+    def issorted(self):
+        "True if the label elements are unique and in ascending order."
+        flag = self._issorted
+        if flag is None:
+            a = self._values
+            flag = bool((a[1:] > a[:-1]).all())
+            self._issorted = flag
+        return flag
+
+    def isunique(self):
+        "True if the label elements are unique; cached."
+        flag = self._unique
+        if flag is None:
+            flag = self._issorted
+            if not flag:
+                flag = np.unique(self._values).size == self._values.size
+            self._unique = flag
+        return flag
+
+    def sorter(self):
+        "Cached stable argsort of the label values; None if label is sorted."
+        if self.issorted():
+            return None
+        if self._sorter is None:
+            self._sorter = self._values.argsort(kind='mergesort')
+        return self._sorter
+
+    def contenthash(self):
+        "Hash of the label values; cached."
+        h = self._hash
+        if h is None:
+            h = hash((self._kind, self._values.tostring()))
+            self._hash = h
+        return h
+
+    def tolist(self):
+        "Label as a list of Python ints, floats or datetime.date objects."
+        values = self._values.tolist()
+        if self._kind == 'date':
+            values = map(datetime.date.fromordinal, values)
+        return values
+
+    def take(self, indices):
+        "ArrayLabel made of the elements at the given indices."
+        return ArrayLabel._fromarray(self._values.take(indices), self._kind)
+
+    def copy(self):
+        """
+        Copy of the label.
+
+        The values are immutable, so the copy shares them (and the cached
+        values such as the sort order) with the original.
+
+        """
+        label = ArrayLabel._fromarray(self._values, self._kind)
+        label._issorted = self._issorted
+        label._unique = self._unique
+        label._sorter = self._sorter
+        label._hash = self._hash
+        return label
+
+    def index(self, value):
+        "Index of the first occurrence of value."
+        idx = self._find(value)
+        if idx < 0:
+            raise ValueError, '%r is not in label' % (value,)
+        return idx
+
+    def _find(self, value):
+        "Index of value or -1 if value is not in label."
+        if self._kind == 'date':
+            if type(value) is not datetime.date:
+                return -1
+            value = value.toordinal()
+        elif not _isnumber(value):
+            return -1
+        a = self._values
+        n = a.size
+        if n == 0:
+            return -1
+        sorter = self.sorter()
+        i = a.searchsorted(value, sorter=sorter)
+        if i == n:
+            return -1
+        if sorter is not None:
+            i = sorter[i]
+        if a[i] != value:
+            return -1
+        return int(i)
+
+    def __contains__(self, value):
+        return self._find(value) >= 0
+
+    def __len__(self):
+        return self._values.size
+
+    def __iter__(self):
+        return iter(self.tolist())
+
+    def __getitem__(self, index):
+        if type(index) is slice:
+            label = ArrayLabel._fromarray(self._values[index], self._kind)
+            if self._unique or self._issorted:
+                label._unique = True
+                step = index.step
+                if self._issorted and (step is None or step > 0):
+                    label._issorted = True
+            return label
+        value = self._values[index]
+        if type(value) is np.ndarray:
+            return ArrayLabel._fromarray(value, self._kind)
+        if self._kind == 'date':
+            return datetime.date.fromordinal(int(value))
+        return value.item()
+
+    def __eq__(self, other):
+        if type(other) is ArrayLabel:
+            if (self._kind == 'date') != (other._kind == 'date'):
+                return len(self) == 0 and len(other) == 0
+            return np.array_equal(self._values, other._values)
+        try:
+            n = len(other)
+        except TypeError:
+            return False
+        if n != len(self):
+            return False
+        return self.tolist() == list(other)
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    __hash__ = None
+
+    def __add__(self, other):
+        return self.tolist() + list(other)
+
+    def __radd__(self, other):
+        return list(other) + self.tolist()
+
+    def __repr__(self):
+        return 'ArrayLabel(%r)' % (self.tolist(),)
+
+    def __reduce__(self):
+        return (ArrayLabel, (np.array(self._values), self._kind))
+
+
+class RangeLabel(object):
+    """
+    Label of consecutive (or evenly spaced) integers such as range(n).
+
+    A RangeLabel stores only its start, stop and step, so a larry with a
+    default label (label=None) does not allocate a Python int for each
+    element. It has the read-only interface of a list (len, iteration,
+    indexing, slicing, index, in, ==); membership, index, slicing, and
+    equality with another RangeLabel take constant time. Use tolist() to
+    get a list. A RangeLabel cannot be changed in place.
+
+    Parameters
+    ----------
+    start : int
+        The first element; if `stop` is None then `start` is the stop and
+        the label starts at 0.
+    stop : {int, None}, optional
+        The label ends before `stop`.
+    step : int, optional
+        The spacing between elements, 1 by default. Cannot be 0.
+
+    Examples
+    --------
+    >>> from la import larry, RangeLabel
+    >>> label = RangeLabel(3)
+    >>> label == [0, 1, 2]
+    True
+    >>> label.index(2)
+    2
+    >>> larry([1, 2, 3]).label
+    [RangeLabel(0, 3)]
+
+    """
+
+    __slots__ = ('_start', '_step', '_len')
+
+    def __init__(self, start, stop=None, step=1):
+        if stop is None:
+            start, stop = 0, start
+        start = _asint(start)
+        stop = _asint(stop)
+        step = _asint(step)
+        if step == 0:
+            raise ValueError, 'step cannot be zero'
+        n = len(xrange(0, stop - start, step))
+        self._start = start
+        self._step = step
+        self._len = n
+
+    @property
+    def start(self):
+        "The first element of the label."
+        return self._start
+
+    @property
+    def stop(self):
+        "The label ends before stop."
+        return self._start + self._len * self._step
+
+    @property
+    def step(self):
+        "The spacing between elements."
+        return self._step
+
+    @property
+    def values(self):
+        "Label as an int64 Numpy array."
+        return np.arange(self._start, self.stop, self._step, dtype=np.int64)
+
+    def issorted(self):
+        "True if the label elements are unique and in ascending order."
+        return self._step > 0 or self._len < 2
+
+    def isunique(self):
+        "True; the elements of a RangeLabel are always unique."
+        return True
+
+    def contenthash(self):
+        "Hash of the label elements."
+        n = self._len
+        if n == 0:
+            return hash(())
+        if n == 1:
+            return hash((self._start, 1, 1))
+        return hash((self._start, self._step, n))
+
+    def tolist(self):
+        "Label as a list of ints."
+        return range(self._start, self.stop, self._step)
+
+    def take(self, indices):
+        "Label (a Label) made of the elements at the given indices."
+        start = self._start
+        step = self._step
+        return Label([start + step * i for i in indices])
+
+    def copy(self):
+        """
+        Copy of the label.
+
+        A RangeLabel is immutable so copying does not allocate the elements.
+
+        """
+        return RangeLabel(self._start, self.stop, self._step)
+
+    def index(self, value):
+        "Index of value."
+        idx = self._find(value)
+        if idx < 0:
+            raise ValueError, '%r is not in label' % (value,)
+        return idx
+
+    def _find(self, value):
+        "Index of value or -1 if value is not in label."
+        if not _isnumber(value):
+            return -1
+        i, r = divmod(value - self._start, self._step)
+        if r != 0 or i < 0 or i >= self._len:
+            return -1
+        return int(i)
+
+    def __contains__(self, value):
+        return self._find(value) >= 0
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        return iter(xrange(self._start, self.stop, self._step))
+
+    def __getitem__(self, index):
+        if type(index) is slice:
+            start, stop, step = index.indices(self._len)
+            n = len(xrange(start, stop, step))
+            label = RangeLabel(0)
+            label._start = self._start + start * self._step
+            label._step = self._step * step
+            label._len = n
+            return label
+        n = self._len
+        try:
+            i = index.__index__()
+        except AttributeError:
+            return self.take(np.arange(n)[index])
+        if i < 0:
+            i += n
+        if i < 0 or i >= n:
+            raise IndexError, 'label index out of range'
+        return self._start + i * self._step
+
+    def __eq__(self, other):
+        if type(other) is RangeLabel:
+            n = self._len
+            if n != other._len:
+                return False
+            if n == 0:
+                return True
+            if self._start != other._start:
+                return False
+            return n == 1 or self._step == other._step
+        try:
+            n = len(other)
+        except TypeError:
+            return False
+        if n != self._len:
+            return False
+        if type(other) is ArrayLabel:
+            return other == self
+        return self.tolist() == list(other)
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    __hash__ = None
+
+    def __add__(self, other):
+        return self.tolist() + list(other)
+
+    def __radd__(self, other):
+        return list(other) + self.tolist()
+
+    def __repr__(self):
+        if self._step == 1:
+            return 'RangeLabel(%d, %d)' % (self._start, self.stop)
+        return 'RangeLabel(%d, %d, %d)' % (self._start, self.stop, self._step)
+
+    def __reduce__(self):
+        return (RangeLabel, (self._start, self.stop, self._step))
+
+
+def aslabel(label):
+    """
+    Return `label` if it is a Label, ArrayLabel or RangeLabel, else copy it
+    to a Label.
+
+    Examples
+    --------
+    >>> from la.deflabel import aslabel
+    >>> aslabel(['a', 'b'])
+    ['a', 'b']
+    >>> type(aslabel(['a', 'b']))
+    <class 'la.deflabel.Label'>
+
+    """
+    typ = type(label)
+    if typ is Label or typ is ArrayLabel or typ is RangeLabel:
+        return label
+    return Label(label)
+
+def labelcopy(label):
+    """
+    Copy of the label along one axis.
+
+    Labels are copied to a Label (a list) unless `label` is an ArrayLabel
+    or a RangeLabel in which case a new ArrayLabel or RangeLabel that
+    shares the immutable values is returned. Cached values (such as the
+    index of a Label) are shared by the copy.
+
+    Examples
+    --------
+    >>> from la.deflabel import labelcopy
+    >>> label = ['a', 'b']
+    >>> label2 = labelcopy(label)
+    >>> label2 == label, label2 is label
+    (True, False)
+
+    """
+    typ = type(label)
+    if typ is Label or typ is ArrayLabel or typ is RangeLabel:
+        return label.copy()
+    return Label(label)
+
+def labelslice(label, index):
+    """
+    Slice of the label along one axis.
+
+    `index` is a slice object. The slice of a Label is a Label that keeps
+    the unique flag (and the sorted flag if the step of the slice is
+    positive); indexing a Label with a slice object gives a list.
+
+    Examples
+    --------
+    >>> from la.deflabel import Label, labelslice
+    >>> label = Label(['a', 'b', 'c'])
+    >>> label.isunique()
+    True
+    >>> labelslice(label, slice(None, None, -1))._unique
+    True
+
+    """
+    if type(label) is Label:
+        return label._slice(list.__getitem__(label, index), index.step)
+    return label[index]
+
+def _keepunique(label, sublabel):
+    """
+    Mark `sublabel`, a reordering or a subset (without repeats) of the
+    elements of `label`, as unique if `label` is known to be unique.
+
+    Returns `sublabel`.
+    """
+    if type(label) is RangeLabel:
+        unique = True
+    else:
+        # A plain list (assigned to the label of a larry) is not known to
+        # be unique
+        unique = (getattr(label, '_unique', False) or
+                  getattr(label, '_issorted', False))
+    if unique and type(sublabel) is not RangeLabel:
+        sublabel._unique = True
+    return sublabel
+
+# Kind of ArrayLabel that can hold each type of label element
+_NUMERICKINDS = {int: 'int', float: 'float', datetime.date: 'date'}
+
+def _isdatelist(label):
+    "True if label is a non-empty sequence whose first element is a date."
+    try:
+        return len(label) > 0 and type(label[0]) is datetime.date
+    except TypeError:
+        return False
+
+def _toordinal(date):
+    "Ordinal of a datetime.date; raise TypeError for anything else."
+    if type(date) is not datetime.date:
+        raise TypeError, 'All elements of a date label must be datetime.date'
+    return date.toordinal()
+
+def _asint(value):
+    "Convert value to an int; raise TypeError if value is not integral."
+    try:
+        i = value.__index__()
+    except AttributeError:
+        raise TypeError, 'RangeLabel arguments must be integers'
+    return i
+
+def _isnumber(value):
+    "True if value is an int or float (Python or Numpy)."
+    return isinstance(value, (int, long, float, np.number))
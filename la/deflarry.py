@@ -1,17 +1,27 @@
 "Labeled array class"
 
 import csv
+import operator
 
 import numpy as np
 import bottleneck as bn
 
 from la.missing import ismissing, missing_marker, nans  
-from la.flabel import listmap, listmap_fill, flattenlabel
+from la.deflabel import (Label, ArrayLabel, RangeLabel, aslabel, labelcopy,
+                         labelslice, _keepunique)
+from la.flabel import labelmap_fill, flattenlabel, joinlabel
 from la.util.misc import isscalar, fromlists
 from la.farray import (group_ranking, group_mean, group_median, shuffle,
                        push, quantile, ranking, lastrank, movingsum_forward,
                        movingsum, geometric_mean, demean, demedian, zscore)
-from la.farray import (move_nanmedian, move_nanranking, move_func)
+from la.farray import (move_nanmedian, move_nanranking, move_func,
+                       move_nanewmean, move_nanewvar, move_nanewstd,
+                       move_nanewcov, take_axes)
+from la.farray.parallel import blockfunc
+
+
+class _SharedLabel(list):
+    "List of label objects shared with another larry; see larry._sharelabel"
 
 
 class larry(object):
@@ -31,7 +41,9 @@ class larry(object):
             for the row labels and one for the column labels. If x is 1d label
             should be a list that contain one list of names. If label is None
             (default) integers will be used to label the the row, columns,
-            etc.
+            etc.; such labels are stored as la.RangeLabel objects which do not
+            allocate the integers. An int, float or date axis can instead be labeled with an
+            la.ArrayLabel which stores the label in a Numpy array.
         dtype : data-type, optional
             The desired data type of the larry.         
         validate : bool, optional
@@ -54,7 +66,10 @@ class larry(object):
         larry does not copy the data array if it is a Numpy array or if
         np.asarray() does not make a copy such as when the data array is a
         Numpy matrix. However, if you change the dtype of the data array, a
-        copy is made. Similarly the label is not copied.            
+        copy is made. The label lists are stored as la.deflabel.Label
+        objects, which are lists that cache the index of each label element;
+        a label list that is not already a Label (or an ArrayLabel or a
+        RangeLabel) is copied into one.
             
         Examples
         --------
@@ -105,7 +120,7 @@ class larry(object):
         elif dtype != None:
             x = x.astype(dtype)            
         if label is None:
-            label = [range(z) for z in x.shape]
+            label = [RangeLabel(z) for z in x.shape]
         if validate: 
             ndim = x.ndim
             if ndim != len(label):
@@ -116,11 +131,19 @@ class larry(object):
                 # methods support 0d larrys
                 raise ValueError, '0d larrys are not supported'
             for i, l in enumerate(label):
-                nlabel = len(l)
-                if x.shape[i] != nlabel:
+                if x.shape[i] != len(l):
                     msg = 'Length mismatch in label and x along axis %d'
                     raise ValueError, msg % i
-                if len(frozenset(l)) != nlabel:
+                if not isinstance(l, (list, ArrayLabel, RangeLabel)):
+                    raise ValueError, 'label must be a list of lists'
+        cow = type(label) is _SharedLabel
+        label = map(aslabel, label)
+        if validate:
+            # Labels that were already verified (such as the labels of
+            # another larry or slices of them) remember that they are
+            # unique so checking them again takes no time
+            for i, l in enumerate(label):
+                if not l.isunique():
                     # We have duplicates in the label, give an example
                     count = {}
                     for li in l:
@@ -131,17 +154,121 @@ class larry(object):
                     msg = "Elements of label not unique along axis %d. "
                     msg += "There are %d labels named `%s`."          
                     raise ValueError, msg % (i, value, key)
-                if type(l) is not list:
-                    raise ValueError, 'label must be a list of lists'          
         self.x = x
-        self.label = label
+        self._label = label
+        # Copy-on-write: True if the label objects may be shared with another
+        # larry, see _sharelabel
+        self._cow = cow
+        # True once the label objects have been handed out (by the `label`
+        # attribute) so that they can be changed from outside the larry
+        self._exposed = False
+
+    # Label ------------------------------------------------------------------
+
+    def _ownlabel(self):
+        """
+        List of the label objects of the larry, copied first if shared.
+        
+        Use this (not the `label` attribute) inside larry methods that change
+        a label in place: the label objects are copied if they may be shared
+        with another larry but, unlike the `label` attribute, they are not
+        marked as handed out, so new larrys can still share them.
+        
+        """
+        if self._cow:
+            # The label objects may be shared with another larry; copy them
+            # before they are changed in place
+            self._label = map(labelcopy, self._label)
+            self._cow = False
+        return self._label
+
+    def _get_label(self):
+        label = self._ownlabel()
+        self._exposed = True
+        return label
+
+    def _set_label(self, label):
+        self._label = label
+        self._cow = False
+        self._exposed = True
+
+    label = property(_get_label, _set_label, doc="""
+        List of labels, one for each axis.
+        
+        Labels are copy-on-write: larrys created by most methods share the
+        label objects of the larry they were created from instead of copying
+        them. The shared label objects are copied (once) the first time the
+        `label` attribute of a larry that shares them is used, so changing a
+        label in place never changes the label of another larry. Once the
+        label objects of a larry have been handed out by this attribute they
+        are copied, not shared, when a new larry is made from the larry.
+        """)
+
+    def _sharelabel(self):
+        """
+        List of the label objects of the larry to use in a new larry.
+        
+        The internal replacement for copylabel. Instead of copying the
+        labels, the label objects are shared and both the larry and the new
+        larry (created with the returned list) are marked copy-on-write.
+        The outer list is new so axes can be added, removed, or replaced.
+        
+        If the label objects were handed out by the `label` attribute they
+        may be changed from outside the larry at any time, so they are
+        copied instead of shared.
+        
+        """
+        if self._exposed:
+            return _SharedLabel(map(labelcopy, self._label))
+        self._cow = True
+        return _SharedLabel(self._label)
+
+    def __out(self, out, axis=None):
+        """
+        Data array to write a result into and the larry to return.
+        
+        `out` is the preallocated output (a larry or an ndarray) passed to
+        a method. The result has the label of self, or, if `axis` is not
+        None, the label of self without `axis` (a reduction).
+        
+        """
+        label = list(self._label)
+        if axis is not None:
+            label.pop(axis)
+        if isinstance(out, larry):
+            if out._label != label:
+                raise ValueError, '`out` must have the label of the result.'
+            return out.x, out
+        if isinstance(out, np.ndarray):
+            if out.shape != tuple(map(len, label)):
+                raise ValueError, '`out` must have the shape of the result.'
+            label = self._sharelabel()
+            if axis is not None:
+                label.pop(axis)
+            return out, larry(out, label, validate=False)
+        raise TypeError, '`out` must be a larry or a Numpy array.'
+
+    def __setstate__(self, state):
+        if 'label' in state:
+            # larry pickled before labels were copy-on-write
+            state['_label'] = state.pop('label')
+            state['_cow'] = False
+        state.setdefault('_exposed', False)
+        self.__dict__.update(state)
 
     # Unary functions --------------------------------------------------------  
 
-    def log(self):
+    def log(self, out=None):
         """
         Element by element base e logarithm.
         
+        Parameters
+        ----------
+        out : {None, larry, ndarray}, optional
+            A preallocated larry (with the same label as the result) or array
+            (with the same shape as the result) to write the result into. By
+            default (None) a new larry is returned.
+            
         Returns
         -------
         out : larry
@@ -160,14 +287,25 @@ class larry(object):
         >>>
         
         """
-        x = np.log(self.x)
-        label = self.copylabel()
-        return larry(x, label, validate=False) 
+        if out is None:
+            x = blockfunc(np.log, self.x.size)(self.x)
+            label = self._sharelabel()
+            return larry(x, label, validate=False)
+        x, y = self.__out(out)
+        blockfunc(np.log, self.x.size)(self.x, out=x)
+        return y 
 
-    def exp(self):
+    def exp(self, out=None):
         """
         Element by element exponential.
         
+        Parameters
+        ----------
+        out : {None, larry, ndarray}, optional
+            A preallocated larry (with the same label as the result) or array
+            (with the same shape as the result) to write the result into. By
+            default (None) a new larry is returned.
+            
         Returns
         -------
         out : larry
@@ -185,14 +323,25 @@ class larry(object):
         array([  2.71828183,   7.3890561 ,  20.08553692])            
                 
         """
-        x = np.exp(self.x)
-        label = self.copylabel()
-        return larry(x, label, validate=False)
+        if out is None:
+            x = blockfunc(np.exp, self.x.size)(self.x)
+            label = self._sharelabel()
+            return larry(x, label, validate=False)
+        x, y = self.__out(out)
+        blockfunc(np.exp, self.x.size)(self.x, out=x)
+        return y
         
-    def sqrt(self):
+    def sqrt(self, out=None):
         """
         Element by element square root.
         
+        Parameters
+        ----------
+        out : {None, larry, ndarray}, optional
+            A preallocated larry (with the same label as the result) or array
+            (with the same shape as the result) to write the result into. By
+            default (None) a new larry is returned.
+            
         Returns
         -------
         out : larry
@@ -210,9 +359,13 @@ class larry(object):
         array([ 1.,  2.,  3.])
                 
         """
-        x = np.sqrt(self.x)
-        label = self.copylabel()
-        return larry(x, label, validate=False)
+        if out is None:
+            x = blockfunc(np.sqrt, self.x.size)(self.x)
+            label = self._sharelabel()
+            return larry(x, label, validate=False)
+        x, y = self.__out(out)
+        blockfunc(np.sqrt, self.x.size)(self.x, out=x)
+        return y
 
     def sign(self):
         """
@@ -238,11 +391,11 @@ class larry(object):
         array([-1,  1, -1,  1])
                 
         """
-        x = np.sign(self.x)
-        label = self.copylabel()
+        x = blockfunc(np.sign, self.x.size)(self.x)
+        label = self._sharelabel()
         return larry(x, label, validate=False)
         
-    def power(self, q):               
+    def power(self, q, out=None):
         """
         Element by element x**q.
                 
@@ -250,6 +403,10 @@ class larry(object):
         ----------
         q : scalar
             The power to raise to.
+        out : {None, larry, ndarray}, optional
+            A preallocated larry (with the same label as the result) or array
+            (with the same shape as the result) to write the result into. By
+            default (None) a new larry is returned.
         
         Returns
         -------
@@ -268,9 +425,13 @@ class larry(object):
         array([1, 4, 9])
                 
         """
-        x = np.power(self.x, q)
-        label = self.copylabel()
-        return larry(x, label, validate=False)
+        if out is None:
+            x = blockfunc(np.power, self.x.size)(self.x, q)
+            label = self._sharelabel()
+            return larry(x, label, validate=False)
+        x, y = self.__out(out)
+        blockfunc(np.power, self.x.size)(self.x, q, out=x)
+        return y
         
     def __pow__(self, q):
         """
@@ -289,7 +450,7 @@ class larry(object):
         """
         return self.power(q)           
         
-    def cumsum(self, axis): 
+    def cumsum(self, axis, out=None): 
         """
         Cumulative sum, ignoring NaNs.
         
@@ -297,6 +458,10 @@ class larry(object):
         ----------
         axis : int
             axis to cumsum along, no default. None is not allowed.
+        out : {None, larry, ndarray}, optional
+            A preallocated larry (with the same label as the result) or array
+            (with the same shape as the result) to write the result into. By
+            default (None) a new larry is returned.
             
         Returns
         -------
@@ -346,13 +511,24 @@ class larry(object):
         """
         if axis == None:
             raise ValueError, 'axis cannot be None'
-        y = self.copy()
-        idx = np.isnan(y.x)
-        np.putmask(y.x, idx, 0)
-        y.x = y.x.cumsum(axis)
+        if out is None:
+            y = self.copy()
+            idx = np.isnan(y.x)
+            np.putmask(y.x, idx, 0)
+            y.x = y.x.cumsum(axis)
+            if idx.any():
+                np.putmask(y.x, idx, np.nan)
+            return y
+        x, y = self.__out(out)
+        idx = np.isnan(self.x)
         if idx.any():
-            np.putmask(y.x, idx, np.nan)
-        return y        
+            np.copyto(x, self.x)
+            np.putmask(x, idx, 0)
+            x.cumsum(axis, out=x)
+            np.putmask(x, idx, np.nan)
+        else:
+            self.x.cumsum(axis, out=x)
+        return y
 
     def cumprod(self, axis): 
         """
@@ -420,7 +596,7 @@ class larry(object):
             np.putmask(y.x, idx, np.nan)
         return y
 
-    def clip(self, lo, hi):
+    def clip(self, lo, hi, out=None):
         """
         Clip x values.
 
@@ -430,6 +606,10 @@ class larry(object):
             All data values less than `lo` are set to `lo`.
         hi : scalar    
             All data values greater than `hi` are set to `hi`.
+        out : {None, larry, ndarray}, optional
+            A preallocated larry (with the same label as the result) or array
+            (with the same shape as the result) to write the result into. By
+            default (None) a new larry is returned.
                         
         Returns
         -------
@@ -456,24 +636,35 @@ class larry(object):
         """
         if lo > hi:
             raise ValueError, 'lo should be less than or equal to hi'
-        y = self.copy()
-        y.x.clip(lo, hi, y.x)
+        if out is None:
+            y = self.copy()
+            x = y.x
+        else:
+            x, y = self.__out(out)
+        blockfunc(np.clip, self.x.size)(self.x, lo, hi, out=x)
         return y
         
     def __neg__(self):
         "Return a copy with each element switched with its negative."
-        label = self.copylabel()
-        x = self.x.__neg__()
+        label = self._sharelabel()
+        x = blockfunc(np.negative, self.x.size)(self.x)
         return larry(x, label, validate=False)
     
     def __pos__(self):
         "Return a copy."
         return self.copy()
         
-    def abs(self):
+    def abs(self, out=None):
         """
         Absolute value of x.
         
+        Parameters
+        ----------
+        out : {None, larry, ndarray}, optional
+            A preallocated larry (with the same label as the result) or array
+            (with the same shape as the result) to write the result into. By
+            default (None) a new larry is returned.
+            
         Returns
         -------
         out : larry
@@ -492,8 +683,12 @@ class larry(object):
         array([1, 2, 3, 4])
        
         """
-        y = self.copy()
-        np.absolute(y.x, y.x)
+        if out is None:
+            y = self.copy()
+            x = y.x
+        else:
+            x, y = self.__out(out)
+        blockfunc(np.absolute, self.x.size)(self.x, out=x)
         return y
         
     def __abs__(self):
@@ -531,8 +726,8 @@ class larry(object):
         array([False, False,  True, False], dtype=bool)
 
         """
-        label = self.copylabel()
-        x = np.isnan(self.x)
+        label = self._sharelabel()
+        x = blockfunc(np.isnan, self.x.size)(self.x)
         return larry(x, label, validate=False)                             
 
     def isfinite(self):
@@ -558,8 +753,8 @@ class larry(object):
         array([False,  True, False, False], dtype=bool)
         
         """    
-        label = self.copylabel()
-        x = np.isfinite(self.x)
+        label = self._sharelabel()
+        x = blockfunc(np.isfinite, self.x.size)(self.x)
         return larry(x, label, validate=False)
         
     def isinf(self):
@@ -585,8 +780,8 @@ class larry(object):
         array([ True, False, False,  True], dtype=bool)
         
         """    
-        label = self.copylabel()
-        x = np.isinf(self.x)
+        label = self._sharelabel()
+        x = blockfunc(np.isinf, self.x.size)(self.x)
         return larry(x, label, validate=False) 
         
     def __invert__(self):
@@ -633,7 +828,7 @@ class larry(object):
         """
         if self.dtype != bool:
             raise TypeError, 'Only larrys with bool dtype can be inverted.'
-        return larry(~self.x, self.copylabel(), validate=False)
+        return larry(~self.x, self._sharelabel(), validate=False)
         
     # Binary Functions ------------------------------------------------------- 
     
@@ -648,6 +843,10 @@ class larry(object):
         
         If two larrys are added then the larrys are joined with an inner join
         (i.e., the intersection of the labels).
+
+        If the two larrys have different number of dimensions then only the
+        axes they share (found from the labels) are joined and the larry with
+        fewer dimensions is broadcast along the other axes.
         
         See Also
         --------
@@ -672,17 +871,17 @@ class larry(object):
         
         """
         if isinstance(other, larry):
-            if self.label == other.label:
-                x = self.x + other.x
-                label = self.copylabel()
+            if self._label == other._label:
+                x = blockfunc(np.add, self.x.size)(self.x, other.x)
+                label = self._sharelabel()
                 return larry(x, label, validate=False)                        
             else:       
                 x, y, label = self.__align(other)
-                x = x + y
+                x = blockfunc(np.add, x.size)(x, y)
                 return larry(x, label, validate=False)
         if np.isscalar(other) or isinstance(other, np.ndarray):
-            x = self.x + other
-            label = self.copylabel()
+            x = blockfunc(np.add, self.x.size)(self.x, other)
+            label = self._sharelabel()
             return larry(x, label, validate=False)                 
         raise TypeError, 'Input must be scalar, array, or larry.' 
     
@@ -694,6 +893,10 @@ class larry(object):
         
         If two larrys are subtracted then the larrys are joined with an inner
         join (i.e., the intersection of the labels).
+
+        If the two larrys have different number of dimensions then only the
+        axes they share (found from the labels) are joined and the larry with
+        fewer dimensions is broadcast along the other axes.
         
         See Also
         --------
@@ -717,17 +920,17 @@ class larry(object):
         array([1])        
         """   
         if isinstance(other, larry):
-            if self.label == other.label:
-                x = self.x - other.x
-                label = self.copylabel()
+            if self._label == other._label:
+                x = blockfunc(np.subtract, self.x.size)(self.x, other.x)
+                label = self._sharelabel()
                 return larry(x, label, validate=False)                          
             else:          
                 x, y, label = self.__align(other)        
-                x = x - y
+                x = blockfunc(np.subtract, x.size)(x, y)
                 return larry(x, label, validate=False)
         if np.isscalar(other) or isinstance(other, np.ndarray):
-            x = self.x - other
-            label = self.copylabel()
+            x = blockfunc(np.subtract, self.x.size)(self.x, other)
+            label = self._sharelabel()
             return larry(x, label, validate=False)       
         raise TypeError, 'Input must be scalar, array, or larry.'
         
@@ -741,6 +944,10 @@ class larry(object):
         
         If two larrys are divided then the larrys are joined with an inner
         join (i.e., the intersection of the labels).
+
+        If the two larrys have different number of dimensions then only the
+        axes they share (found from the labels) are joined and the larry with
+        fewer dimensions is broadcast along the other axes.
         
         See Also
         --------
@@ -766,17 +973,17 @@ class larry(object):
                
         """    
         if isinstance(other, larry):
-            if self.label == other.label:
-                x = self.x / other.x
-                label = self.copylabel()
+            if self._label == other._label:
+                x = blockfunc(np.divide, self.x.size)(self.x, other.x)
+                label = self._sharelabel()
                 return larry(x, label, validate=False)                          
             else:          
                 x, y, label = self.__align(other)        
-                x = x / y
+                x = blockfunc(np.divide, x.size)(x, y)
                 return larry(x, label, validate=False)
         if np.isscalar(other) or isinstance(other, np.ndarray):
-            x = self.x / other
-            label = self.copylabel()
+            x = blockfunc(np.divide, self.x.size)(self.x, other)
+            label = self._sharelabel()
             return larry(x, label, validate=False)        
         raise TypeError, 'Input must be scalar, array, or larry.'
         
@@ -787,8 +994,8 @@ class larry(object):
             msg += 'so I removed it. Send me your example and I will fix.'
             raise RuntimeError, msg                   
         if np.isscalar(other) or isinstance(other, np.ndarray):
-            label = self.copylabel()
-            x = other / self.x
+            label = self._sharelabel()
+            x = blockfunc(np.divide, self.x.size)(other, self.x)
             return larry(x, label, validate=False)
         raise TypeError, 'Input must be scalar, array, or larry.'
         
@@ -798,6 +1005,10 @@ class larry(object):
 
         If two larrys are multiplied then the larrys are joined with an inner
         join (i.e., the intersection of the labels).
+
+        If the two larrys have different number of dimensions then only the
+        axes they share (found from the labels) are joined and the larry with
+        fewer dimensions is broadcast along the other axes.
         
         See Also
         --------
@@ -822,17 +1033,17 @@ class larry(object):
                 
         """      
         if isinstance(other, larry):
-            if self.label == other.label:
-                x = self.x * other.x
-                label = self.copylabel()
+            if self._label == other._label:
+                x = blockfunc(np.multiply, self.x.size)(self.x, other.x)
+                label = self._sharelabel()
                 return larry(x, label, validate=False)                          
             else:           
                 x, y, label = self.__align(other)
-                x = x * y
+                x = blockfunc(np.multiply, x.size)(x, y)
                 return larry(x, label, validate=False)
         if np.isscalar(other) or isinstance(other, np.ndarray):
-            x = self.x * other
-            label = self.copylabel()
+            x = blockfunc(np.multiply, self.x.size)(self.x, other)
+            label = self._sharelabel()
             return larry(x, label, validate=False)   
         raise TypeError, 'Input must be scalar, array, or larry.'
 
@@ -866,17 +1077,17 @@ class larry(object):
         
         """    
         if isinstance(other, larry):
-            if self.label == other.label:
-                x = np.logical_and(self.x, other.x)
-                label = self.copylabel()
+            if self._label == other._label:
+                x = blockfunc(np.logical_and, self.x.size)(self.x, other.x)
+                label = self._sharelabel()
                 return larry(x, label, validate=False)                      
             else:          
                 x, y, label = self.__align(other)
-                x = np.logical_and(x, y)
+                x = blockfunc(np.logical_and, x.size)(x, y)
                 return larry(x, label, validate=False)
         if np.isscalar(other) or isinstance(other, np.ndarray):            
-            x = np.logical_and(self.x, other)
-            label = self.copylabel()
+            x = blockfunc(np.logical_and, self.x.size)(self.x, other)
+            label = self._sharelabel()
             return larry(x, label, validate=False)
         raise TypeError, 'Input must be scalar, array, or larry.'
 
@@ -910,48 +1121,180 @@ class larry(object):
                         
         """     
         if isinstance(other, larry):
-            if self.label == other.label:
-                x = np.logical_or(self.x, other.x)
-                label = self.copylabel()
+            if self._label == other._label:
+                x = blockfunc(np.logical_or, self.x.size)(self.x, other.x)
+                label = self._sharelabel()
                 return larry(x, label, validate=False)                      
             else:          
                 x, y, label = self.__align(other)
-                x = np.logical_or(x, y)
+                x = blockfunc(np.logical_or, x.size)(x, y)
                 return larry(x, label, validate=False)
         if np.isscalar(other) or isinstance(other, np.ndarray):            
-            x = np.logical_or(self.x, other)
-            label = self.copylabel()
+            x = blockfunc(np.logical_or, self.x.size)(self.x, other)
+            label = self._sharelabel()
             return larry(x, label, validate=False)
         raise TypeError, 'Input must be scalar, array, or larry.'
 
     __ror__ = __or__
 
+    # In-place binary operators ----------------------------------------------
+
+    def __iadd__(self, other):
+        """
+        Add a larry, Numpy array, or scalar to a larry in place.
+        
+        If the labels of the two larrys are the same, or if the inner join
+        of the labels is the label of `self`, then the sum is written into
+        the data array of `self` (no new array is allocated). Otherwise the
+        larrys are joined with an inner join (as with +) and `self` takes
+        the joined label and the new data array. If the dtype of `self`
+        cannot hold the sum (for example, an int larry plus a float) then a
+        new data array is allocated.
+        
+        Examples
+        --------
+        >>> y = larry([1.0, 2.0], [['a', 'b']])
+        >>> y += larry([1.0, 2.0, 3.0], [['a', 'b', 'c']])
+        >>> y
+        label_0
+            a
+            b
+        x
+        array([ 2.,  4.])
+        
+        """
+        return self.__inplace(other, np.add)
+
+    def __isub__(self, other):
+        "Subtract a larry, Numpy array, or scalar from a larry in place."
+        return self.__inplace(other, np.subtract)
+
+    def __imul__(self, other):
+        "Multiply a larry with a larry, Numpy array, or scalar in place."
+        return self.__inplace(other, np.multiply)
+
+    def __idiv__(self, other):
+        "Divide a larry by a larry, Numpy array, or scalar in place."
+        return self.__inplace(other, np.divide)
+
+    def __inplace(self, other, func):
+        "Apply the binary ufunc `func` to self and other in place."
+        if isinstance(other, larry) and self.ndim != other.ndim:
+            if self.ndim < other.ndim:
+                msg = 'In-place operation cannot increase the number of '
+                msg += 'dimensions'
+                raise IndexError, msg
+            x, y, label = self.__align(other)
+            if x is self.x and np.result_type(x, y) == x.dtype:
+                func(x, y, x)
+            else:
+                self.x = func(x, y)
+                self._label = label
+            return self
+        if isinstance(other, larry):
+            if self._label == other._label:
+                y = other.x
+            else:
+                if self.ndim != other.ndim:
+                    msg = 'Binary operation on two larrys with different '
+                    msg += 'dimension'
+                    raise IndexError, msg
+                label = []
+                idxs = [None] * self.ndim
+                idxo = [None] * self.ndim
+                ax = -1
+                for ls, lo in zip(self._label, other._label):
+                    ax += 1
+                    if ls == lo:
+                        lab = ls
+                    else:
+                        lab, idx, ign, idxo[ax], ign = joinlabel(ls, lo,
+                                                                 'inner')
+                        if lab == ls:
+                            # No need to take along this axis of self
+                            lab = ls
+                        else:
+                            idxs[ax] = idx
+                    label.append(lab)
+                y = take_axes(other.x, idxo)
+                if idxs.count(None) != self.ndim:
+                    # The joined label is not the label of self so the
+                    # buffer of self cannot be reused
+                    x = take_axes(self.x, idxs)
+                    self.x = blockfunc(func, x.size)(x, y)
+                    self._label = label
+                    return self
+        elif np.isscalar(other) or isinstance(other, np.ndarray):
+            y = other
+        else:
+            raise TypeError, 'Input must be scalar, array, or larry.'
+        x = self.x
+        if np.result_type(x, y) == x.dtype:
+            blockfunc(func, x.size)(x, y, out=x)
+        else:
+            self.x = blockfunc(func, x.size)(x, y)
+        return self
+
     def __align(self, other):
         "Align larrys for binary operations."
         if self.ndim != other.ndim:
-            msg = 'Binary operation on two larrys with different dimension'
-            raise IndexError, msg
-        label = []
-        x = self.x
-        y = other.x 
+            return self.__broadcast(other)
+        label = _SharedLabel()
+        idxs = [None] * self.ndim
+        idxo = [None] * self.ndim
         ax = -1           
-        for ls, lo in zip(self.label, other.label):
+        for ls, lo in zip(self._sharelabel(), other._label):
             ax += 1
             if ls == lo:
-                lab = list(ls)
+                lab = ls
             else:
-                lab = list(frozenset(ls).intersection(lo))
-                lab.sort()
-                ids = listmap(ls, lab)
-                ido = listmap(lo, lab)
-                x = x.take(ids, ax)
-                y = y.take(ido, ax)    
+                lab, idxs[ax], ign, idxo[ax], ign = joinlabel(ls, lo, 'inner')
             label.append(lab)
+        # Take along all axes in one pass
+        x = take_axes(self.x, idxs)
+        y = take_axes(other.x, idxo)
         return x, y, label
+
+    def __broadcast(self, other):
+        """
+        Align larrys with different number of dimensions for binary
+        operations.
+        
+        The axes of the larry with fewer dimensions are lined up with the
+        axes of the other larry that have the same (or else overlapping)
+        labels. Only those axes are aligned (inner join); the data of the
+        larry with fewer dimensions is returned as a view that broadcasts
+        against the data of the other larry.
+        
+        """
+        if self.ndim > other.ndim:
+            big, small = self, other
+        else:
+            big, small = other, self
+        axes = _broadcast_axes(big, small)
+        label = big._sharelabel()
+        idxb = [None] * big.ndim
+        idxs = [None] * small.ndim
+        for i, ax in enumerate(axes):
+            lb = big._label[ax]
+            ls = small._label[i]
+            if lb != ls:
+                if big is self:
+                    lab, idxb[ax], ign, idxs[i], ign = joinlabel(lb, ls,
+                                                                 'inner')
+                else:
+                    lab, idxs[i], ign, idxb[ax], ign = joinlabel(ls, lb,
+                                                                 'inner')
+                label[ax] = lab
+        xb = take_axes(big.x, idxb)
+        xs = _broadcast_view(take_axes(small.x, idxs), axes, big.ndim)
+        if big is self:
+            return xb, xs, label
+        return xs, xb, label
                   
     # Reduce functions -------------------------------------------------------
         
-    def sum(self, axis=None):
+    def sum(self, axis=None, out=None):
         """
         Sum of values along axis, ignoring NaNs.
 
@@ -959,6 +1302,10 @@ class larry(object):
         ----------
         axis : {None, integer}, optional
             Axis to sum along or sum over all (None, default).
+        out : {None, larry, ndarray}, optional
+            A preallocated larry (with the same label as the result) or array
+            (with the same shape as the result) to write the result into when
+            `axis` is an integer. By default (None) a new larry is returned.
             
         Returns
         -------
@@ -985,9 +1332,9 @@ class larry(object):
         array([ 3.,  6.])
                     
         """   
-        return self.__reduce(bn.nansum, axis=axis)    
+        return self.__reduce(bn.nansum, axis=axis, out=out)    
 
-    def prod(self, axis=None):
+    def prod(self, axis=None, out=None):
         """
         Product of values along axis, ignoring NaNs.
 
@@ -996,6 +1343,10 @@ class larry(object):
         axis : {None, int}, optional
             Axis to find the product along or find the product over a
             all axes (None, default).
+        out : {None, larry, ndarray}, optional
+            A preallocated larry (with the same label as the result) or array
+            (with the same shape as the result) to write the result into when
+            `axis` is an integer. By default (None) a new larry is returned.
             
         Returns
         -------
@@ -1042,7 +1393,7 @@ class larry(object):
         y = self.copy()
         idx = np.isnan(y.x)
         np.putmask(y.x, idx, 1)
-        y = y.__reduce(np.prod, axis=axis)
+        y = y.__reduce(np.prod, axis=axis, out=out)
         idx = idx.all(axis)
         if idx.ndim == 0:
             if idx:
@@ -1051,7 +1402,7 @@ class larry(object):
             np.putmask(y.x, idx, np.nan)
         return y 
 
-    def mean(self, axis=None):
+    def mean(self, axis=None, out=None):
         """
         Mean of values along axis, ignoring NaNs.
 
@@ -1060,6 +1411,10 @@ class larry(object):
         axis : {None, integer}, optional
             Axis to find the mean along (integer) or the global mean (None,
             default).
+        out : {None, larry, ndarray}, optional
+            A preallocated larry (with the same label as the result) or array
+            (with the same shape as the result) to write the result into when
+            `axis` is an integer. By default (None) a new larry is returned.
 
         Returns
         -------
@@ -1080,7 +1435,7 @@ class larry(object):
         array([ 3.,  3.])       
                     
         """
-        return self.__reduce(bn.nanmean, axis=axis)
+        return self.__reduce(bn.nanmean, axis=axis, out=out)
         
     def geometric_mean(self, axis=None, check_for_greater_than_zero=True):
         """
@@ -1117,7 +1472,7 @@ class larry(object):
         return self.__reduce(geometric_mean, axis=axis,
                       check_for_greater_than_zero=check_for_greater_than_zero)
 
-    def median(self, axis=None):
+    def median(self, axis=None, out=None):
         """
         Median of values along axis, ignoring NaNs.
 
@@ -1126,6 +1481,10 @@ class larry(object):
         axis : {None, integer}, optional
             Axis to find the median along (0 or 1) or the global median (None,
             default).
+        out : {None, larry, ndarray}, optional
+            A preallocated larry (with the same label as the result) or array
+            (with the same shape as the result) to write the result into when
+            `axis` is an integer. By default (None) a new larry is returned.
             
         Returns
         -------
@@ -1152,9 +1511,9 @@ class larry(object):
         array([ 3.,  3.])
                     
         """
-        return self.__reduce(bn.nanmedian, axis=axis) 
+        return self.__reduce(bn.nanmedian, axis=axis, out=out) 
             
-    def std(self, axis=None, ddof=0):
+    def std(self, axis=None, ddof=0, out=None):
         """
         Standard deviation of values along axis, ignoring NaNs.
 
@@ -1184,6 +1543,10 @@ class larry(object):
             Means Delta Degrees of Freedom. The divisor used in calculations
             is ``N - ddof``, where ``N`` represents the number of elements.
             By default `ddof` is zero.
+        out : {None, larry, ndarray}, optional
+            A preallocated larry (with the same label as the result) or array
+            (with the same shape as the result) to write the result into when
+            `axis` is an integer. By default (None) a new larry is returned.
 
         Returns
         -------
@@ -1210,9 +1573,9 @@ class larry(object):
         array([ 0.,  1.])  
                          
         """      
-        return self.__reduce(bn.nanstd, axis=axis, ddof=ddof)  
+        return self.__reduce(bn.nanstd, axis=axis, ddof=ddof, out=out)  
         
-    def var(self, axis=None, ddof=0):
+    def var(self, axis=None, ddof=0, out=None):
         """
         Variance of values along axis, ignoring NaNs.
         
@@ -1241,6 +1604,10 @@ class larry(object):
             Means Delta Degrees of Freedom. The divisor used in calculations
             is ``N - ddof``, where ``N`` represents the number of elements.
             By default `ddof` is zero.
+        out : {None, larry, ndarray}, optional
+            A preallocated larry (with the same label as the result) or array
+            (with the same shape as the result) to write the result into when
+            `axis` is an integer. By default (None) a new larry is returned.
 
         Returns
         -------
@@ -1267,9 +1634,9 @@ class larry(object):
         array([ 0.,  1.])
                     
         """         
-        return self.__reduce(bn.nanvar, axis=axis, ddof=ddof)  
+        return self.__reduce(bn.nanvar, axis=axis, ddof=ddof, out=out)  
                             
-    def max(self, axis=None):
+    def max(self, axis=None, out=None):
         """
         Maximum values along axis, ignoring NaNs.
 
@@ -1278,6 +1645,10 @@ class larry(object):
         axis : {None, integer}, optional
             Axis to find the max along (integer) or the global max (None,
             default).
+        out : {None, larry, ndarray}, optional
+            A preallocated larry (with the same label as the result) or array
+            (with the same shape as the result) to write the result into when
+            `axis` is an integer. By default (None) a new larry is returned.
             
         Returns
         -------
@@ -1304,9 +1675,9 @@ class larry(object):
         array([ 3.,  4.])
                     
         """            
-        return self.__reduce(bn.nanmax, axis=axis)             
+        return self.__reduce(bn.nanmax, axis=axis, out=out)             
            
-    def min(self, axis=None):
+    def min(self, axis=None, out=None):
         """
         Minimum values along axis, ignoring NaNs.
 
@@ -1315,6 +1686,10 @@ class larry(object):
         axis : {None, integer}, optional
             Axis to find the min along (integer) or the global min (None,
             default).
+        out : {None, larry, ndarray}, optional
+            A preallocated larry (with the same label as the result) or array
+            (with the same shape as the result) to write the result into when
+            `axis` is an integer. By default (None) a new larry is returned.
             
         Returns
         -------
@@ -1341,10 +1716,21 @@ class larry(object):
         array([ 3.,  2.])
                     
         """
-        return self.__reduce(bn.nanmin, axis=axis)  
+        return self.__reduce(bn.nanmin, axis=axis, out=out)  
 
     def __reduce(self, op, default=np.nan, **kwargs):
         axis = kwargs['axis']
+        out = kwargs.pop('out', None)
+        if out is not None:
+            if not np.isscalar(axis) or self.ndim == 1:
+                msg = '`out` can only be used when the result is a larry.'
+                raise ValueError, msg
+            x, y = self.__out(out, axis)
+            if self.size == 0:
+                x.fill(default)
+            else:
+                x[...] = op(self.x, **kwargs)
+            return y
         if self.size == 0:
             # At least one dimension has length 0
             if axis == None:
@@ -1356,7 +1742,7 @@ class larry(object):
             else:
                 x = np.empty(shape, dtype=self.dtype)
                 x.fill(default)
-                label = self.copylabel()
+                label = self._sharelabel()
                 label.pop(axis)
                 return larry(x, label, validate=False)
         if np.isscalar(axis):
@@ -1364,7 +1750,7 @@ class larry(object):
             if np.isscalar(x):
                 return x
             else:    
-                label = self.copylabel()
+                label = self._sharelabel()
                 label.pop(axis)
                 return larry(x, label, validate=False)      
         elif axis is None:
@@ -1564,43 +1950,26 @@ class larry(object):
         return self.__compare(other, '>=') 
   
     def __compare(self, other, op):         
-        if (np.isscalar(other) or isinstance(other, np.ndarray) or
-            (type(other) == list) or (type(other) == tuple)):
-            if op == '==':
-                x = self.x == other
-            elif op == '!=':
-                x = self.x != other
-            elif op == '<':
-                x = self.x < other           
-            elif op == '>':
-                x = self.x > other           
-            elif op == '<=':
-                x = self.x <= other           
-            elif op == '>=':
-                x = self.x >= other           
+        if op not in _COMPARISONS:
+            raise ValueError, 'Unknown comparison operator'
+        func = _COMPARISONS[op]
+        if (type(other) == list) or (type(other) == tuple):
+            x = func(self.x, other)
+            if isinstance(x, np.ndarray):
+                y = larry(x, self._sharelabel(), validate=False)
             else:
-                raise ValueError, 'Unknown comparison operator'
+                y = x
+            return y
+        elif np.isscalar(other) or isinstance(other, np.ndarray):
+            x = blockfunc(func, self.x.size)(self.x, other)
             if isinstance(x, np.ndarray):
-                y = larry(x, self.copylabel(), validate=False)
+                y = larry(x, self._sharelabel(), validate=False)
             else:
                 y = x
             return y
         elif isinstance(other, larry):
             x, y, label = self.__align(other)
-            if op == '==':
-                x = x == y
-            elif op == '!=':
-                x = x != y
-            elif op == '<':
-                x = x < y
-            elif op == '>':
-                x = x > y            
-            elif op == '<=':
-                x = x <= y            
-            elif op == '>=':
-                x = x >= y                              
-            else:
-                raise ValueError, 'Unknown comparison operator'              
+            x = blockfunc(func, x.size)(x, y)
             return larry(x, label, validate=False)
         else:
             raise TypeError, 'Input must be scalar, numpy array, or larry.'
@@ -1641,11 +2010,15 @@ class larry(object):
             x = self.x[index]
             if self.ndim <= 1:
                 return x
-            label = self.label[1:]
+            label = self._sharelabel()
+            del label[0]
             validate = False
         elif typidx is tuple:
             validate = False
-            label = []
+            if len(index) < self.ndim:
+                # The label objects of the axes that are not indexed
+                shared = self._sharelabel()
+            label = _SharedLabel()
             allscalar = True
             for ax in xrange(self.ndim):
                 if ax < len(index):
@@ -1657,7 +2030,7 @@ class larry(object):
                         lab = None
                     elif typ is list or typ is tuple:
                         try:
-                            lab = [self.label[ax][z] for z in idx]
+                            lab = [self._label[ax][z] for z in idx]
                         except IndexError:
                             raise IndexError, 'index out of range'
                         allscalar = False
@@ -1669,29 +2042,29 @@ class larry(object):
                             raise IndexError, msg
                         if idx.dtype.type == np.bool_:
                             try:
-                                lab = [self.label[ax][j] for j, z in
+                                lab = [self._label[ax][j] for j, z in
                                                           enumerate(idx) if z]
                             except IndexError:
                                 raise IndexError, 'index out of range'
                         else:
                             try:
-                                lab = [self.label[ax][z] for z in idx]
+                                lab = [self._label[ax][z] for z in idx]
                             except IndexError:
                                 raise IndexError, 'index out of range'
                         validate = True 
                         allscalar = False
                     elif typ is slice:
-                        lab = self.label[ax][idx] 
+                        lab = labelslice(self._label[ax], idx)
                         allscalar = False
                     elif typ is larry:
                         if idx.dtype.type != np.bool_:
                             raise IndexError("If index is larry it must of bool dtype")
                         if idx.ndim != 1:
                             raise IndexError("If index is larry it must be 1d")
-                        if self.label[ax] != idx.label[0]:
+                        if self._label[ax] != idx._label[0]:
                             raise IndexError("When indexing larrys must be aligned")
                         try:
-                            lab = [self.label[ax][j] for j, z in
+                            lab = [self._label[ax][j] for j, z in
                                                         enumerate(idx.x) if z]
                         except IndexError:
                             raise IndexError, 'index out of range'
@@ -1704,21 +2077,21 @@ class larry(object):
                         msg = 'I do not recognize the way you are indexing'
                         raise IndexError, msg                       
                 else:
-                    lab = self.label[ax]
+                    lab = shared[ax]
                 if lab is not None:     
                     label.append(lab)
             x = self.x[index]
             if allscalar:
                 return x
         elif typidx is slice:
-            label = list(self.label)
-            label[0] = label[0][index]
+            label = self._sharelabel()
+            label[0] = labelslice(label[0], index)
             x = self.x[index]
             validate = False
         elif typidx is list:
-            label = list(self.label)
-            lab = [label[0][int(i)] for i in index]
-            if len(set(lab)) != len(lab):
+            label = self._sharelabel()
+            lab = Label([label[0][int(i)] for i in index])
+            if not lab.isunique():
                 raise IndexError("Duplicate labels along axis 0.")
             label[0] = lab
             x = self.x.take(index, axis=0)
@@ -1731,34 +2104,34 @@ class larry(object):
                 raise IndexError, msg
             if index.dtype.type == np.bool_:
                 try:
-                    lab = [self.label[0][j] for j, z in
+                    lab = [self._label[0][j] for j, z in
                                                 enumerate(index) if z]
                 except IndexError:
                     raise IndexError, 'index out of range'
                 x = self.x[index]
             else:
                 try:
-                    lab = [self.label[0][z] for z in index]
+                    lab = Label([self._label[0][z] for z in index])
                 except IndexError:
                     raise IndexError, 'index out of range'
-                if len(set(lab)) != len(lab):
+                if not lab.isunique():
                     raise IndexError("Duplicate labels along axis 0.")
                 x = self.x.take(index, axis=0)
-            label = self.copylabel()
+            label = self._sharelabel()
             label[0] = lab                 
         elif typidx is larry:
             if index.dtype.type != np.bool_:
                 raise IndexError("If index is larry it must of bool dtype")
             if index.ndim != 1:
                 raise IndexError("If index is larry it must be 1d")
-            if self.label[0] != index.label[0]:
+            if self._label[0] != index._label[0]:
                 raise IndexError("When indexing larrys must be aligned")
             try:
-                lab = [self.label[0][j] for j, z in
+                lab = [self._label[0][j] for j, z in
                                             enumerate(index) if z]
             except IndexError:
                 raise IndexError, 'index out of range'
-            label = self.copylabel()
+            label = self._sharelabel()
             label[0] = lab
             x = self.x[index.x]
         else:        
@@ -1830,10 +2203,10 @@ class larry(object):
                [ 0.75024392,  0.92896999]])
        
         """
-        label = self.copylabel()
+        label = self._sharelabel()
         labelaxis = label[axis]
-        lab = [labelaxis[idx] for idx in indices]
-        if len(set(lab)) != len(lab):
+        lab = Label([labelaxis[idx] for idx in indices])
+        if not lab.isunique():
             raise IndexError("`indices` must be unique")
         label[axis] = lab
         x = self.x.take(indices, axis)
@@ -1986,7 +2359,7 @@ class larry(object):
         
         """
         if isinstance(index, larry):
-            if self.label == index.label:
+            if self._label == index._label:
                 self.x[index.x] = value
             else:
                 # Could use morph to do this, if every row and column of self
@@ -1998,7 +2371,7 @@ class larry(object):
                 # TODO The line below (self[index].label) is slow. Need a
                 # function that indexes into labels without indexing into x.
                 # Then use that function in getitem
-                if self[index].label == value.label:
+                if self[index]._label == value._label:
                     self.x[index] = value.x
                 else:    
                     raise IndexError, 'larrys are not aligned.'    
@@ -2237,7 +2610,7 @@ class larry(object):
         """
         if axis is None:
             raise ValueError, 'axis cannot be None'        
-        label = list(self.label)
+        label = self._sharelabel()
         label.pop(axis)  
         idx = self.labelindex(name, axis)
         index = [slice(None)] * self.ndim 
@@ -2327,14 +2700,14 @@ class larry(object):
         if axis >= self.ndim:
             raise IndexError, 'axis is out of range' 
         y = self.copy()      
-        cmd = '[(idx, z) for idx, z in enumerate(y.label[axis]) if z '
+        cmd = '[(idx, z) for idx, z in enumerate(y._label[axis]) if z '
         cmd = cmd + op + ' value]'  
         idxlabel = eval(cmd)
         if len(idxlabel) == 0:
             return larry([])
         else:
             idx, label = zip(*idxlabel)
-            y.label[axis] = list(label)
+            y._label[axis] = Label(label)
             index = [slice(None, None, None)] * self.ndim
             index[axis] = list(idx)
             y.x = y.x[index]
@@ -2419,9 +2792,9 @@ class larry(object):
         
         """
         if axis is None:
-            return max([max(z) for z in self.label])
+            return max([max(z) for z in self._label])
         else:
-            return max([z for z in self.label[axis]])
+            return max([z for z in self._label[axis]])
 
     def minlabel(self, axis=None):
         """
@@ -2449,9 +2822,9 @@ class larry(object):
         
         """
         if axis is None:
-            return min([min(z) for z in self.label])
+            return min([min(z) for z in self._label])
         else:
-            return min([z for z in self.label[axis]])
+            return min([z for z in self._label[axis]])
         
     def labelindex(self, name, axis, exact=True):
         """
@@ -2491,12 +2864,12 @@ class larry(object):
         if axis is None:
             raise ValueError, 'axis cannot be None'            
         try:
-            index = self.label[axis].index(name)
+            index = self._label[axis].index(name)
         except ValueError:
             if exact:
                 raise IndexError, 'name not in label along axis %d' % axis
             else:
-                idx = [i for i, z in enumerate(self.label[axis]) if z <= name]
+                idx = [i for i, z in enumerate(self._label[axis]) if z <= name]
                 if len(idx) == 0:
                     raise IndexError, 'name not in label along axis %d' % axis
                 index = max(idx)                        
@@ -2554,9 +2927,9 @@ class larry(object):
             y = self    
         if axis is None:
             for ax in range(y.ndim):
-                y.label[ax] = map(func, y.label[ax])
+                y._label[ax] = Label(map(func, y._label[ax]))
         else:
-            y.label[axis] = map(func, y.label[axis])
+            y._label[axis] = Label(map(func, y._label[axis]))
         return y                    
     
     # Moving window statistics ----------------------------------------------
@@ -2594,7 +2967,7 @@ class larry(object):
 
         """
         x = bn.move_nansum(self.x, window, axis=axis)
-        return larry(x, self.copylabel(), validate=False)
+        return larry(x, self._sharelabel(), validate=False)
 
     def move_mean(self, window, axis=-1):
         """
@@ -2629,7 +3002,7 @@ class larry(object):
             
         """
         x = bn.move_nanmean(self.x, window, axis=axis)
-        return larry(x, self.copylabel(), validate=False)
+        return larry(x, self._sharelabel(), validate=False)
 
     def move_std(self, window, axis=-1):
         """
@@ -2666,7 +3039,7 @@ class larry(object):
         
         """
         x = bn.move_nanstd(self.x, window, axis=axis)
-        return larry(x, self.copylabel(), validate=False)
+        return larry(x, self._sharelabel(), validate=False)
 
     def move_min(self, window, axis=-1):
         """
@@ -2701,7 +3074,7 @@ class larry(object):
 
         """
         x = bn.move_nanmin(self.x, window, axis=axis)
-        return larry(x, self.copylabel(), validate=False)
+        return larry(x, self._sharelabel(), validate=False)
 
     def move_max(self, window, axis=-1):
         """
@@ -2736,9 +3109,9 @@ class larry(object):
 
         """
         x = bn.move_nanmax(self.x, window, axis=axis)
-        return larry(x, self.copylabel(), validate=False)
+        return larry(x, self._sharelabel(), validate=False)
 
-    def move_ranking(self, window, axis=-1, method='strides'):
+    def move_ranking(self, window, axis=-1, method='lags', decay=0.0):
         """
         Moving window ranking along the specified axis, ignoring NaNs.
 
@@ -2758,9 +3131,21 @@ class larry(object):
         method : str, optional
             The following moving window methods are available:
                 ==========  =====================================
-                'strides'   strides tricks (ndim < 4) (default)
+                'lags'      loop over the lags (default)
+                'strides'   strides tricks (ndim < 4)
                 'loop'      brute force python loop
+                'fast'      rolling sorted window (decay=0 only)
                 ==========  =====================================
+            The default was 'strides' before la 0.7; 'lags' gives the same
+            result (with decay > 0 up to the rounding of the sum) and also
+            works for ndim >= 4. Method 'fast' walks each 1d slice in a
+            Python loop; its cost does not grow with the window, so it is
+            only faster than the default 'lags' for long windows (roughly
+            1000 or more).
+        decay : scalar, optional
+            Exponential decay strength of the ranking in each window; see
+            larry.lastrank. Cannot be negative. The default (decay=0) is no
+            decay.
 
         Returns
         -------
@@ -2816,8 +3201,9 @@ class larry(object):
         array([ NaN,  NaN,   1.,   1.,   1.])
 
         """
-        x = move_nanranking(self.x, window, axis=axis, method=method)
-        return larry(x, self.copylabel(), validate=False)
+        x = move_nanranking(self.x, window, axis=axis, method=method,
+                            decay=decay)
+        return larry(x, self._sharelabel(), validate=False)
 
     def move_median(self, window, axis=-1, method='loop'):
         """
@@ -2835,7 +3221,10 @@ class larry(object):
                 ==========  =====================================
                 'loop'      brute force python loop (default)
                 'strides'   strides tricks (ndim < 4)
+                'fast'      rolling sorted window
                 ==========  =====================================
+            Method 'fast' is much faster than the others for the median (its
+            cost does not grow with the window).
 
         Returns
         -------
@@ -2859,7 +3248,7 @@ class larry(object):
         
         """
         x = move_nanmedian(self.x, window, axis=axis, method=method)
-        return larry(x, self.copylabel(), validate=False)
+        return larry(x, self._sharelabel(), validate=False)
 
     def move_func(self, func, window, axis=-1, method='loop', **kwargs):
         """
@@ -2914,7 +3303,204 @@ class larry(object):
 
         """
         x = move_func(func, self.x, window, axis=axis, method=method)
-        return larry(x, self.copylabel(), validate=False)
+        return larry(x, self._sharelabel(), validate=False)
+
+    def move_ewmean(self, span=None, halflife=None, axis=-1):
+        """
+        Exponentially weighted moving mean along the specified axis, ignoring
+        NaNs.
+        
+        Parameters
+        ----------
+        span : {scalar, None}, optional
+            The decay in terms of span, span >= 1; the weight of an element
+            decays by a factor of 1 - 2 / (span + 1) with each step. Give
+            either `span` or `halflife`.
+        halflife : {scalar, None}, optional
+            The decay in terms of half-life, halflife > 0; the weight of an
+            element halves every `halflife` steps.
+        axis : int, optional
+            The axis over which to perform the moving mean. By default the
+            moving mean is taken over the last axis (-1).
+
+        Returns
+        -------
+        y : larry
+            The exponentially weighted moving mean along the specified axis,
+            ignoring NaNs. (The mean is NaN until the first non-NaN
+            element.) The output has the same shape as the input.
+            
+        See Also
+        --------
+        la.farray.move_nanewmean: Exponentially weighted moving mean of an
+                                  array.
+        
+        Examples
+        --------
+        >>> lar = larry([1, 2, la.nan, 4])
+        >>> lar.move_ewmean(span=3)
+        label_0
+            0
+            1
+            2
+            3
+        x
+        array([ 1.        ,  1.66666667,  1.66666667,  3.36363636])
+            
+        """
+        x = move_nanewmean(self.x, span=span, halflife=halflife, axis=axis)
+        return larry(x, self._sharelabel(), validate=False)
+
+    def move_ewvar(self, span=None, halflife=None, axis=-1):
+        """
+        Exponentially weighted moving variance along the specified axis,
+        ignoring NaNs.
+        
+        Parameters
+        ----------
+        span : {scalar, None}, optional
+            The decay in terms of span, span >= 1; the weight of an element
+            decays by a factor of 1 - 2 / (span + 1) with each step. Give
+            either `span` or `halflife`.
+        halflife : {scalar, None}, optional
+            The decay in terms of half-life, halflife > 0; the weight of an
+            element halves every `halflife` steps.
+        axis : int, optional
+            The axis over which to perform the moving variance. By default
+            the moving variance is taken over the last axis (-1).
+
+        Returns
+        -------
+        y : larry
+            The exponentially weighted moving variance (not bias corrected)
+            along the specified axis, ignoring NaNs. The output has the same
+            shape as the input.
+            
+        See Also
+        --------
+        la.farray.move_nanewvar: Exponentially weighted moving variance of
+                                 an array.
+        
+        Examples
+        --------
+        >>> lar = larry([1, 2, la.nan, 4])
+        >>> lar.move_ewvar(span=3)
+        label_0
+            0
+            1
+            2
+            3
+        x
+        array([ 0.        ,  0.22222222,  0.22222222,  1.14049587])
+            
+        """
+        x = move_nanewvar(self.x, span=span, halflife=halflife, axis=axis)
+        return larry(x, self._sharelabel(), validate=False)
+
+    def move_ewstd(self, span=None, halflife=None, axis=-1):
+        """
+        Exponentially weighted moving standard deviation along the specified
+        axis, ignoring NaNs.
+        
+        Parameters
+        ----------
+        span : {scalar, None}, optional
+            The decay in terms of span, span >= 1; the weight of an element
+            decays by a factor of 1 - 2 / (span + 1) with each step. Give
+            either `span` or `halflife`.
+        halflife : {scalar, None}, optional
+            The decay in terms of half-life, halflife > 0; the weight of an
+            element halves every `halflife` steps.
+        axis : int, optional
+            The axis over which to perform the moving standard deviation. By
+            default the moving standard deviation is taken over the last
+            axis (-1).
+
+        Returns
+        -------
+        y : larry
+            The exponentially weighted moving standard deviation along the
+            specified axis, ignoring NaNs. The output has the same shape as
+            the input.
+            
+        See Also
+        --------
+        la.farray.move_nanewstd: Exponentially weighted moving standard
+                                 deviation of an array.
+        
+        Examples
+        --------
+        >>> lar = larry([1, 2, la.nan, 4])
+        >>> lar.move_ewstd(span=3)
+        label_0
+            0
+            1
+            2
+            3
+        x
+        array([ 0.        ,  0.47140452,  0.47140452,  1.06794001])
+            
+        """
+        x = move_nanewstd(self.x, span=span, halflife=halflife, axis=axis)
+        return larry(x, self._sharelabel(), validate=False)
+
+    def move_ewcov(self, other, span=None, halflife=None, axis=-1):
+        """
+        Exponentially weighted moving covariance with another larry along the
+        specified axis, ignoring NaNs.
+        
+        Parameters
+        ----------
+        other : larry
+            The other larry. The larrys are aligned as in binary operations
+            (an inner join of the labels).
+        span : {scalar, None}, optional
+            The decay in terms of span, span >= 1; the weight of an element
+            decays by a factor of 1 - 2 / (span + 1) with each step. Give
+            either `span` or `halflife`.
+        halflife : {scalar, None}, optional
+            The decay in terms of half-life, halflife > 0; the weight of an
+            element halves every `halflife` steps.
+        axis : int, optional
+            The axis over which to perform the moving covariance. By default
+            the moving covariance is taken over the last axis (-1).
+
+        Returns
+        -------
+        y : larry
+            The exponentially weighted moving covariance (not bias corrected)
+            along the specified axis. Only the pairs of elements where
+            neither larry is NaN are used.
+            
+        See Also
+        --------
+        la.farray.move_nanewcov: Exponentially weighted moving covariance of
+                                 two arrays.
+        
+        Examples
+        --------
+        >>> lar1 = larry([1, 2, 3, 4])
+        >>> lar2 = larry([1, 3, 2, 5])
+        >>> lar1.move_ewcov(lar2, span=3)
+        label_0
+            0
+            1
+            2
+            3
+        x
+        array([ 0.        ,  0.44444444,  0.08163265,  1.15555556])
+            
+        """
+        if not isinstance(other, larry):
+            raise TypeError, '`other` must be a larry.'
+        if self._label == other._label:
+            x, y = self.x, other.x
+            label = self._sharelabel()
+        else:
+            x, y, label = self.__align(other)
+            x, y = np.broadcast_arrays(x, y)
+        x = move_nanewcov(x, y, span=span, halflife=halflife, axis=axis)
+        return larry(x, label, validate=False)
 
     @np.deprecate(new_name='move_sum')
     def movingsum(self, window, axis=-1, norm=False):
@@ -2940,7 +3526,7 @@ class larry(object):
         
     # Calc ------------------------------------------------------------------
 
-    def demean(self, axis=None):
+    def demean(self, axis=None, out=None):
         """
         Subtract the mean along the specified axis.
         
@@ -2949,6 +3535,10 @@ class larry(object):
         axis : {int, None}, optional
             The axis along which to remove the mean. The default (None) is
             to subtract the mean of the flattened larry.
+        out : {None, larry, ndarray}, optional
+            A preallocated larry (with the same label as the result) or array
+            (with the same shape as the result) to write the result into. By
+            default (None) a new larry is returned.
 
         Returns
         -------
@@ -2968,7 +3558,12 @@ class larry(object):
         array([-1.5, -0.5,  0.5,  1.5])
             
         """
-        return larry(demean(self.x, axis), self.copylabel(), validate=False)
+        if out is None:
+            x = demean(self.x, axis)
+            return larry(x, self._sharelabel(), validate=False)
+        x, y = self.__out(out)
+        demean(self.x, axis, x)
+        return y
 
     def demedian(self, axis=None):
         """
@@ -2998,9 +3593,9 @@ class larry(object):
         array([-1.5, -0.5,  0.5,  1.5])
             
         """
-        return larry(demedian(self.x, axis), self.copylabel(), validate=False)
+        return larry(demedian(self.x, axis), self._sharelabel(), validate=False)
         
-    def zscore(self, axis=None):
+    def zscore(self, axis=None, out=None):
         """
         Z-score along the specified axis.
         
@@ -3009,6 +3604,10 @@ class larry(object):
         axis : {int, None}, optional
             The axis along which to take the z-score. The default (None) is
             to find the z-score of the flattened larry.
+        out : {None, larry, ndarray}, optional
+            A preallocated larry (with the same label as the result) or array
+            (with the same shape as the result) to write the result into. By
+            default (None) a new larry is returned.
         
         Returns
         -------
@@ -3027,7 +3626,12 @@ class larry(object):
         array([-1.22474487,  0.        ,  1.22474487])
             
         """
-        return larry(zscore(self.x, axis), self.copylabel(), validate=False)
+        if out is None:
+            x = zscore(self.x, axis)
+            return larry(x, self._sharelabel(), validate=False)
+        x, y = self.__out(out)
+        zscore(self.x, axis, x)
+        return y
       
     def ranking(self, axis=0, norm='-1,1'):
         """
@@ -3066,7 +3670,7 @@ class larry(object):
         all columns.
 
         """
-        return larry(ranking(self.x, axis, norm=norm), self.copylabel(),
+        return larry(ranking(self.x, axis, norm=norm), self._sharelabel(),
                      validate=False)
 
     def quantile(self, q, axis=0):
@@ -3105,7 +3709,7 @@ class larry(object):
         array([-1., -1.,  0.,  0.,  1.,  1.])
             
         """
-        label = self.copylabel()
+        label = self._sharelabel()
         x = quantile(self.x, q, axis=axis)       
         return larry(x, label, validate=False)
         
@@ -3154,9 +3758,9 @@ class larry(object):
             raise TypeError, 'group must be a larry'
         if group.ndim != 1:
             raise ValueError, 'group must be a 1d larry'
-        if len(frozenset(self.label[axis]) - frozenset(group.label[0])):
+        if len(frozenset(self._label[axis]) - frozenset(group._label[0])):
             raise IndexError, 'label is not a subset of group label'
-        g = group.morph(self.label[axis], 0)
+        g = group.morph(self._label[axis], 0)
         g = g.x.tolist()
         return g 
                                                                  
@@ -3205,10 +3809,11 @@ class larry(object):
         """
         if axis >= self.ndim:
             raise IndexError, 'axis out of range'
-        if self.label[axis] == label:
+        if self._label[axis] == label:
             return self.copy()
         else:    
-            idx, idx_miss = listmap_fill(self.label[axis], label)           
+            label = labelcopy(label)
+            idx, idx_miss = labelmap_fill(self._label[axis], label)
             if len(idx) == len(idx_miss):
                 # None of the elements we want are in the input larry
                 shape = list(self.x.shape)
@@ -3229,10 +3834,10 @@ class larry(object):
                         x = x.astype(float)
                         miss = missing_marker(x)
                     x[index] = miss      
-            lab = self.copylabel()
-            if len(set(label)) != len(label):
+            lab = self._sharelabel()
+            if not label.isunique():
                 raise IndexError("`label` contains duplicates")
-            lab[axis] = list(label)
+            lab[axis] = label
         return larry(x, lab, validate=False)
         
     def morph_like(self, lar):
@@ -3286,13 +3891,48 @@ class larry(object):
         """
         if self.ndim != lar.ndim:
             raise IndexError, 'larrys must be of the same dimension.'
-        if self.ndim == 0:
-            y = self.copy()
+        if self._label == lar._label:
+            return self.copy()
+        # Map the labels one axis at a time and then take along all axes in
+        # a single pass
+        label = self._sharelabel()
+        index = [None] * self.ndim
+        missing = []
+        allmissing = False
+        for ax in range(self.ndim):
+            lab = lar._label[ax]
+            if self._label[ax] == lab:
+                continue
+            lab = labelcopy(lab)
+            idx, idx_miss = labelmap_fill(self._label[ax], lab)
+            if not lab.isunique():
+                raise IndexError("`label` contains duplicates")
+            label[ax] = lab
+            index[ax] = idx
+            if len(idx_miss) > 0:
+                missing.append((ax, idx_miss))
+            if len(idx) == len(idx_miss):
+                # None of the elements we want are in the input larry
+                allmissing = True
+        x = self.x
+        if allmissing:
+            if missing_marker(x) == NotImplemented:
+                x = x.astype(float)
+            x = nans([len(lab) for lab in label], dtype=x.dtype)
         else:
-            y = self
-        for i in range(self.ndim):
-            y = y.morph(lar.getlabel(i), axis=i)     
-        return y        
+            x = take_axes(x, index)
+            if x is self.x:
+                x = x.copy()
+            elif len(missing) > 0:
+                miss = missing_marker(x)
+                if miss == NotImplemented:
+                    x = x.astype(float)
+                    miss = missing_marker(x)
+                for ax, idx_miss in missing:
+                    idx = [slice(None)] * self.ndim
+                    idx[ax] = idx_miss
+                    x[idx] = miss
+        return larry(x, label, validate=False)
 
     def merge(self, other, update=False):
         """
@@ -3341,9 +3981,9 @@ class larry(object):
         lar1 = self
         lar2 = other
         for ax in range(ndim):
-            if lar1.label[ax] != lar2.label[ax]:
-                mergelabel = set(lar1.label[ax] + lar2.label[ax])
-                mergelabel = sorted(mergelabel)
+            if lar1._label[ax] != lar2._label[ax]:
+                mergelabel = joinlabel(lar1._label[ax], lar2._label[ax],
+                                       'outer')[0]
                 lar1 = lar1.morph(mergelabel, ax)
                 lar2 = lar2.morph(mergelabel, ax)
      
@@ -3408,10 +4048,9 @@ class larry(object):
         array([1, 2])             
         
         """
-        idx = [i for i, z in enumerate(self.shape) if z != 1]
-        label = []
-        for i in idx:
-            label.append(self.label[i])    
+        label = self._sharelabel()
+        label = _SharedLabel([label[i] for i, z in enumerate(self.shape)
+                              if z != 1])
         x = self.x.squeeze()
         return larry(x, label, validate=False)
 
@@ -3469,13 +4108,13 @@ class larry(object):
             raise IndexError, 'axis cannot be None.'
         if nlag > 0:
             y = self.copy()
-            y.label[axis] = y.label[axis][nlag:]
+            y._label[axis] = y._label[axis][nlag:]
             index = [slice(None)] * self.ndim
             index[axis] = slice(0, -nlag)            
             y.x = y.x[index]
         elif nlag < 0:
             y = self.copy()
-            y.label[axis] = y.label[axis][:nlag]
+            y._label[axis] = y._label[axis][:nlag]
             index = [slice(None)] * self.ndim
             index[axis] = slice(-nlag, None)            
             y.x = y.x[index]
@@ -3568,8 +4207,15 @@ class larry(object):
         shape = self.shape    
         for ax in axes:
             if shape[ax] > 1:        
-                index = sorted(self.label[ax], reverse=reverse)
-                y = y.morph(index, ax)
+                lab = self._label[ax]
+                if type(lab) is ArrayLabel:
+                    idx = lab.values.argsort(kind='mergesort')
+                    if reverse:
+                        idx = idx[::-1]
+                    index = lab.take(idx)
+                else:
+                    index = Label(sorted(lab, reverse=reverse))
+                y = y.morph(_keepunique(lab, index), ax)
             else:
                 y = y.copy()
         return y
@@ -3644,7 +4290,7 @@ class larry(object):
             axes = [axis]
         flip = slice(None, None, -1)    
         for ax in axes:                
-            y.label[ax] = y.label[ax][flip]    
+            y._label[ax] = labelslice(y._label[ax], flip)
             index = [slice(None)] * y.ndim
             index[ax] = flip
             y.x = y.x[index] 
@@ -3735,10 +4381,16 @@ class larry(object):
         
         """
         if axis is None:
-            for ax in range(self.ndim):
-                np.random.shuffle(self.label[ax]) 
+            axes = range(self.ndim)
         else:
-            np.random.shuffle(self.label[axis])
+            axes = [axis]
+        for ax in axes:
+            lab = self._ownlabel()[ax]
+            if isinstance(lab, list):
+                np.random.shuffle(lab)
+            else:
+                # ArrayLabels and RangeLabels cannot be changed in place
+                self._label[ax] = lab.take(np.random.permutation(len(lab)))
             
     # Missing ----------------------------------------------------------------
 
@@ -3799,7 +4451,7 @@ class larry(object):
         array([False, False], dtype=bool)        
         
         """   
-        label = self.copylabel()
+        label = self._sharelabel()
         x = ismissing(self)
         return larry(x, label, validate=False)
 
@@ -3837,7 +4489,7 @@ class larry(object):
         for ax in range(ndim):
             sl = [None] * ndim
             if ax in axes:
-                labsnew.append(y.label[ax])
+                labsnew.append(y._label[ax])
                 sl[ax] = slice(None)
                 idxsl.append(np.arange(y.shape[ax])[sl])
                 continue
@@ -3850,12 +4502,13 @@ class larry(object):
                 count = count.sum(-1)
     
             xtmp = xtmp > (1.0 - fraction) * count
-            labsnew.append([y.label[ax][ii] for ii in np.nonzero(xtmp)[0]])
+            labsnew.append(Label([y._label[ax][ii] for ii in
+                                  np.nonzero(xtmp)[0]]))
             sl[ax] = slice(None)
             idxsl.append(np.nonzero(xtmp)[0][sl])
         
         y.x = y.x[idxsl]
-        y.label = labsnew
+        y._label = labsnew
         
         if y.x.size == 0: 
             # Empty larry left over
@@ -3863,14 +4516,49 @@ class larry(object):
         else:
             return y
             
-    def push(self, window, axis=-1):
-        """Fill missing values (NaNs) with most recent non-missing values if
+    def push(self, window, axis=-1, out=None):
+        """
+        Fill missing values (NaNs) with most recent non-missing values if
         recent, where recent is defined by the window. The filling proceeds
         from left to right along each row.
+        
+        Parameters
+        ----------
+        window : scalar
+            A missing value is filled if the most recent non-missing value
+            along `axis` is at most `window` elements back.
+        axis : int, optional
+            The axis along which to fill. The default is the last axis (-1).
+        out : {None, larry, ndarray}, optional
+            A preallocated larry (with the same label as the result) or array
+            (with the same shape as the result) to write the result into. By
+            default (None) a new larry is returned. Use lar.push(window,
+            out=lar) to fill lar in place.
+
+        Returns
+        -------
+        y : larry
+            A copy, or `out`, with the missing values filled.
+
+        Examples
+        --------
+        >>> y = larry([1, la.nan, la.nan, 4])
+        >>> y.push(1)
+        label_0
+            0
+            1
+            2
+            3
+        x
+        array([  1.,   1.,  NaN,   4.])
+        
         """
-        label = self.copylabel()
-        x = push(self.x, window, axis=axis)
-        return larry(x, label, validate=False)
+        if out is None:
+            x = push(self.x, window, axis=axis)
+            return larry(x, self._sharelabel(), validate=False)
+        x, y = self.__out(out)
+        push(self.x, window, axis=axis, out=x)
+        return y
         
     def vacuum(self, axis=None):
         """
@@ -3916,7 +4604,7 @@ class larry(object):
         for ax in range(ndim):
             sl = [None]*ndim
             if ax not in axes:
-                labsnew.append(y.label[ax])
+                labsnew.append(y._label[ax])
                 sl[ax] = slice(None)
                 idxsl.append(np.arange(y.shape[ax])[sl])
                 continue
@@ -3926,12 +4614,13 @@ class larry(object):
             for _ in range(ndim-1):
                 xtmp = xtmp.any(-1)
     
-            labsnew.append([y.label[ax][ii] for ii in np.nonzero(xtmp)[0]])
+            labsnew.append(Label([y._label[ax][ii] for ii in
+                                  np.nonzero(xtmp)[0]]))
             sl[ax] = slice(None)
             idxsl.append(np.nonzero(xtmp)[0][sl])
         
         y.x = y.x[idxsl]
-        y.label = labsnew
+        y._label = labsnew
         return y        
         
     def nan_replace(self, replace_with=0):
@@ -3950,7 +4639,7 @@ class larry(object):
                     
         """
         y = self.copy()
-        bn.replace(y.x, np.nan, replace_with)
+        blockfunc(_nan_replace, y.x.size)(y.x, replace_with, out=y.x)
         return y
 
     # Size, shape, type ------------------------------------------------------
@@ -4065,7 +4754,7 @@ class larry(object):
         array([1, 2, 2])
                 
         """
-        label = self.copylabel()
+        label = self._sharelabel()
         x = self.x.astype(dtype)
         return larry(x, label, validate=False)
         
@@ -4101,7 +4790,7 @@ class larry(object):
         """
         y = self.copy()
         y.x = y.x.T
-        y.label = y.label[::-1]
+        y._label = y._label[::-1]
         return y 
         
     def swapaxes(self, axis1, axis2):
@@ -4154,7 +4843,7 @@ class larry(object):
                         
         """
         y = self.copy()
-        y.label[axis1], y.label[axis2] =  y.label[axis2], y.label[axis1]
+        y._label[axis1], y._label[axis2] =  y._label[axis2], y._label[axis1]
         y.x = np.swapaxes(y.x, axis1, axis2)
         return y
             
@@ -4204,7 +4893,7 @@ class larry(object):
         array([1, 2, 3, 4])
    
         """
-        label = flattenlabel(self.label, order)
+        label = flattenlabel(self._label, order)
         x = self.x.flatten(order)
         return larry(x, label, validate=False)
         
@@ -4267,7 +4956,7 @@ class larry(object):
             if not isscalar(self.x.flat[0]):
                 msg = 'Only scalar dtype is currently supported.'
                 raise NotImplementedError, msg 
-            labels = zip(*self.label[0])
+            labels = zip(*self._label[0])
             x, label = fromlists(self.x, labels)     
             return larry(x, label)
                         
@@ -4323,7 +5012,7 @@ class larry(object):
             raise ValueError, "`axis` cannot be None."
         x = self.getx(copy=True)
         x = np.expand_dims(x, axis)
-        lab = self.copylabel()
+        lab = self._sharelabel()
         if int(axis) == -1:
             ax = len(lab)
         elif int(axis) < -1:
@@ -4355,7 +5044,7 @@ class larry(object):
         
         """
         yf = self.flatten()
-        z = zip(*yf.label[0])
+        z = zip(*yf._label[0])
         z.append(yf.x.tolist())
         return zip(*z)
 
@@ -4765,7 +5454,7 @@ class larry(object):
         if ndim == 1:
 
             for i in range(self.size):
-                line = [str(self.label[0][i]), str(self.x[i]) + '\n']
+                line = [str(self._label[0][i]), str(self.x[i]) + '\n']
                 line = delimiter.join(line)
                 f.write(line)
 
@@ -4775,14 +5464,14 @@ class larry(object):
             f.write(delimiter)
             line = []
             for i in range(self.shape[1]):
-                line.append(str(self.label[1][i]))
+                line.append(str(self._label[1][i]))
             line = delimiter.join(line)
             line += '\n'
             f.write(line)
             
             # Row labels and array data
             for i in range(self.shape[0]):
-                line = [str(self.label[0][i])]
+                line = [str(self._label[0][i])]
                 for j in range(self.shape[1]):
                     line.append(str(self.x[i,j]))
                 line = delimiter.join(line)
@@ -4819,7 +5508,7 @@ class larry(object):
         array([1, 2])
             
         """
-        label = [list(z) for z in self.label]
+        label = self._sharelabel()
         x = self.x.copy()
         return larry(x, label, validate=False)
         
@@ -4835,7 +5524,7 @@ class larry(object):
         [['a', 'b']]
         
         """
-        return [list(z) for z in self.label]
+        return map(labelcopy, self._label)
         
     def copyx(self):
         """Return a copy of a larry's data as a Numpy array.
@@ -4858,16 +5547,16 @@ class larry(object):
 
         # Labels
         pad = '    '
-        for i, label in enumerate(self.label):
+        for i, label in enumerate(self._label):
             x.append('label_%d\n' % i)
             if len(label) > 10:
-                x.append(pad + str(self.label[i][0]) + '\n')
-                x.append(pad + str(self.label[i][1]) + '\n')
-                x.append(pad + str(self.label[i][2]) + '\n')
+                x.append(pad + str(self._label[i][0]) + '\n')
+                x.append(pad + str(self._label[i][1]) + '\n')
+                x.append(pad + str(self._label[i][2]) + '\n')
                 x.append(pad + '...\n')
-                x.append(pad + str(self.label[i][-3]) + '\n')
-                x.append(pad + str(self.label[i][-2]) + '\n')
-                x.append(pad + str(self.label[i][-1]) + '\n')
+                x.append(pad + str(self._label[i][-3]) + '\n')
+                x.append(pad + str(self._label[i][-2]) + '\n')
+                x.append(pad + str(self._label[i][-1]) + '\n')
             else:
                 for l in label:
                     x.append(pad + str(l) + '\n')       
@@ -4897,9 +5586,9 @@ class Lix(object):
             msg += 'such as (0,) and (2, 0 ,3).'
             raise ValueError, msg
         typ = type(index)
-        if typ == list:
+        if issubclass(typ, list):
             # Example: lar.lix[['a', 'b', 'c']]
-            index2 = labels2indices(y.label[0], index)
+            index2 = labels2indices(y._label[0], index)
             if len(index) == 1:
                 index2 = index2[0]
             return y[index2]
@@ -4918,15 +5607,15 @@ class Lix(object):
                 raise IndexError, 'Invalid index'
             for ax, idx in enumerate(index3):
                 typ = type(idx)
-                if typ == list:
-                    idx2 = labels2indices(y.label[ax], idx)
+                if issubclass(typ, list):
+                    idx2 = labels2indices(y._label[ax], idx)
                     if len(idx) > 1:
                         label.append(idx)
                     index2.append(idx2)
                 elif typ == slice:
                     s = slicemaker(idx, y.labelindex, ax)
                     slar = range(*s.indices(y.shape[ax]))
-                    lab = y.label[ax][s]
+                    lab = labelslice(y._label[ax], s)
                     if len(lab) > 1:
                         label.append(lab)
                     index2.append(slar)
@@ -4956,9 +5645,9 @@ class Lix(object):
             msg += 'such as (0,) and (2, 0 ,3).'
             raise ValueError, msg
         typ = type(index)
-        if typ == list:
+        if issubclass(typ, list):
             # Example: lar.lix[['a', 'b', 'c']]
-            index2 = labels2indices(y.label[0], index)
+            index2 = labels2indices(y._label[0], index)
             if len(index) == 1:
                 index2 = index2[0]
             y[index2] = value
@@ -4977,15 +5666,15 @@ class Lix(object):
                 raise IndexError, 'Invalid index'
             for ax, idx in enumerate(index3):
                 typ = type(idx)
-                if typ == list:
-                    idx2 = labels2indices(y.label[ax], idx)
+                if issubclass(typ, list):
+                    idx2 = labels2indices(y._label[ax], idx)
                     if len(idx) > 1:
                         label.append(idx)
                     index2.append(idx2)
                 elif typ == slice:
                     s = slicemaker(idx, y.labelindex, ax)
                     slar = range(*s.indices(y.shape[ax]))
-                    lab = y.label[ax][s]
+                    lab = labelslice(y._label[ax], s)
                     if len(lab) > 1:
                         label.append(lab)
                     index2.append(slar)
@@ -4997,8 +5686,8 @@ class Lix(object):
                 if value.ndim != len(index2):
                     raise IndexError, '`value` has wrong ndim'
                 for ax, ix2 in enumerate(index2):
-                    lab = [y.label[ax][i] for i in ix2]
-                    if lab != value.label[ax]:
+                    lab = [y._label[ax][i] for i in ix2]
+                    if lab != value._label[ax]:
                         raise IndexError, 'larry labels are not aligned'
                 y.x[np.ix_(*index2)] = value.x
             else:
@@ -5015,7 +5704,7 @@ def slicemaker(index, labelindex, axis):
     msg2 = 'The %s element of the slice contains more than one item.'
     if index.start is None:
         start = None
-    elif type(index.start) is list:
+    elif isinstance(index.start, list):
         if len(index.start) > 1:
             raise ValueError, msg2 % 'start'    
         start = labelindex(index.start[0], axis=axis)
@@ -5025,7 +5714,7 @@ def slicemaker(index, labelindex, axis):
         raise ValueError, msg1 % 'start'    
     if index.stop is None:
         stop = None
-    elif type(index.stop) is list:
+    elif isinstance(index.stop, list):
         if len(index.stop) > 1:
             raise ValueError, msg2 % 'start'    
         stop = labelindex(index.stop[0], axis=axis)
@@ -5042,3 +5731,78 @@ def labels2indices(label, labels):
     except ValueError:
         raise ValueError, 'Could not map label to index value.'
     return indices  
+
+# Functions used by larry.__compare
+_COMPARISONS = {'==': operator.eq, '!=': operator.ne, '<': operator.lt,
+                '>': operator.gt, '<=': operator.le, '>=': operator.ge}
+
+def _nan_replace(x, replace_with, out):
+    "Replace NaNs in `out` (which is `x`) in place; used by nan_replace."
+    bn.replace(out, np.nan, replace_with)
+
+def _broadcast_axes(big, small, axes=None):
+    """
+    Axes of larry `big` that the axes of larry `small`, which has fewer
+    dimensions, line up with when broadcasting.
+    
+    If `axes` is None the axes are found from the labels: each axis of
+    `small` lines up with the axis of `big` that has the same label or,
+    if there is no such axis, with the axis whose label overlaps the label
+    of `small`. An IndexError is raised if that does not single out one
+    axis.
+    
+    """
+    ndim = big.ndim
+    if axes is None:
+        axes = _broadcast_labelaxes(big._label, small._label)
+    else:
+        if np.isscalar(axes):
+            axes = [axes]
+        axes = list(axes)
+        if len(axes) != small.ndim:
+            msg = 'Need one axis for each of the %d dimensions of the larry '
+            msg += 'with fewer dimensions'
+            raise ValueError, msg % small.ndim
+        for i, ax in enumerate(axes):
+            if ax < -ndim or ax >= ndim:
+                raise IndexError, 'Axis %d out of range' % ax
+            axes[i] = ax % ndim
+        if len(set(axes)) != len(axes):
+            raise ValueError, 'Repeated axis'
+    return axes
+
+def _broadcast_labelaxes(biglabel, smalllabel):
+    """
+    Axes of the label `biglabel` that the axes of the label `smalllabel`,
+    which has fewer dimensions, line up with; see _broadcast_axes.
+    
+    """
+    ndim = len(biglabel)
+    axes = []
+    for lab in smalllabel:
+        unused = [ax for ax in range(ndim) if ax not in axes]
+        match = [ax for ax in unused if biglabel[ax] == lab]
+        if len(match) == 0:
+            lab = frozenset(lab)
+            match = [ax for ax in unused
+                     if not lab.isdisjoint(biglabel[ax])]
+        if len(match) != 1:
+            msg = 'Cannot tell which axes of the larry with %d '
+            msg += 'dimensions to broadcast along; use `broadcast` of '
+            msg += 'la.binaryop'
+            raise IndexError, msg % ndim
+        axes.append(match[0])
+    return axes
+
+def _broadcast_view(x, axes, ndim):
+    """
+    View of array `x`, whose axes line up with `axes` of an array with
+    `ndim` dimensions, that broadcasts against that array.
+    
+    """
+    order = sorted(range(len(axes)), key=axes.__getitem__)
+    x = x.transpose(order)
+    index = [None] * ndim
+    for ax in axes:
+        index[ax] = slice(None)
+    return x[tuple(index)]
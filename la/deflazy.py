@@ -0,0 +1,348 @@
+"Lazy larry expressions"
+
+import operator
+
+import numpy as np
+
+from la.deflarry import (larry, _SharedLabel, _broadcast_labelaxes,
+                         _broadcast_view)
+from la.deflabel import labelcopy
+from la.flabel import joinlabel, labelmap_fill
+from la.farray import take_axes
+
+__all__ = ['lazy']
+
+# Target number of elements in each block of the output that an expression
+# is evaluated on; small enough that the intermediate arrays of a block stay
+# in cache
+CHUNKSIZE = 65536
+
+
+class lazy(object):
+    """
+    Deferred larry expression.
+
+    Arithmetic on a lazy records the operation instead of computing it.
+    When the expression is evaluated the labels of all the larrys in it
+    are joined once (an inner join, just as with the binary operators of
+    larry), each larry is taken from the joined label in a single pass,
+    and the whole expression is computed block by block so that no
+    intermediate larry or full size intermediate array is created. The
+    result is identical to evaluating the expression with larrys.
+
+    Parameters
+    ----------
+    lar : {larry, lazy}
+        The larry that the expression starts with.
+
+    Notes
+    -----
+    The supported operations are +, -, *, / (with larrys, lazys or
+    scalars), unary -, abs, log, exp, sqrt, and power (**). Because the
+    binary operators of larry only accept larrys, arrays and scalars, the
+    left-most larry of an expression must be wrapped by lazy; larrys that
+    appear later in the expression do not need to be.
+
+    Examples
+    --------
+    >>> from la import larry, lazy
+    >>> a = larry([1.0, 2.0, 3.0], [['a', 'b', 'c']])
+    >>> b = larry([1.0, 1.0], [['b', 'c']])
+    >>> c = larry([2.0, 4.0, 8.0], [['c', 'b', 'd']])
+    >>> expr = (lazy(a) - b) / c
+    >>> expr.evaluate()
+    label_0
+        b
+        c
+    x
+    array([ 0.25,  1.  ])
+
+    """
+
+    def __init__(self, lar):
+        if isinstance(lar, lazy):
+            self._func = lar._func
+            self._args = lar._args
+        elif isinstance(lar, larry):
+            self._func = None
+            self._args = (lar,)
+        else:
+            raise TypeError, 'Input must be a larry.'
+
+    @classmethod
+    def _node(cls, func, *args):
+        "Expression node that applies func to args."
+        node = object.__new__(cls)
+        node._func = func
+        node._args = args
+        return node
+
+    def _binary(self, func, other):
+        if isinstance(other, larry):
+            other = lazy(other)
+        elif not isinstance(other, lazy) and not np.isscalar(other):
+            raise TypeError, 'Input must be scalar, larry, or lazy.'
+        return lazy._node(func, self, other)
+
+    # Operations ------------------------------------------------------------
+
+    def __add__(self, other):
+        return self._binary(operator.add, other)
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        return self._binary(operator.sub, other)
+
+    def __rsub__(self, other):
+        # Same as larry.__rsub__
+        return -self.__sub__(other)
+
+    def __mul__(self, other):
+        return self._binary(operator.mul, other)
+
+    __rmul__ = __mul__
+
+    def __div__(self, other):
+        return self._binary(operator.div, other)
+
+    def __rdiv__(self, other):
+        if not np.isscalar(other):
+            raise TypeError, 'Input must be scalar, larry, or lazy.'
+        return lazy._node(_rdiv, self, other)
+
+    def __neg__(self):
+        return lazy._node(operator.neg, self)
+
+    def __pos__(self):
+        return self
+
+    def abs(self):
+        "Element by element absolute value."
+        return lazy._node(np.absolute, self)
+
+    __abs__ = abs
+
+    def log(self):
+        "Element by element base e logarithm."
+        return lazy._node(np.log, self)
+
+    def exp(self):
+        "Element by element exponential."
+        return lazy._node(np.exp, self)
+
+    def sqrt(self):
+        "Element by element square root."
+        return lazy._node(np.sqrt, self)
+
+    def power(self, q):
+        "Element by element x**q."
+        if not np.isscalar(q):
+            raise TypeError, 'q must be a scalar.'
+        return lazy._node(np.power, self, q)
+
+    __pow__ = power
+
+    # Evaluation ------------------------------------------------------------
+
+    def evaluate(self):
+        """
+        Evaluate the expression.
+
+        Larrys with fewer dimensions are broadcast against larrys with more
+        dimensions just as with the binary operators of larry.
+
+        Returns
+        -------
+        y : larry
+            The value of the expression.
+
+        Raises
+        ------
+        IndexError
+            If it cannot be told which axes of a larry with more dimensions
+            the axes of a larry with fewer dimensions line up with.
+
+        """
+
+        # Plan: the joined label of each node of the expression and the
+        # axes of the node that the axes of each argument line up with
+        plans = {}
+        label = self._plan(plans)
+        ndim = len(label)
+        shape = tuple(map(len, label))
+
+        # The larrys of the expression, each with the axes of the output
+        # that its axes line up with, and the indices that take it from its
+        # label to the joined label (None if the labels are the same along
+        # an axis)
+        leaves = {}
+        self._leaves(range(ndim), plans, leaves)
+        indices = {}
+        for key, (lar, axes) in leaves.iteritems():
+            index = []
+            for lab, ax in zip(lar._label, axes):
+                lab3 = label[ax]
+                if lab is lab3 or lab == lab3:
+                    index.append(None)
+                else:
+                    idx = labelmap_fill(lab, lab3)[0]
+                    index.append(np.asarray(idx, dtype=np.intp))
+            indices[key] = index
+
+        # Evaluate the expression one block of rows (axis 0) at a time
+        n = shape[0]
+        rowsize = 1
+        for ni in shape[1:]:
+            rowsize *= ni
+        step = max(CHUNKSIZE // max(rowsize, 1), 1)
+        out = None
+        start = 0
+        while True:
+            stop = min(start + step, n)
+            blocks = {}
+            for key, (lar, axes) in leaves.iteritems():
+                index = indices[key]
+                x = lar.x
+                if 0 in axes:
+                    # Rows start:stop of the output
+                    i = axes.index(0)
+                    index = list(index)
+                    if index[i] is None:
+                        x = x[(slice(None),) * i + (slice(start, stop),)]
+                    else:
+                        index[i] = index[i][start:stop]
+                x = take_axes(x, index)
+                if len(axes) < ndim:
+                    x = _broadcast_view(x, axes, ndim)
+                blocks[key] = x
+            y = self._evaluate(range(ndim), plans, blocks, {})
+            if out is None:
+                out = np.empty(shape, dtype=y.dtype)
+            out[start:stop] = y
+            start = stop
+            if start >= n:
+                break
+
+        # The label objects of the input larrys may be part of the label of
+        # the output; mark them copy-on-write, or copy them if they were
+        # handed out (see larry._sharelabel)
+        exposed = set()
+        for lar, axes in leaves.itervalues():
+            if lar._exposed:
+                exposed.update(map(id, lar._label))
+            else:
+                lar._cow = True
+        label = [labelcopy(lab) if id(lab) in exposed else lab
+                 for lab in label]
+        return larry(out, _SharedLabel(label), validate=False)
+
+    def _plan(self, plans):
+        """
+        Label of the expression. The label of each node and, for each
+        argument of the node, the axes of the node that the axes of the
+        argument line up with (None if the argument is not a lazy) are
+        added to the dict `plans` (keyed by id).
+
+        """
+        key = id(self)
+        if key in plans:
+            return plans[key][0]
+        if self._func is None:
+            label = self._args[0]._label
+            argaxes = None
+        else:
+            label = None
+            argaxes = []
+            for arg in self._args:
+                if isinstance(arg, lazy):
+                    lab = arg._plan(plans)
+                    if label is None:
+                        label = lab
+                        argaxes.append(range(len(lab)))
+                    else:
+                        label, axes1, axes2 = _innerjoin(label, lab)
+                        argaxes = [None if a is None else
+                                   [axes1[ax] for ax in a] for a in argaxes]
+                        argaxes.append(axes2)
+                else:
+                    argaxes.append(None)
+        plans[key] = (label, argaxes)
+        return label
+
+    def _leaves(self, axes, plans, leaves):
+        """
+        Add the larrys of the expression to the dict `leaves`, keyed by id
+        and the axes of the output that the axes of the larry line up with.
+        `axes` are the axes of the output that the axes of self line up with.
+
+        """
+        if self._func is None:
+            lar = self._args[0]
+            leaves[(id(lar), tuple(axes))] = (lar, axes)
+        else:
+            for arg, argaxes in zip(self._args, plans[id(self)][1]):
+                if isinstance(arg, lazy):
+                    arg._leaves([axes[ax] for ax in argaxes], plans, leaves)
+
+    def _evaluate(self, axes, plans, blocks, memo):
+        "Value of the expression given the block of each larry."
+        key = (id(self), tuple(axes))
+        if key in memo:
+            return memo[key]
+        if self._func is None:
+            y = blocks[(id(self._args[0]), tuple(axes))]
+        else:
+            args = []
+            for arg, argaxes in zip(self._args, plans[id(self)][1]):
+                if isinstance(arg, lazy):
+                    arg = arg._evaluate([axes[ax] for ax in argaxes], plans,
+                                        blocks, memo)
+                args.append(arg)
+            y = self._func(*args)
+        memo[key] = y
+        return y
+
+    def __repr__(self):
+        if self._func is None:
+            return 'lazy(%r)' % (self._args[0],)
+        return '<lazy larry expression>'
+
+
+def _innerjoin(label1, label2):
+    """
+    Label of a binary operation on larrys with labels label1 and label2,
+    and the axes of that label that the axes of each label line up with.
+    
+    """
+    if len(label1) == len(label2):
+        label = []
+        for ls, lo in zip(label1, label2):
+            if ls == lo:
+                label.append(ls)
+            else:
+                label.append(joinlabel(ls, lo, 'inner')[0])
+        axes = range(len(label))
+        return label, axes, axes
+    # Broadcast the label with fewer dimensions, as larry does
+    if len(label1) > len(label2):
+        big, small = label1, label2
+    else:
+        big, small = label2, label1
+    axes = _broadcast_labelaxes(big, small)
+    label = list(big)
+    for i, ax in enumerate(axes):
+        lb = big[ax]
+        ls = small[i]
+        if lb != ls:
+            if big is label1:
+                label[ax] = joinlabel(lb, ls, 'inner')[0]
+            else:
+                label[ax] = joinlabel(ls, lb, 'inner')[0]
+    if big is label1:
+        return label, range(len(label)), axes
+    return label, axes, range(len(label))
+
+def _rdiv(x, y):
+    "y / x"
+    return y / x
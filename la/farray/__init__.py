@@ -3,3 +3,4 @@ from misc import *
 from normalize import *
 from group import *
 from move import *
+from parallel import *
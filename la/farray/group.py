@@ -41,21 +41,10 @@ def group_ranking(x, groups, norm='-1,1', axis=0):
     
     """
   
-    # Find set of unique groups
-    ugroups = unique_group(groups)
-    
-    # Convert groups to a numpy array
-    groups = np.asarray(groups)
-  
-    # Loop through unique groups and normalize
-    xnorm = np.nan * np.zeros(x.shape)
-    for group in ugroups:
-        idx = groups == group
-        idxall = [slice(None)] * x.ndim
-        idxall[axis] = idx
-        xnorm[idxall] = ranking(x[idxall], axis=axis, norm=norm) 
-           
-    return xnorm
+    xt, rows, codes, ng = _groupfactor(x, groups, axis)
+    rows, bounds = _groupsegments(rows, codes, ng)
+    xnorm = _groupranking(xt, rows, bounds, norm)
+    return _groupunfactor(xnorm, x.shape, axis)
 
 def group_mean(x, groups, axis=0):
     """
@@ -78,24 +67,9 @@ def group_mean(x, groups, axis=0):
 
     """
 
-    # Find set of unique groups
-    ugroups = unique_group(groups)
-    
-    # Convert groups to a numpy array
-    groups = np.asarray(groups)    
-  
-    # Loop through unique groups and normalize
-    xmean = np.nan * np.zeros(x.shape)    
-    for group in ugroups:
-        idx = groups == group
-        idxall = [slice(None)] * x.ndim
-        idxall[axis] = idx
-        if idx.sum() > 0:
-            norm = 1.0 * (~np.isnan(x[idxall])).sum(axis)
-            ns = bn.nansum(x[idxall], axis=axis) / norm
-            xmean[idxall] = np.expand_dims(ns, axis)
-            
-    return xmean
+    xt, rows, codes, ng = _groupfactor(x, groups, axis)
+    xmean = _groupmean(xt, rows, codes, ng)
+    return _groupunfactor(xmean, x.shape, axis)
 
 def group_median(x, groups, axis=0):
     """
@@ -117,23 +91,10 @@ def group_median(x, groups, axis=0):
 
     """
 
-    # Find set of unique groups
-    ugroups = unique_group(groups)
-    
-    # Convert groups to a numpy array
-    groups = np.asarray(groups)    
-  
-    # Loop through unique groups and normalize
-    xmedian = np.nan * np.zeros(x.shape)
-    for group in ugroups:
-        idx = groups == group
-        idxall = [slice(None)] * x.ndim
-        idxall[axis] = idx
-        if idx.sum() > 0:
-            ns = bn.nanmedian(x[idxall], axis=axis)
-            xmedian[idxall] = np.expand_dims(ns, axis)
-            
-    return xmedian
+    xt, rows, codes, ng = _groupfactor(x, groups, axis)
+    rows, bounds = _groupsegments(rows, codes, ng)
+    xmedian = _groupreduce(bn.nanmedian, xt, rows, bounds)
+    return _groupunfactor(xmedian, x.shape, axis)
     
 def unique_group(groups):
     """Find unique groups in list not including None."""    
@@ -142,3 +103,154 @@ def unique_group(groups):
     ugroups = list(ugroups)
     ugroups.sort()
     return ugroups    
+
+def _groupfactor(x, groups, axis):
+    """
+    Factorize `groups` for the group functions.
+    
+    Returns `x` with `axis` first and the other axes flattened (2d), the
+    index of the rows of that array that are in a group (group is not
+    None), the integer code (0 to ng-1, in the order of unique_group) of
+    the group of each of those rows, and the number of groups, ng.
+    
+    """
+    ugroups = unique_group(groups)
+    code = dict(zip(ugroups, range(len(ugroups))))
+    codes = np.array([code.get(g, -1) for g in groups], dtype=np.intp)
+    xt = _group2d(x, axis)
+    if codes.size != xt.shape[0]:
+        msg = 'There must be one group for each element along `axis`.'
+        raise ValueError, msg
+    rows = np.flatnonzero(codes >= 0)
+    return xt, rows, codes[rows], len(ugroups)
+
+def _group2d(x, axis):
+    "`x` with `axis` first and the other axes flattened."
+    xt = np.rollaxis(np.asarray(x), axis, 0)
+    m = 1
+    for n in xt.shape[1:]:
+        m *= n
+    return xt.reshape(xt.shape[0], m)
+
+def _groupunfactor(y, shape, axis):
+    "Inverse of the reshape done by _groupfactor; `shape` of the input."
+    shape = list(shape)
+    n = shape.pop(axis)
+    y = y.reshape([n] + shape)
+    return np.rollaxis(y, 0, range(len(shape) + 1)[axis] + 1)
+
+def _groupsegments(rows, codes, ng):
+    """
+    Sort `rows` by group; return the sorted rows and the (start, stop)
+    of each group in them.
+    
+    The sort is stable so that the rows of a group keep their order.
+    
+    """
+    if ng == 0:
+        return rows, []
+    order = codes.argsort(kind='mergesort')
+    stop = np.bincount(codes, minlength=ng).cumsum()
+    start = np.concatenate(([0], stop[:-1]))
+    return rows[order], zip(start, stop)
+
+# Kernels -------------------------------------------------------------------
+#
+# The kernels work on the 2d array and the factorization returned by
+# _groupfactor (and _groupsegments) so that la.Grouper can factorize once
+# and reuse the factorization. Each returns an array with the shape of the
+# 2d input where every element in a group is replaced by the statistic of
+# its group (and column); elements that are not in a group are NaN.
+
+def _groupsums(xt, rows, codes, ng):
+    """
+    Count and sum, each (ng, m), of the non-NaN elements of each group and
+    column with a single pass over the data; also returns the rows of `xt`
+    that are in a group, `xg`, and the flat (group, column) index of each
+    element of `xg`, `gcol`.
+    
+    """
+    if rows.size == xt.shape[0]:
+        xg = xt
+    else:
+        xg = xt[rows]
+    m = xg.shape[1]
+    gcol = (codes[:, None] * m + np.arange(m)).ravel()
+    count = np.bincount(codes, minlength=ng).repeat(m)
+    nan = xg != xg
+    if nan.any():
+        count -= np.bincount(gcol[nan.ravel()], minlength=ng * m)
+        total = np.bincount(gcol, np.where(nan, 0, xg).ravel(),
+                            minlength=ng * m)
+    else:
+        total = np.bincount(gcol, xg.ravel(), minlength=ng * m)
+    return count.reshape(ng, m), total.reshape(ng, m), xg, gcol
+
+def _groupbroadcast(xt, rows, codes, stat):
+    "Array like `xt` with the (ng, m) group statistic `stat` of each row."
+    y = np.nan * np.zeros(xt.shape)
+    y[rows] = stat[codes]
+    return y
+
+def _groupmean(xt, rows, codes, ng):
+    "Group mean of each element of the 2d array `xt`."
+    if ng == 0:
+        return np.nan * np.zeros(xt.shape)
+    count, total = _groupsums(xt, rows, codes, ng)[:2]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = total / count
+    mean[count == 0] = np.nan
+    return _groupbroadcast(xt, rows, codes, mean)
+
+def _groupsum(xt, rows, codes, ng):
+    "Group sum (NaN if all elements are NaN) of each element of `xt`."
+    if ng == 0:
+        return np.nan * np.zeros(xt.shape)
+    count, total = _groupsums(xt, rows, codes, ng)[:2]
+    total[count == 0] = np.nan
+    return _groupbroadcast(xt, rows, codes, total)
+
+def _groupcount(xt, rows, codes, ng):
+    "Number of non-NaN elements in the group of each element of `xt`."
+    if ng == 0:
+        return np.nan * np.zeros(xt.shape)
+    count = _groupsums(xt, rows, codes, ng)[0]
+    return _groupbroadcast(xt, rows, codes, count)
+
+def _groupstd(xt, rows, codes, ng, ddof=0):
+    "Group standard deviation of each element of the 2d array `xt`."
+    if ng == 0:
+        return np.nan * np.zeros(xt.shape)
+    count, total, xg, gcol = _groupsums(xt, rows, codes, ng)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = total / count
+        # Second pass: sum of squared deviations from the group mean
+        dev = xg - mean[codes]
+        dev *= dev
+        dev[dev != dev] = 0
+        ss = np.bincount(gcol, dev.ravel(), minlength=mean.size)
+        std = np.sqrt(ss.reshape(mean.shape) / (count - ddof))
+    std[count <= ddof] = np.nan
+    return _groupbroadcast(xt, rows, codes, std)
+
+def _groupreduce(func, xt, rows, bounds):
+    """
+    Reduction func(block, axis=0) of each group broadcast to the elements
+    of the group; `rows` and `bounds` are returned by _groupsegments.
+    
+    """
+    y = np.nan * np.zeros(xt.shape)
+    xs = xt[rows]
+    for i, j in bounds:
+        if i < j:
+            y[rows[i:j]] = func(xs[i:j], axis=0)
+    return y
+
+def _groupranking(xt, rows, bounds, norm):
+    "Ranking within the groups; `rows` and `bounds` from _groupsegments."
+    y = np.nan * np.zeros(xt.shape)
+    xs = xt[rows]
+    for i, j in bounds:
+        if i < j:
+            y[rows[i:j]] = ranking(xs[i:j], axis=0, norm=norm)
+    return y
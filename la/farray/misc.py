@@ -3,7 +3,14 @@
 import numpy as np
 import bottleneck as bn
 
-__all__ = ['geometric_mean', 'correlation', 'covMissing', 'shuffle']
+from la.farray.parallel import blockmap, usethreads, get_num_threads
+
+__all__ = ['geometric_mean', 'correlation', 'covMissing', 'corrMissing',
+           'shuffle', 'take_axes']
+
+# Default memory budget, in bytes, of the temporary arrays of covMissing and
+# corrMissing (the N x N output is not counted)
+PAIRWISE_MEMORY = 1 << 27
 
 
 def geometric_mean(x, axis=-1, check_for_greater_than_zero=True):
@@ -133,7 +140,7 @@ def correlation(arr1, arr2, axis=None):
             den = np.sqrt(np.sum(x1**2, axis) * np.sum(x2**2, axis))                
     return num / den 
 
-def covMissing(R):
+def covMissing(R, memory=None):
     """
     Covariance matrix adjusted for missing returns.
 
@@ -142,22 +149,112 @@ def covMissing(R):
 
     Note the mean of each row of R is assumed to be zero. So returns are not
     demeaned and the covariance is normalized by T not T-1.
-    
+
+    The NxN matrix is computed one tile (a block of rows by a block of
+    columns) at a time so that, apart from the output, memory use is
+    bounded by `memory`. Only the tiles on and above the diagonal are
+    computed; the matrix is symmetric. If multithreading is on (see
+    la.set_num_threads) and the output is large, the tiles are computed
+    in the thread pool (the matrix products release the GIL).
+
+    Parameters
+    ----------
+    R : ndarray
+        2d input array of shape (N, T). It is not modified.
+    memory : {int, None}, optional
+        Approximate number of bytes of the temporary arrays (of all the
+        threads). By default (None) la.farray.misc.PAIRWISE_MEMORY
+        (128 MB) is used.
+
+    Returns
+    -------
+    C : ndarray
+        The (N, N) covariance matrix.
+
+    Raises
+    ------
+    ValueError
+        If a pair of rows has fewer than two observations in common.
+
     """
-    R = R.copy()
-    mask = np.isnan(R)
-    np.putmask(R, mask, 0)
-    mask = np.asarray(mask, np.float64)
-    mask = 1 - mask # Change meaning of missing matrix to present matrix  
+    def tile(ai, aj):
+        xi, mi = ai
+        xj, mj = aj
+        normalization = np.dot(mi, mj.T)
+        if np.any(normalization < 2):
+            raise ValueError, 'covMissing: not enough observations'
+        return np.dot(xi, xj.T) / normalization
+    return _pairwise(R, _covprepare, tile, 2, 3, memory)
 
-    normalization = np.dot(mask, mask.T)
+def corrMissing(R, memory=None):
+    """
+    Pairwise correlation matrix of the rows of R, ignoring NaNs.
 
-    if np.any(normalization < 2):
-        raise ValueError, 'covMissing: not enough observations'
+    The correlation of rows i and j uses the observations (columns) in
+    which neither row is NaN; each pair of rows is demeaned over its own
+    common observations. The correlation is NaN if a pair has fewer than
+    two observations in common or if a row is constant over them.
 
-    C = np.dot(R, R.T) / normalization
+    Like covMissing, the NxN matrix is computed tile by tile within a
+    memory budget and, if multithreading is on, in the thread pool.
 
-    return C   
+    Parameters
+    ----------
+    R : ndarray
+        2d input array of shape (N, T). It is not modified.
+    memory : {int, None}, optional
+        Approximate number of bytes of the temporary arrays (of all the
+        threads). By default (None) la.farray.misc.PAIRWISE_MEMORY
+        (128 MB) is used.
+
+    Returns
+    -------
+    C : ndarray
+        The (N, N) correlation matrix.
+
+    Examples
+    --------
+    >>> R = np.array([[1.0, 2.0, 3.0, np.nan],
+    ...               [2.0, 4.0, 6.0, 0.0],
+    ...               [3.0, 1.0, np.nan, 2.0]])
+    >>> corrMissing(R)
+    array([[ 1. ,  1. , -1. ],
+           [ 1. ,  1. , -0.5],
+           [-1. , -0.5,  1. ]])
+
+    """
+    def tile(ai, aj):
+        xi, x2i, mi = ai
+        xj, x2j, mj = aj
+        # Sums over the observations that each pair of rows has in common
+        n = np.dot(mi, mj.T)
+        sx = np.dot(xi, mj.T)
+        sy = np.dot(mi, xj.T)
+        bad = n < 2
+        n[bad] = 1
+        c = np.dot(xi, xj.T)
+        c -= sx * sy / n
+        sx *= sx
+        sx /= n
+        sy *= sy
+        sy /= n
+        vx = np.dot(x2i, mj.T)
+        vx -= sx
+        vy = np.dot(mi, x2j.T)
+        vy -= sy
+        # Variance (times n) of each row of the pair over their common
+        # observations; zero (or, from round off, negative) if a row is
+        # constant
+        np.maximum(vx, 0, vx)
+        np.maximum(vy, 0, vy)
+        vx *= vy
+        np.sqrt(vx, vx)
+        bad |= vx == 0
+        vx[bad] = 1
+        c /= vx
+        c[bad] = np.nan
+        return c
+    return _pairwise(R, _corrprepare, tile, 3, 8, memory)
 
 def shuffle(x, axis=0):
     """
@@ -180,3 +277,144 @@ def shuffle(x, axis=0):
     
     """
     np.random.shuffle(np.rollaxis(x, axis))
+
+def take_axes(x, indices):
+    """
+    Take elements from an array along several axes in a single pass.
+    
+    The result is the same as taking along one axis at a time,
+    x.take(indices[0], 0).take(indices[1], 1)..., but only one output
+    array is allocated instead of one array per axis.
+    
+    Parameters
+    ----------
+    x : ndarray
+        Input array.
+    indices : list
+        One entry per axis of `x`. Each entry is either a 1d array_like of
+        the integer indices to take along that axis or None to keep all
+        the elements along that axis (in their order).
+        
+    Returns
+    -------
+    y : ndarray
+        The elements of `x` at the given indices. If all entries of
+        `indices` are None then `x` itself (not a copy) is returned.
+        
+    Examples
+    --------
+    >>> x = np.arange(12).reshape(3, 4)
+    >>> take_axes(x, [[2, 0], [3, 1]])
+    array([[11,  9],
+           [ 3,  1]])
+    >>> take_axes(x, [None, [3]])
+    array([[ 3],
+           [ 7],
+           [11]])
+    
+    """
+    if len(indices) != x.ndim:
+        raise ValueError, 'One entry of `indices` per axis of `x` needed.'
+    axes = [ax for ax, idx in enumerate(indices) if idx is not None]
+    if len(axes) == 0:
+        return x
+    if len(axes) == 1:
+        ax = axes[0]
+        return x.take(indices[ax], ax)
+    return x[_ixindex(indices, x.shape)]
+
+def _ixindex(indices, shape):
+    """
+    Index (a tuple) that selects `indices` along all axes of an array of
+    the given `shape`; None selects all elements along an axis. The index
+    is an open mesh (np.ix_) on the axes from the first to the last axis
+    that has indices; the axes before and after are sliced. None is
+    returned if all entries of `indices` are None.
+    
+    """
+    axes = [ax for ax, idx in enumerate(indices) if idx is not None]
+    if len(axes) == 0:
+        return None
+    first = axes[0]
+    last = axes[-1]
+    arrays = []
+    for ax in xrange(first, last + 1):
+        idx = indices[ax]
+        if idx is None:
+            idx = np.arange(shape[ax])
+        else:
+            idx = np.asarray(idx, dtype=np.intp)
+        arrays.append(idx)
+    index = [slice(None)] * len(shape)
+    index[first:last + 1] = np.ix_(*arrays)
+    return tuple(index)
+
+# Utility functions ---------------------------------------------------------
+
+def _covprepare(a):
+    "Block of rows of covMissing: data with NaNs set to 0, and presence."
+    miss = np.isnan(a)
+    return np.where(miss, 0, a), (~miss).astype(np.float64)
+
+def _corrprepare(a):
+    """
+    Block of rows of corrMissing: data demeaned (over each row, which
+    reduces the loss of precision of the sums), with NaNs set to 0, its
+    square, and presence.
+
+    """
+    miss = np.isnan(a)
+    x = a - bn.nanmean(a, axis=1)[:, None]
+    x[miss] = 0
+    return x, x * x, (~miss).astype(np.float64)
+
+def _pairwise(R, prepare, tile, nrow, ntile, memory=None):
+    """
+    N x N matrix of a pairwise function of the rows of the 2d array `R`.
+
+    prepare(a) returns a tuple of `nrow` arrays (of the shape of `a`) made
+    from a block of rows `a` of `R`; tile(ai, aj) returns the block of the
+    matrix for two prepared blocks of rows, using about `ntile` temporary
+    arrays of the size of the block. The matrix must be symmetric: only
+    the tiles on and above the diagonal are computed. The blocks are as
+    large as the memory budget allows.
+
+    """
+    R = np.asarray(R)
+    if R.ndim != 2:
+        raise ValueError, 'Input must be 2d.'
+    if memory is None:
+        memory = PAIRWISE_MEMORY
+    n, t = R.shape
+    C = np.empty((n, n))
+    if n == 0:
+        return C
+    nthreads = 1
+    if usethreads(n * n):
+        nthreads = get_num_threads()
+    # Largest block of b rows such that the temporary arrays of each thread,
+    # 2 * nrow * b * t + ntile * b * b elements, fit in the budget
+    size = max(memory // (8 * nthreads), 1)
+    b = 2.0 * nrow * t
+    b = int((np.sqrt(b * b + 4.0 * ntile * size) - b) / (2.0 * ntile))
+    b = min(max(b, 1), n)
+    edges = range(0, n, b) + [n]
+    blocks = zip(edges[:-1], edges[1:])
+    tiles = [(bi, bj) for i, bi in enumerate(blocks) for bj in blocks[i:]]
+    def work(tiles):
+        ai = None
+        for (i0, i1), (j0, j1) in tiles:
+            if ai is None or ai[0] != i0:
+                ai = (i0, prepare(R[i0:i1]))
+            aj = prepare(R[j0:j1]) if j0 != i0 else ai[1]
+            c = tile(ai[1], aj)
+            C[i0:i1, j0:j1] = c
+            if j0 != i0:
+                C[j0:j1, i0:i1] = c.T
+    if nthreads == 1 or len(tiles) == 1:
+        work(tiles)
+    else:
+        k = len(tiles)
+        blockmap(work, [tiles[k * i // nthreads:k * (i + 1) // nthreads]
+                        for i in xrange(nthreads)])
+    return C
@@ -1,12 +1,15 @@
 "Moving (rolling) statistics on numpy arrays."
 
+from bisect import bisect_left, bisect_right, insort
+
 import numpy as np
 import bottleneck as bn
 
 from la.missing import nans, ismissing
 from la.farray import lastrank
 
-__all__ = ['move_nanmedian', 'move_func', 'move_nanranking',
+__all__ = ['move_nanmedian', 'move_func', 'move_nanranking', 'RollingState',
+           'move_nanewmean', 'move_nanewvar', 'move_nanewstd', 'move_nanewcov',
            'movingsum', 'movingsum_forward', 'movingrank'] #Last row deprecated
 
 
@@ -30,7 +33,10 @@ def move_nanmedian(arr, window, axis=-1, method='loop'):
             ==========  =====================================
             'loop'      brute force python loop (default)
             'strides'   strides tricks (ndim < 4)
+            'fast'      rolling sorted window
             ==========  =====================================
+        Method 'fast' is much faster than the others for the median (its
+        cost does not grow with the window).
 
     Returns
     -------
@@ -50,14 +56,16 @@ def move_nanmedian(arr, window, axis=-1, method='loop'):
         y = move_func_strides(bn.nanmedian, arr, window, axis=axis)
     elif method == 'loop':
         y = move_func_loop(bn.nanmedian, arr, window, axis=axis)
+    elif method == 'fast':
+        y = move_func_sorted(_median_sorted, arr, window, axis=axis)
     else:
-        msg = "`method` must be 'strides' or 'loop'."
+        msg = "`method` must be 'strides', 'loop', or 'fast'."
         raise ValueError, msg
     return y
 
 # RANKING -------------------------------------------------------------------
 
-def move_nanranking(arr, window, axis=-1, method='strides'):
+def move_nanranking(arr, window, axis=-1, method='lags', decay=0.0):
     """
     Moving window ranking along the specified axis, ignoring NaNs.
 
@@ -78,9 +86,19 @@ def move_nanranking(arr, window, axis=-1, method='strides'):
     method : str, optional
         The following moving window methods are available:
             ==========  =====================================
-            'strides'   strides tricks (ndim < 4) (default)
+            'lags'      loop over the lags (default)
+            'strides'   strides tricks (ndim < 4)
             'loop'      brute force python loop
+            'fast'      rolling sorted window (decay=0 only)
             ==========  =====================================
+        The default was 'strides' before la 0.7; 'lags' gives the same
+        result (with decay > 0 up to the rounding of the sum) and also works
+        for ndim >= 4. Method 'fast' walks each 1d slice in a Python loop;
+        its cost does not grow with the window, so it is only faster than
+        the default 'lags' for long windows (roughly 1000 or more).
+    decay : scalar, optional
+        Exponential decay strength of the ranking in each window; see
+        lastrank. Cannot be negative. The default (decay=0) is no decay.
 
     Returns
     -------
@@ -113,12 +131,19 @@ def move_nanranking(arr, window, axis=-1, method='strides'):
     array([ NaN,  NaN,   1.,   1.,   1.])
 
     """
-    if method == 'strides':
-        y = move_func_strides(lastrank, arr, window, axis=axis)
+    if method == 'lags':
+        y = move_lastrank(arr, window, axis=axis, decay=decay)
+    elif method == 'strides':
+        y = move_func_strides(lastrank, arr, window, axis=axis, decay=decay)
     elif method == 'loop':
-        y = move_func_loop(lastrank, arr, window, axis=axis)
+        y = move_func_loop(lastrank, arr, window, axis=axis, decay=decay)
+    elif method == 'fast':
+        if decay != 0:
+            msg = "`decay` is not supported by method 'fast'."
+            raise ValueError, msg
+        y = move_func_sorted(_lastrank_sorted, arr, window, axis=axis)
     else:
-        msg = "`method` must be 'strides' or 'loop'."
+        msg = "`method` must be 'lags', 'strides', 'loop', or 'fast'."
         raise ValueError, msg
     return y
 
@@ -240,6 +265,597 @@ def move_func_strides(func, arr, window, axis=-1, **kwargs):
     ynan[index] = y
     return ynan
 
+def move_lastrank(arr, window, axis=-1, decay=0.0):
+    """
+    Moving window lastrank computed with a loop over the lags.
+    
+    The last element of every window is compared with the element j steps
+    into its window for all the windows at once, so there are `window`
+    vectorized steps and no python loop over the time axis. The counts are
+    integers, or weighted sums if `decay` > 0, and are combined as in
+    lastrank. With decay=0 the result is identical to the other methods of
+    move_nanranking; with decay > 0 only the order of the summation of the
+    weights differs.
+    
+    """
+    if axis == None:
+        raise ValueError, "An `axis` value of None is not supported."
+    if window < 1:  
+        raise ValueError, "`window` must be at least 1."
+    if window > arr.shape[axis]:
+        raise ValueError, "`window` is too long."
+    if decay < 0:
+        raise ValueError, 'decay must be greater than or equal to zero.'
+    y = nans(arr.shape)
+    # Time axis first and contiguous so that each lag is a contiguous block
+    x = np.ascontiguousarray(np.rollaxis(arr, axis, 0))
+    nw = x.shape[0] - window + 1
+    last = x[window-1:]
+    # Each comparison is added to the count as an int8 (0 or 1)
+    gt = np.empty(last.shape, dtype=np.bool_)
+    ge = np.empty(last.shape, dtype=np.bool_)
+    gt8 = gt.view(np.int8)
+    ge8 = ge.view(np.int8)
+    if decay > 0:
+        # Same weights as lastrank; w[j] is the weight of the jth element
+        # of the window
+        w = window - np.ones(window).cumsum()
+        w = np.exp(-decay * w)
+        w = window * w / w.sum()
+        wlast = w[-1]
+        # c is g + g + e of lastrank
+        c = np.zeros(last.shape)
+        n = np.zeros(last.shape)
+        for j in xrange(window):
+            xj = x[j:j+nw]
+            np.greater(last, xj, gt)
+            np.greater_equal(last, xj, ge)
+            np.add(gt8, ge8, gt8)
+            c += gt8 * w[j]
+            np.isfinite(xj, ge)
+            n += ge8 * w[j]
+    else:
+        wlast = 1.0
+        c = np.zeros(last.shape, dtype=np.intp)
+        for j in xrange(window):
+            xj = x[j:j+nw]
+            np.greater(last, xj, gt)
+            c += gt8
+            np.greater_equal(last, xj, ge)
+            c += ge8
+        # Number of finite elements in each window from a cumulative count
+        n = np.isfinite(x).cumsum(0)
+        n[window:] -= n[:-window].copy()
+        n = n[window-1:]
+    r = (c - wlast) / 2.0
+    r = r / (n - wlast)
+    r = 2.0 * (r - 0.5)
+    np.putmask(r, ~np.isfinite(last), np.nan)
+    yt = np.rollaxis(y, axis, 0)
+    yt[window-1:] = r
+    return y
+
+def move_func_sorted(func, arr, window, axis=-1):
+    """
+    Moving window function computed from a rolling sorted window.
+    
+    Each 1d slice along `axis` (of an array of any number of dimensions) is
+    moved through one element at a time. The non-NaN elements of the window
+    are kept in a sorted list: the element that enters the window is
+    inserted and the element that leaves is deleted, each found by
+    bisection, instead of sorting every window from scratch.
+    `func(window, value, ninf)` gives the output at each position from the
+    sorted list, the last element of the window, and the number of
+    infinite elements in the list.
+    
+    """
+    if axis == None:
+        raise ValueError, "An `axis` value of None is not supported."
+    if window < 1:  
+        raise ValueError, "`window` must be at least 1."
+    if window > arr.shape[axis]:
+        raise ValueError, "`window` is too long."
+    axis = range(arr.ndim)[axis]
+    y = nans(arr.shape)
+    if y.size == 0:
+        return y
+    n = arr.shape[axis]
+    x = np.rollaxis(np.asarray(arr, dtype=np.float64), axis, arr.ndim)
+    shape = x.shape
+    x = x.reshape(-1, n)
+    y2 = np.empty(x.shape)
+    inf = np.inf
+    for j in xrange(x.shape[0]):
+        row = x[j].tolist()
+        out = [np.nan] * n
+        s = []
+        ninf = 0
+        for i in xrange(n):
+            v = row[i]
+            if v == v:
+                insort(s, v)
+                if v == inf or v == -inf:
+                    ninf += 1
+            if i >= window:
+                v0 = row[i - window]
+                if v0 == v0:
+                    del s[bisect_left(s, v0)]
+                    if v0 == inf or v0 == -inf:
+                        ninf -= 1
+            if i >= window - 1:
+                out[i] = func(s, v, ninf)
+        y2[j] = out
+    y[...] = np.rollaxis(y2.reshape(shape), y.ndim - 1, axis)
+    return y
+
+def _median_sorted(s, value, ninf):
+    "Median of the sorted list `s`; NaN if `s` is empty."
+    k = len(s)
+    if k == 0:
+        return np.nan
+    return (s[(k - 1) // 2] + s[k // 2]) / 2.0
+
+def _lastrank_sorted(s, value, ninf):
+    """
+    Normalized rank, see lastrank, of `value` in the sorted list `s` that
+    contains `value` and `ninf` infinite elements.
+    
+    """
+    if value != value or value == np.inf or value == -np.inf:
+        return np.nan
+    g = bisect_left(s, value)
+    e = bisect_right(s, value) - g
+    n = len(s) - ninf
+    r = (g + g + e - 1.0) / 2.0
+    if n == 1:
+        # Same as lastrank (Numpy division by zero)
+        if r == 0:
+            return np.nan
+        return np.inf
+    r = r / (n - 1.0)
+    return 2.0 * (r - 0.5)
+
+# EXPONENTIALLY WEIGHTED ----------------------------------------------------
+
+def move_nanewmean(arr, span=None, halflife=None, axis=-1):
+    """
+    Exponentially weighted moving mean along the specified axis, ignoring
+    NaNs.
+    
+    Parameters
+    ----------
+    arr : ndarray
+        Input array.
+    span : {scalar, None}, optional
+        The decay in terms of span, span >= 1; the weight of an element
+        decays by a factor of 1 - 2 / (span + 1) with each step. Give
+        either `span` or `halflife`.
+    halflife : {scalar, None}, optional
+        The decay in terms of half-life, halflife > 0; the weight of an
+        element halves every `halflife` steps.
+    axis : int, optional
+        The axis over which to perform the moving mean. By default the
+        moving mean is taken over the last axis (-1).
+
+    Returns
+    -------
+    y : ndarray
+        The exponentially weighted moving mean along the specified axis,
+        ignoring NaNs. The mean is NaN until the first non-NaN element. The
+        output has the same shape as the input.
+        
+    Notes
+    -----
+    The element i steps back from the current element has weight
+    (1 - alpha)**i where alpha is 2 / (span + 1) or 1 - 0.5**(1 / halflife).
+    NaNs have no weight but the weights of the elements before a NaN still
+    decay. The statistic is computed recursively with one pass over the
+    data, so, unlike move_func, the cost does not depend on the decay.
+        
+    Examples
+    --------
+    >>> arr = np.array([1.0, 2.0, np.nan, 4.0])
+    >>> la.farray.move_nanewmean(arr, halflife=1)
+    array([ 1.        ,  1.66666667,  1.66666667,  3.36363636])
+    
+    """
+    return _move_nanew(arr, None, span, halflife, axis, 'mean')
+
+def move_nanewvar(arr, span=None, halflife=None, axis=-1):
+    """
+    Exponentially weighted moving variance along the specified axis,
+    ignoring NaNs.
+    
+    Parameters
+    ----------
+    arr : ndarray
+        Input array.
+    span : {scalar, None}, optional
+        The decay in terms of span, span >= 1; the weight of an element
+        decays by a factor of 1 - 2 / (span + 1) with each step. Give
+        either `span` or `halflife`.
+    halflife : {scalar, None}, optional
+        The decay in terms of half-life, halflife > 0; the weight of an
+        element halves every `halflife` steps.
+    axis : int, optional
+        The axis over which to perform the moving variance. By default the
+        moving variance is taken over the last axis (-1).
+
+    Returns
+    -------
+    y : ndarray
+        The exponentially weighted moving variance along the specified
+        axis, ignoring NaNs. The variance is NaN until the first non-NaN
+        element. The output has the same shape as the input.
+        
+    Notes
+    -----
+    The variance is the weighted mean of the squared deviations from the
+    weighted mean (there is no bias correction, just as the std of
+    larry). See move_nanewmean for the weights.
+        
+    Examples
+    --------
+    >>> arr = np.array([1.0, 2.0, np.nan, 4.0])
+    >>> la.farray.move_nanewvar(arr, halflife=1)
+    array([ 0.        ,  0.22222222,  0.22222222,  1.14049587])
+    
+    """
+    return _move_nanew(arr, arr, span, halflife, axis, 'cov')
+
+def move_nanewstd(arr, span=None, halflife=None, axis=-1):
+    """
+    Exponentially weighted moving standard deviation along the specified
+    axis, ignoring NaNs.
+    
+    Parameters
+    ----------
+    arr : ndarray
+        Input array.
+    span : {scalar, None}, optional
+        The decay in terms of span, span >= 1; the weight of an element
+        decays by a factor of 1 - 2 / (span + 1) with each step. Give
+        either `span` or `halflife`.
+    halflife : {scalar, None}, optional
+        The decay in terms of half-life, halflife > 0; the weight of an
+        element halves every `halflife` steps.
+    axis : int, optional
+        The axis over which to perform the moving standard deviation. By
+        default the moving standard deviation is taken over the last axis
+        (-1).
+
+    Returns
+    -------
+    y : ndarray
+        The exponentially weighted moving standard deviation along the
+        specified axis, ignoring NaNs; the square root of move_nanewvar.
+        The output has the same shape as the input.
+        
+    Examples
+    --------
+    >>> arr = np.array([1.0, 2.0, np.nan, 4.0])
+    >>> la.farray.move_nanewstd(arr, halflife=1)
+    array([ 0.        ,  0.47140452,  0.47140452,  1.06794001])
+    
+    """
+    y = _move_nanew(arr, arr, span, halflife, axis, 'cov')
+    np.sqrt(y, y)
+    return y
+
+def move_nanewcov(arr1, arr2, span=None, halflife=None, axis=-1):
+    """
+    Exponentially weighted moving covariance of two arrays along the
+    specified axis, ignoring NaNs.
+    
+    Parameters
+    ----------
+    arr1 : ndarray
+        Input array.
+    arr2 : ndarray
+        Input array. The shapes of `arr1` and `arr2` must broadcast.
+    span : {scalar, None}, optional
+        The decay in terms of span, span >= 1; the weight of an element
+        decays by a factor of 1 - 2 / (span + 1) with each step. Give
+        either `span` or `halflife`.
+    halflife : {scalar, None}, optional
+        The decay in terms of half-life, halflife > 0; the weight of an
+        element halves every `halflife` steps.
+    axis : int, optional
+        The axis over which to perform the moving covariance. By default the
+        moving covariance is taken over the last axis (-1).
+
+    Returns
+    -------
+    y : ndarray
+        The exponentially weighted moving covariance along the specified
+        axis. Only the pairs of elements where neither `arr1` nor `arr2` is
+        NaN are used. The covariance is NaN until the first such pair.
+        
+    Notes
+    -----
+    There is no bias correction; move_nanewcov(arr, arr) is the same as
+    move_nanewvar(arr). See move_nanewmean for the weights.
+        
+    Examples
+    --------
+    >>> arr1 = np.array([1.0, 2.0, 3.0, 4.0])
+    >>> arr2 = np.array([1.0, 3.0, 2.0, np.nan])
+    >>> la.farray.move_nanewcov(arr1, arr2, halflife=1)
+    array([ 0.        ,  0.44444444,  0.08163265,  0.08163265])
+    
+    """
+    return _move_nanew(arr1, arr2, span, halflife, axis, 'cov')
+
+def _ewalpha(span, halflife):
+    "Smoothing factor, alpha, of exponential weighting given span or halflife"
+    if span is None and halflife is None:
+        raise ValueError, 'Either `span` or `halflife` must be given.'
+    if span is not None and halflife is not None:
+        raise ValueError, 'Only one of `span` and `halflife` can be given.'
+    if span is not None:
+        if span < 1:
+            raise ValueError, '`span` must be at least 1.'
+        return 2.0 / (span + 1.0)
+    if halflife <= 0:
+        raise ValueError, '`halflife` must be greater than zero.'
+    return 1.0 - np.exp(np.log(0.5) / halflife)
+
+def _move_nanew(arr1, arr2, span, halflife, axis, stat):
+    """
+    Exponentially weighted moving 'mean' of `arr1` or 'cov' of `arr1` and
+    `arr2`.
+    
+    The weighted means (and the weighted covariance) are updated one step
+    along `axis` at a time, vectorized over the other axes, with the
+    recursion of West (1979). The weight of the past elements decays by
+    1 - alpha at each step and a non-NaN element adds weight one.
+    
+    """
+    beta = 1.0 - _ewalpha(span, halflife)
+    if axis == None:
+        raise ValueError, "An `axis` value of None is not supported."
+    arr1 = np.asarray(arr1)
+    if arr2 is None:
+        arrs = [arr1]
+    else:
+        arrs = np.broadcast_arrays(arr1, np.asarray(arr2))
+    if arrs[0].ndim == 0:
+        raise ValueError, '`arr` must have at least one dimension.'
+    if all([issubclass(a.dtype.type, np.inexact) for a in arrs]):
+        dtype = np.result_type(*arrs)
+    else:
+        dtype = np.float64
+    xs = [np.rollaxis(a, axis, 0) for a in arrs]
+    shape = xs[0].shape
+    y = np.empty(shape, dtype=dtype)
+    wt = np.zeros(shape[1:])
+    means = [np.zeros(shape[1:]) for x in xs]
+    cov = np.zeros(shape[1:])
+    seen = np.zeros(shape[1:], dtype=bool)
+    for i in xrange(shape[0]):
+        ai = [x[i].astype(np.float64) for x in xs]
+        mask = ai[0] == ai[0]
+        for a in ai[1:]:
+            mask &= a == a
+        ai = [np.where(mask, a, 0) for a in ai]
+        wt *= beta
+        sumwt = wt + mask
+        # Weight of the new element in the new mean; zero where it is NaN
+        f = mask / np.where(mask, sumwt, 1)
+        old = means
+        means = [m + f * (a - m) for m, a in zip(old, ai)]
+        if stat == 'cov':
+            m1, m2 = means
+            a1, a2 = ai
+            c = wt * (cov + (old[0] - m1) * (old[1] - m2))
+            c += (a1 - m1) * (a2 - m2)
+            c /= np.where(mask, sumwt, 1)
+            cov = np.where(mask, c, cov)
+            yi = cov
+        else:
+            yi = means[0]
+        wt = sumwt
+        seen |= mask
+        y[i] = np.where(seen, yi, np.nan)
+    return np.rollaxis(y, 0, range(y.ndim)[axis] + 1)
+
+# STREAMING -----------------------------------------------------------------
+
+class RollingState(object):
+    """
+    Moving window statistic that is updated as new time steps arrive.
+    
+    The state is fed the history (along `axis`) once and then one or more
+    new slices at a time. Each call to `update` returns the moving window
+    statistic of only the new elements, without recomputing the history.
+    Concatenating the outputs of all the updates gives the same result,
+    bit for bit, as computing the moving window statistic over the
+    concatenated input in one go.
+    
+    Parameters
+    ----------
+    kind : str
+        The moving window statistic:
+            ==========  ==================================================
+            'sum'       bn.move_nansum (larry.move_sum)
+            'mean'      bn.move_nanmean (larry.move_mean)
+            'std'       bn.move_nanstd (larry.move_std)
+            'median'    move_nanmedian (larry.move_median)
+            'ranking'   move_nanranking (larry.move_ranking, movingrank)
+            ==========  ==================================================
+    window : int
+        The number of elements in the moving window.
+    axis : int, optional
+        The time axis, along which the window moves. By default the last
+        axis (-1).
+        
+    Notes
+    -----
+    'sum', 'mean', and 'std' keep the running sums (in the same order of
+    operations as Bottleneck) and the last `window` slices; 'median' and
+    'ranking' keep the last `window` slices. So an update costs
+    O(window) per element at most, however long the history.
+    
+    Unlike the moving window functions, the history may be shorter than
+    the window; the outputs are NaN until `window` elements have been seen.
+    
+    Examples
+    --------
+    >>> state = la.farray.RollingState('mean', window=2)
+    >>> state.update(np.array([1.0, 2.0, 3.0]))
+    array([ NaN,  1.5,  2.5])
+    >>> state.update(np.array([5.0]))
+    array([ 4.])
+    
+    which is the same as:
+    
+    >>> bn.move_nanmean(np.array([1.0, 2.0, 3.0, 5.0]), window=2)
+    array([ NaN,  1.5,  2.5,  4. ])
+    
+    """
+    
+    def __init__(self, kind, window, axis=-1):
+        if kind not in ('sum', 'mean', 'std', 'median', 'ranking'):
+            msg = "`kind` must be 'sum', 'mean', 'std', 'median', or "
+            msg += "'ranking'."
+            raise ValueError, msg
+        if window < 1:  
+            raise ValueError, "`window` must be at least 1."
+        if axis == None:
+            raise ValueError, "An `axis` value of None is not supported."
+        self.kind = kind
+        self.window = window
+        self.axis = axis
+        self.nobs = 0
+        self._ndim = None
+        
+    def __repr__(self):
+        msg = 'RollingState(%r, window=%d, axis=%d, nobs=%d)'
+        return msg % (self.kind, self.window, self.axis, self.nobs)
+        
+    def update(self, arr):
+        """
+        Add new elements and return their moving window statistic.
+        
+        Parameters
+        ----------
+        arr : ndarray
+            The new elements; the history the first time. After the first
+            update, `arr` may also be a single slice without the time axis.
+            All updates must have the same shape along the other axes.
+            
+        Returns
+        -------
+        y : ndarray
+            The moving window statistic of the elements in `arr`. The output
+            has the same shape as `arr`.
+        
+        """
+        arr = np.asarray(arr)
+        if self._ndim is None:
+            self._setup(arr)
+        squeeze = arr.ndim == self._ndim - 1
+        if squeeze:
+            arr = np.expand_dims(arr, self.axis)
+        elif arr.ndim != self._ndim:
+            raise ValueError, '`arr` has the wrong number of dimensions.'
+        x = np.rollaxis(arr, self.axis, 0)
+        if x.shape[1:] != self._buf.shape[1:]:
+            raise ValueError, '`arr` has the wrong shape.'
+        y = np.empty(x.shape, dtype=self._dtype)
+        if self.kind in ('sum', 'mean', 'std'):
+            step = self._moment
+        else:
+            step = self._order
+        for i in xrange(x.shape[0]):
+            y[i] = step(x[i])
+        y = np.rollaxis(y, 0, self.axis + 1)
+        if squeeze:
+            y = y.squeeze(self.axis)
+        return y
+    
+    def _setup(self, arr):
+        "Set up the state for input with the shape and dtype of `arr`."
+        ndim = arr.ndim
+        if ndim == 0:
+            raise ValueError, '`arr` must have at least one dimension.'
+        self.axis = range(ndim)[self.axis]
+        self._ndim = ndim
+        shape = list(arr.shape)
+        shape.pop(self.axis)
+        if issubclass(arr.dtype.type, np.inexact):
+            self._dtype = arr.dtype
+        else:
+            self._dtype = np.dtype(np.float64)
+        self._buf = np.empty([self.window] + shape, dtype=self._dtype)
+        if self.kind in ('sum', 'mean', 'std'):
+            # Running sums are doubles as in Bottleneck
+            self._asum = np.zeros(shape)
+            self._a2sum = np.zeros(shape)
+            self._count = np.zeros(shape, dtype=np.intp)
+            
+    def _push(self, a):
+        "Store slice `a`; return the slice that leaves the window, if any."
+        i = self.nobs % self.window
+        if self.nobs >= self.window:
+            old = self._buf[i].copy()
+        else:
+            old = None
+        self._buf[i] = a
+        self.nobs += 1
+        return old
+        
+    def _moment(self, a):
+        "Output of slice `a` for the sum, mean, and std."
+        old = self._push(a)
+        asum = self._asum
+        a2sum = self._a2sum
+        count = self._count
+        a = a.astype(np.float64)
+        mask = a == a
+        a = np.where(mask, a, 0)
+        asum += a
+        a2sum += a * a
+        count += mask
+        if old is not None:
+            old = old.astype(np.float64)
+            mask = old == old
+            old = np.where(mask, old, 0)
+            asum -= old
+            a2sum -= old * old
+            count -= mask
+        y = np.empty(asum.shape)
+        y.fill(np.nan)
+        if self.nobs < self.window:
+            return y
+        idx = count > 0
+        if self.kind == 'sum':
+            y[idx] = asum[idx]
+        elif self.kind == 'mean':
+            y[idx] = asum[idx] / count[idx]
+        else:
+            n = count[idx]
+            s = asum[idx]
+            ssr = a2sum[idx] - s * s / n
+            std = np.sqrt(np.maximum(ssr, 0) / n)
+            std[ssr < 0] = 0
+            y[idx] = std
+        return y
+        
+    def _order(self, a):
+        "Output of slice `a` for the median and ranking."
+        self._push(a)
+        if self.nobs < self.window:
+            y = np.empty(a.shape)
+            y.fill(np.nan)
+            return y
+        if self.kind == 'median':
+            return bn.nanmedian(self._buf, axis=0)
+        # The window in time order (the newest slice is last)
+        i = self.nobs % self.window
+        idx = range(i, self.window) + range(i)
+        return lastrank(self._buf[idx], axis=0)
+
 # DEPRECATED ----------------------------------------------------------------
 
 @np.deprecate(new_name='move_nansum')
@@ -350,12 +966,4 @@ def movingrank(x, window, axis=-1):
         raise ValueError, 'Window is too big.'
     if window < 2:
         raise ValueError, 'Window is too small.'
-    nt = x.shape[axis]
-    mr = np.nan * np.zeros(x.shape)        
-    for i in xrange(window-1, nt): 
-        index1 = [slice(None)] * x.ndim 
-        index1[axis] = i
-        index2 = [slice(None)] * x.ndim 
-        index2[axis] = slice(i-window+1, i+1, None)
-        mr[index1] = np.squeeze(lastrank(x[index2], axis=axis))
-    return mr
+    return move_lastrank(x, window, axis=axis)
@@ -198,45 +198,126 @@ def ranking(x, axis=0, norm='-1,1'):
     np.putmask(idx, (countnotnan==1)*(~masknan), middle)
     return idx
 
-def push(x, n, axis=-1):
-    "Fill missing values (NaN) with most recent non-missing values if recent."
-    if axis != -1 or axis != x.ndim-1:
-        x = np.rollaxis(x, axis, x.ndim)
-    y = np.array(x) 
-    if y.ndim == 1:
-        y = y[None, :]
+def push(x, n, axis=-1, out=None):
+    """
+    Fill missing values (NaN) with most recent non-missing values if recent.
+    
+    Parameters
+    ----------
+    x : ndarray
+        Input array.
+    n : scalar
+        A missing value is filled if the most recent non-missing value
+        along `axis` is at most `n` elements back. With n=0 nothing is
+        filled.
+    axis : int, optional
+        The axis along which to fill. The filling proceeds from low to high
+        index. The default is the last axis (-1).
+    out : {None, ndarray}, optional
+        Array (of the same shape as `x`) to write the result into. By
+        default (None) a new array is allocated. `out` can be `x` to fill
+        in place.
+
+    Returns
+    -------
+    y : ndarray
+        A copy of `x`, or `out`, with the missing values filled. Infinite
+        values are treated as missing.
+        
+    Examples
+    --------
+    >>> x = np.array([1.0, np.nan, np.nan, 4.0, np.nan])
+    >>> push(x, 1)
+    array([  1.,   1.,  NaN,   4.,   4.])
+    
+    """
+    x = np.asarray(x)
+    if out is not None and out.shape != x.shape:
+        raise ValueError, '`out` must have the shape of `x`.'
+    if x.size == 0:
+        if out is None:
+            return np.array(x)
+        return out
+    # Work on a C contiguous copy with the time axis last unless `out` is
+    # already laid out that way
+    yt = np.rollaxis(x, axis, x.ndim)
+    inplace = (out is not None and
+               np.rollaxis(out, axis, x.ndim).flags.c_contiguous)
+    if inplace:
+        y = np.rollaxis(out, axis, x.ndim)
+        if out is not x:
+            y[...] = yt
+    else:
+        y = np.array(yt, order='C')
+    nt = y.shape[-1]
     fidx = np.isfinite(y)
-    recent = np.nan * np.ones(y.shape[:-1])  
-    count = np.nan * np.ones(y.shape[:-1])          
-    for i in xrange(y.shape[-1]):
-        idx = (i - count) > n
-        recent[idx] = np.nan
-        idx = ~fidx[...,i]
-        y[idx, i] = recent[idx]
-        idx = fidx[...,i]
-        count[idx] = i
-        recent[idx] = y[idx, i]
-    if axis != -1 or axis != x.ndim-1:
-        y = np.rollaxis(y, x.ndim-1, axis)
-    if x.ndim == 1:
-        return y[0]
-    return y
+    if not fidx.all():
+        # Index (along the time axis) of the most recent finite element; -1
+        # if there is none
+        last = np.empty(y.shape, dtype=np.intp)
+        np.multiply(fidx, np.arange(1, nt + 1), last)
+        last -= 1
+        np.maximum.accumulate(last, axis=-1, out=last)
+        # Fill each missing element (flat index) from its row
+        miss = np.flatnonzero(~fidx)
+        last = last.take(miss)
+        col = miss % nt
+        src = miss - col
+        src += last
+        fill = y.take(src, mode='wrap')
+        stale = last < 0
+        stale |= col - last > n
+        fill[stale] = np.nan
+        y.put(miss, fill)
+    if out is None:
+        return np.rollaxis(y, y.ndim - 1, axis)
+    if not inplace:
+        out[...] = np.rollaxis(y, y.ndim - 1, axis)
+    return out
 
-def _quantileraw1d(xi, q):
-    y = np.nan * np.asarray(xi)
-    idx = np.where(np.isfinite(xi))[0]
-    xi = xi[idx,:]
-    nx = idx.size
-    if nx:
-        jdx = xi.argsort(axis=0).argsort(axis=0)
-        mdx = np.nan * jdx
-        kdx = 1.0 * (nx - 1) / (q) * np.ones((q, 1))
-        kdx = kdx.cumsum(axis=0)
-        kdx = np.concatenate((-1 * np.ones((1, kdx.shape[1])), kdx), 0)
-        kdx[-1, 0] = nx
-        for j in xrange(1, q+1):
-            mdx[(jdx > kdx[j-1]) & (jdx <= kdx[j]),:] = j
-        y[idx] = mdx
+def _quantilebins(x, q):
+    """
+    Bin (1 to q, NaN if missing) of each element of each row of 2d `x`.
+    
+    The finite elements of each row are ranked 0 to nx-1 (ties are broken
+    by position) and element of rank j is put in the first bin i with
+    j <= k[i] where k[0] = -1 and k[1:] is the cumulative sum of q steps of
+    size (nx - 1) / q with the last one set to nx.
+    
+    """
+    nrow, ncol = x.shape
+    fidx = np.isfinite(x)
+    if not fidx.all():
+        x = np.where(fidx, x, np.nan)
+    # One stable sort (missing values sort last); the rank of each element
+    # is its position in the sort order
+    order = x.argsort(axis=1, kind='mergesort')
+    order += np.arange(0, nrow * ncol, ncol)[:, None]
+    rank = np.empty(x.shape, dtype=np.intp)
+    rank.put(order, np.arange(ncol))
+    del order
+    nx = fidx.sum(axis=1)
+    # Bin boundaries, computed exactly as above, for each number of finite
+    # elements in a row
+    unx, inx = np.unique(nx, return_inverse=True)
+    step = 1.0 * (unx - 1) / q
+    k = step[:, None] * np.ones((1, q))
+    k = k.cumsum(axis=1)
+    k[:, -1] = unx
+    k = np.concatenate((-1 * np.ones((unx.size, 1)), k), 1)
+    # First guess of the bin, then correct for the rounding of k
+    with np.errstate(invalid='ignore', divide='ignore'):
+        b = np.ceil(rank / step[inx][:, None])
+    b[~np.isfinite(b)] = 1
+    np.clip(b, 1, q, b)
+    b = b.astype(np.intp)
+    # Flat index of k[row's nx, 0]
+    offset = (inx * (q + 1))[:, None]
+    b += rank > k.take(b + offset)
+    np.minimum(b, q, b)
+    b -= rank <= k.take(b + offset - 1)
+    y = b.astype(np.float64)
+    y[~fidx] = np.nan
     return y
 
 def quantile(x, q, axis=0):
@@ -261,6 +342,12 @@ def quantile(x, q, axis=0):
     -------
     y : ndarray
         A quantized copy of the array.
+        
+    Notes
+    -----
+    Tied elements are ranked in the order they appear along the axis before
+    they are binned, so ties can fall in different bins. Non-finite
+    elements are missing and returned as NaN.
 
     Examples
     --------
@@ -280,19 +367,21 @@ def quantile(x, q, axis=0):
             msg = 'q must be less than or equal to the number of elements '
             msg += 'in x.'
             raise ValueError, msg
-        y = np.apply_along_axis(_quantileraw1d, 0, x.flat, q)
+        y = _quantilebins(x.reshape(1, -1), q)
         y = y.reshape(x.shape)
     else:        
         if q > x.shape[axis]:
             msg = 'q must be less than or equal to the number of rows in x.'
             raise ValueError, msg
-        y = np.apply_along_axis(_quantileraw1d, axis, x, q)
+        xt = np.rollaxis(x, axis, x.ndim)
+        y = _quantilebins(xt.reshape(-1, xt.shape[-1]), q)
+        y = np.rollaxis(y.reshape(xt.shape), x.ndim - 1, axis)
     y = y - 1.0
     y = 1.0 * y / (q - 1.0)
     y = 2.0 * (y - 0.5)
     return y 
 
-def demean(arr, axis=None):
+def demean(arr, axis=None, out=None):
     """
     Subtract the mean along the specified axis.
     
@@ -303,6 +392,9 @@ def demean(arr, axis=None):
     axis : {int, None}, optional
         The axis along which to remove the mean. The default (None) is
         to subtract the mean of the flattened array.
+    out : {None, ndarray}, optional
+        Array (of the same shape as `arr`) to write the result into. By
+        default (None) a new array is allocated. `out` can be `arr`.
 
     Returns
     -------
@@ -321,7 +413,9 @@ def demean(arr, axis=None):
         ind = [slice(None)] * arr.ndim
         ind[axis] = np.newaxis
         marr =  marr[ind]
-    return arr - marr   
+    if out is None:
+        return arr - marr
+    return np.subtract(arr, marr, out)
 
 def demedian(arr, axis=None):
     """
@@ -354,7 +448,7 @@ def demedian(arr, axis=None):
         marr =  marr[ind]
     return arr - marr   
     
-def zscore(arr, axis=None):
+def zscore(arr, axis=None, out=None):
     """
     Z-score along the specified axis.
     
@@ -365,6 +459,9 @@ def zscore(arr, axis=None):
     axis : {int, None}, optional
         The axis along which to take the z-score. The default (None) is
         to find the z-score of the flattened array.
+    out : {None, ndarray}, optional
+        Array (of the same shape as `arr`) to write the result into. By
+        default (None) a new array is allocated. `out` can be `arr`.
     
     Returns
     -------
@@ -378,7 +475,7 @@ def zscore(arr, axis=None):
     array([-1.22474487,         NaN,  0.        ,  1.22474487])
         
     """
-    arr = demean(arr, axis)
+    arr = demean(arr, axis, out)
     norm = bn.nanstd(arr, axis) 
     if (axis != 0) and (not axis is None) and (not np.isscalar(norm)):
         ind = [slice(None)] * arr.ndim
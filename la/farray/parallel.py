@@ -0,0 +1,220 @@
+"Multithreaded, block by block, evaluation of element-wise array functions."
+
+from functools import partial
+from multiprocessing.pool import ThreadPool
+
+import numpy as np
+
+__all__ = ['set_num_threads', 'get_num_threads', 'blockwise']
+
+# Settings of the thread pool; see set_num_threads
+_num_threads = 1
+_threshold = 1 << 18
+_pool = None
+
+
+def set_num_threads(n, threshold=None):
+    """
+    Set the number of threads used for element-wise operations on larrys.
+
+    With more than one thread, the element-wise operations of larry (the
+    unary methods such as log and abs, the arithmetic and comparison
+    operators, clip, nan_replace) and la.binaryop (and therefore la.add,
+    la.subtract, la.multiply, la.divide) split large arrays into blocks
+    of rows (axis 0) and compute the blocks in parallel. la.cov and
+    la.corr compute the tiles of large matrices in parallel. Numpy
+    releases the GIL while a ufunc (or a matrix product) runs so the
+    blocks run at the same time. The result is the same as with a single
+    thread but the warnings (such as Numpy's RuntimeWarnings about NaNs)
+    raised while a block is computed point to la.farray.parallel instead
+    of to the code that called the operation.
+
+    Multithreading is off (one thread) by default.
+
+    Parameters
+    ----------
+    n : int
+        Number of threads. Use 1 to turn multithreading off.
+    threshold : {int, None}, optional
+        Arrays with fewer elements than `threshold` are not split since for
+        small arrays the overhead of the threads is larger than the gain.
+        By default (None) the threshold is not changed; its initial value is
+        262144 (2**18).
+
+    See Also
+    --------
+    la.get_num_threads: Number of threads used for element-wise operations.
+
+    Examples
+    --------
+    >>> la.set_num_threads(4)
+    >>> la.get_num_threads()
+    4
+    >>> la.set_num_threads(1)
+
+    """
+    global _num_threads, _threshold, _pool
+    n = int(n)
+    if n < 1:
+        raise ValueError, '`n` must be at least 1.'
+    if threshold is not None:
+        if threshold < 0:
+            raise ValueError, '`threshold` must be non-negative.'
+        _threshold = threshold
+    if n != _num_threads:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+        _num_threads = n
+
+def get_num_threads():
+    """
+    Number of threads used for element-wise operations on larrys.
+
+    See Also
+    --------
+    la.set_num_threads: Set the number of threads.
+
+    """
+    return _num_threads
+
+def blockwise(func, *args, **kwargs):
+    """
+    Element-wise `func` of arrays evaluated block by block in threads.
+
+    When multithreading is on (see la.set_num_threads) and the arrays are
+    large, the arrays in `args` are split into blocks of rows (axis 0) and
+    `func` is applied to each block in a thread of the pool. Otherwise,
+    and also whenever the arrays in `args` do not all have the same shape,
+    the result is func(*args, **kwargs).
+
+    Parameters
+    ----------
+    func : function
+        An element-wise function such as a Numpy ufunc. Must accept an
+        `out` keyword argument if `out` is given or if `func` is a ufunc.
+    *args
+        Arguments of `func`. Arguments that are not Numpy arrays (such as
+        scalars) are passed unchanged to every block.
+    out : ndarray, optional
+        Array, with the shape of the result, to write the result into.
+    **kwargs
+        Other keyword arguments of `func`.
+
+    Returns
+    -------
+    y : ndarray
+        The result, `out` if given.
+
+    Examples
+    --------
+    >>> x = np.arange(4.0)
+    >>> la.farray.blockwise(np.multiply, x, 2.0)
+    array([ 0.,  2.,  4.,  6.])
+
+    """
+    out = kwargs.get('out')
+    shape = _blockshape(args)
+    if shape is None:
+        y = func(*args, **kwargs)
+        if out is not None:
+            return out
+        return y
+    if out is None:
+        # Type of the result from the result of empty blocks
+        y = func(*[_block(a, 0, 0) for a in args], **kwargs)
+        if not isinstance(y, np.ndarray) or y.shape != (0,) + shape[1:]:
+            return func(*args, **kwargs)
+        out = np.empty(shape, dtype=y.dtype)
+        useout = isinstance(func, np.ufunc)
+    else:
+        if out.shape != shape:
+            return func(*args, **kwargs)
+        kwargs = kwargs.copy()
+        del kwargs['out']
+        useout = True
+    def work(bounds):
+        start, stop = bounds
+        blockargs = [_block(a, start, stop) for a in args]
+        if useout:
+            func(*blockargs, out=out[start:stop], **kwargs)
+        else:
+            out[start:stop] = func(*blockargs, **kwargs)
+    blockmap(work, _rowblocks(shape[0], _num_threads))
+    return out
+
+def blockfunc(func, size):
+    """
+    `func` itself, or `func` evaluated with blockwise if arrays with `size`
+    elements should be split among threads.
+
+    With one thread, or arrays too small to split, the caller calls `func`
+    directly so that the warnings (such as Numpy's RuntimeWarnings about
+    NaNs) and the tracebacks of `func` point to the caller and not to this
+    module.
+
+    """
+    if usethreads(size):
+        return partial(blockwise, func)
+    return func
+
+def blockmap(func, blocks):
+    """
+    map(func, blocks) using the thread pool if multithreading is on.
+
+    The caller decides whether the work is large enough to be worth
+    threads. The Numpy floating-point error handling of the caller (see
+    np.seterr) is used in the threads.
+
+    """
+    global _pool
+    blocks = list(blocks)
+    if _num_threads == 1 or len(blocks) < 2:
+        return map(func, blocks)
+    if _pool is None:
+        _pool = ThreadPool(_num_threads)
+    err = np.geterr()
+    errcall = np.geterrcall()
+    def work(block):
+        with np.errstate(call=errcall, **err):
+            return func(block)
+    return _pool.map(work, blocks)
+
+def usethreads(size):
+    "True if an array with `size` elements should be split among threads."
+    return _num_threads > 1 and size >= _threshold
+
+# Utility functions ---------------------------------------------------------
+
+def _blockshape(args):
+    """
+    Shape of the arrays in `args` if they should be split into blocks of
+    rows; None if they should not be.
+
+    """
+    if _num_threads == 1:
+        return None
+    shape = None
+    for a in args:
+        if isinstance(a, np.ndarray):
+            if shape is None:
+                shape = a.shape
+            elif a.shape != shape:
+                return None
+    if shape is None or len(shape) == 0 or shape[0] < 2:
+        return None
+    if not usethreads(np.prod(shape)):
+        return None
+    return shape
+
+def _block(a, start, stop):
+    "Rows start:stop of `a` if `a` is an array; otherwise `a`."
+    if isinstance(a, np.ndarray):
+        return a[start:stop]
+    return a
+
+def _rowblocks(n, nblocks):
+    "List of (start, stop) that split n rows into at most nblocks blocks."
+    nblocks = min(n, nblocks)
+    edges = [n * i // nblocks for i in xrange(nblocks + 1)]
+    return zip(edges[:-1], edges[1:])
@@ -6,6 +6,7 @@ from __future__ import with_statement
 import unittest
 
 import numpy as np
+import bottleneck as bn
 from numpy.testing import assert_almost_equal
 aae = assert_almost_equal
 nan = np.nan
@@ -14,7 +15,9 @@ from la.util.testing import printfail
 from la.farray import group_ranking, group_mean, group_median
 from la.farray import (movingsum, movingrank, movingsum_forward, ranking, 
                        geometric_mean, unique_group, correlation, lastrank,
-                       covMissing)
+                       covMissing, corrMissing, take_axes, blockwise,
+                       set_num_threads, get_num_threads, push, quantile)
+from la.farray import unique_group
 
 # Sector functions ----------------------------------------------------------
 
@@ -746,3 +749,194 @@ def test_covMissing_2():
     b = a.copy()
     ignore = covMissing(a)
     aae(a, b)
+
+def test_covMissing_3():
+    "farray.covMissing_3"
+    x = np.random.randn(23, 30)
+    x[x > 1.4] = nan
+    x0 = np.where(np.isnan(x), 0, x)
+    m = (~np.isnan(x)).astype(float)
+    desired = np.dot(x0, x0.T) / np.dot(m, m.T)
+    try:
+        for threads in (1, 3):
+            set_num_threads(threads, threshold=0)
+            for memory in (None, 1, 3000, 20000):
+                actual = covMissing(x, memory)
+                aae(actual, desired, err_msg="covMissing memory %s" % memory)
+    finally:
+        set_num_threads(1, threshold=1 << 18)
+    x[0, :-1] = nan
+    np.testing.assert_raises(ValueError, covMissing, x, 3000)
+
+def test_corrMissing():
+    "farray.corrMissing"
+    x = np.random.randn(19, 25)
+    x[x > 1.2] = nan
+    x[3, 1:] = nan
+    x[4] = 2.0
+    n = x.shape[0]
+    desired = nan * np.empty((n, n))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for i in range(n):
+            for j in range(n):
+                if 3 not in (i, j):
+                    desired[i, j] = correlation(x[i], x[j])
+    try:
+        for threads in (1, 3):
+            set_num_threads(threads, threshold=0)
+            for memory in (None, 1, 2000, 20000):
+                actual = corrMissing(x, memory)
+                aae(actual, desired, err_msg="corrMissing memory %s" % memory)
+    finally:
+        set_num_threads(1, threshold=1 << 18)
+    
+def test_take_axes():
+    "farray.take_axes"
+    x = np.random.rand(4, 5, 6)
+    idx = [None, [2, 0], [], [4, 1, 3], [0, 1, 2, 3]]
+    for i0 in idx[:2]:
+        for i1 in idx:
+            for i2 in idx:
+                indices = [i0, i1, i2]
+                desired = x
+                for ax, index in enumerate(indices):
+                    if index is not None:
+                        desired = desired.take(index, ax)
+                actual = take_axes(x, indices)
+                aae(actual, desired, err_msg="take_axes %s" % indices)
+    assert take_axes(x, [None, None, None]) is x, "take_axes copied"
+
+def test_blockwise():
+    "farray.blockwise"
+    x = np.random.randn(37, 5)
+    x[x > 1] = nan
+    y = np.random.randn(37, 5)
+    funcs = [(np.add, (x, y)), (np.log, (x,)), (np.power, (x, 2)),
+             (np.clip, (x, -0.5, 0.5)), (np.less, (x, y)),
+             (lambda a, b: a >= b, (x, 0.1)), (np.add, (x, y[0]))]
+    try:
+        set_num_threads(3, threshold=0)
+        assert get_num_threads() == 3, "set_num_threads failed"
+        with np.errstate(invalid='ignore'):
+            for func, args in funcs:
+                desired = func(*args)
+                actual = blockwise(func, *args)
+                aae(actual, desired, err_msg="blockwise")
+                if isinstance(func, np.ufunc):
+                    out = np.empty(desired.shape, dtype=desired.dtype)
+                    actual = blockwise(func, *args, out=out)
+                    assert actual is out, "blockwise did not return out"
+                    aae(actual, desired, err_msg="blockwise with out")
+        # The caller's floating-point error handling is used in the threads
+        with np.errstate(invalid='raise'):
+            try:
+                blockwise(np.log, -np.ones(10))
+            except FloatingPointError:
+                pass
+            else:
+                raise AssertionError("blockwise ignored np.errstate")
+    finally:
+        set_num_threads(1, threshold=1 << 18)
+
+def push_loop(x, n, axis):
+    "push along `axis` of `x` with a loop over the elements of each row"
+    y = np.rollaxis(x, axis, x.ndim).copy()
+    for row in y.reshape(-1, y.shape[-1]):
+        last = None
+        for i in range(row.size):
+            if np.isfinite(row[i]):
+                last = i
+            elif last is not None and i - last <= n:
+                row[i] = row[last]
+            else:
+                row[i] = nan
+    return np.rollaxis(y, x.ndim - 1, axis)
+
+def test_push():
+    "farray.push"
+    x = np.random.randn(3, 4, 9)
+    x[x > 0.3] = nan
+    x[0, 0, 2] = np.inf
+    x[1, 2, 0] = -np.inf
+    for dtype in (np.float64, np.float32):
+        for axis in (0, 1, -1):
+            for n in (0, 1, 2, 3.5, np.inf):
+                xd = x.astype(dtype)
+                msg = "push dtype %s | axis %d | n %s" % (dtype, axis, n)
+                desired = push_loop(xd, n, axis)
+                actual = push(xd, n, axis)
+                assert actual.dtype == dtype, msg
+                aae(actual, desired, err_msg=msg)
+                aae(xd, x.astype(dtype), err_msg=msg + " | input changed")
+                xc = xd.copy()
+                for out in (np.zeros_like(xd),
+                            np.zeros(xd.shape[::-1], dtype).T, xc):
+                    actual = push(xc, n, axis, out=out)
+                    assert actual is out, msg + " | out not returned"
+                    aae(actual, desired, err_msg=msg + " | out")
+    x = np.arange(6).reshape(2, 3)
+    aae(push(x, 1), x, err_msg="push int")
+
+def quantile_loop(x, q):
+    "quantile of 1d `x` with a loop over the elements"
+    y = nan * np.ones(x.shape)
+    idx = np.flatnonzero(np.isfinite(x))
+    nx = idx.size
+    k = np.concatenate(([-1.0], (1.0 * (nx - 1) / q * np.ones(q)).cumsum()))
+    k[-1] = nx
+    order = x[idx].argsort(kind='mergesort')
+    for rank, i in enumerate(idx[order]):
+        for j in range(1, q + 1):
+            if k[j-1] < rank <= k[j]:
+                y[i] = j
+    return 2.0 * ((y - 1.0) / (q - 1.0) - 0.5)
+
+def test_quantile():
+    "farray.quantile"
+    x = np.random.randint(0, 5, (4, 5, 21)).astype(float)
+    r = np.random.rand(*x.shape)
+    x[r < 0.2] = nan
+    x[r > 0.95] = np.inf
+    x[0, 0] = nan
+    for axis in (None, 0, 1, 2, -1):
+        n = x.size if axis is None else x.shape[axis]
+        for q in [qi for qi in (2, 3, 4, 7, n) if qi <= n]:
+            msg = "quantile axis %s | q %d" % (axis, q)
+            if axis is None:
+                desired = quantile_loop(x.ravel(), q).reshape(x.shape)
+            else:
+                desired = np.apply_along_axis(quantile_loop, axis, x, q)
+            actual = quantile(x, q, axis=axis)
+            aae(actual, desired, err_msg=msg)
+
+def group_loop(func, x, groups, axis, **kwargs):
+    "Group function `func` of `x` with a loop over the groups."
+    y = nan * np.ones(x.shape)
+    groups = np.asarray(groups, dtype=object)
+    for group in unique_group(groups):
+        index = [slice(None)] * x.ndim
+        index[axis] = np.flatnonzero(groups == group)
+        yi = func(x[index], axis=axis, **kwargs)
+        if yi.ndim < x.ndim:
+            yi = np.expand_dims(yi, axis)
+        y[index] = yi
+    return y
+
+def test_group_functions():
+    "farray.group_mean, group_median, and group_ranking"
+    x = np.random.randint(0, 5, (11, 4, 3)).astype(float)
+    x[np.random.rand(*x.shape) < 0.3] = nan
+    x[:, 0] = nan
+    funcs = [(group_mean, bn.nanmean, {}),
+             (group_median, bn.nanmedian, {}),
+             (group_ranking, ranking, {'norm': '-1,1'}),
+             (group_ranking, ranking, {'norm': '0,N-1'})]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for axis in range(x.ndim):
+            n = x.shape[axis]
+            groups = [['a', 'b', None][i % 3] for i in range(n)]
+            for gfunc, func, kwargs in funcs:
+                msg = "%s | axis %d | %s" % (gfunc.__name__, axis, kwargs)
+                desired = group_loop(func, x, groups, axis, **kwargs)
+                actual = gfunc(x, groups, axis=axis, **kwargs)
+                aae(actual, desired, err_msg=msg)
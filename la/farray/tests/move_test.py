@@ -4,11 +4,14 @@
 from __future__ import with_statement
 
 import numpy as np
-from numpy.testing import assert_array_almost_equal
+from numpy.testing import (assert_array_almost_equal, assert_equal,
+                           assert_raises)
 nan = np.nan
 import bottleneck as bn
 
-from la.farray import move_nanmedian, move_func
+from la.farray import (move_nanmedian, move_nanranking, move_func, lastrank,
+                       RollingState, move_nanewmean, move_nanewvar,
+                       move_nanewstd, move_nanewcov)
 
 
 def move_unit_maker(func, arrfunc, methods):
@@ -44,5 +47,182 @@ def move_unit_maker(func, arrfunc, methods):
 
 def test_move_nanmedian():
     "Test move_nanmedian."
-    methods = ('strides', 'func_loop', 'func_strides') 
+    methods = ('strides', 'func_loop', 'func_strides', 'fast') 
     yield move_unit_maker, move_nanmedian, bn.nanmedian, methods 
+
+def test_move_nanranking():
+    "Test move_nanranking."
+    methods = ('lags', 'strides', 'fast')
+    with np.errstate(invalid='ignore', divide='ignore'):
+        move_unit_maker(move_nanranking, lastrank, methods)
+
+def test_move_nanranking_decay():
+    "Test move_nanranking with decay."
+    x = np.random.randint(0, 4, (3, 4, 9)).astype(float)
+    r = np.random.rand(*x.shape)
+    x[r < 0.2] = nan
+    x[r > 0.95] = np.inf
+    msg = '\nmethod %s | decay %s | window %d | axis %d\n'
+    for decay in (0.1, 1.0):
+        for axis in range(-1, x.ndim):
+            for w in range(1, x.shape[axis] + 1):
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    desired = move_func(lastrank, x, window=w, axis=axis,
+                                        method='loop', decay=decay)
+                    for method in ('lags', 'strides', 'loop'):
+                        actual = move_nanranking(x, window=w, axis=axis,
+                                                 method=method, decay=decay)
+                        err_msg = msg % (method, decay, w, axis)
+                        assert_array_almost_equal(actual, desired, 10,
+                                                  err_msg)
+    assert_raises(ValueError, move_nanranking, x, 2, method='fast', decay=1)
+    assert_raises(ValueError, move_nanranking, x, 2, decay=-1)
+
+def test_move_nanranking_default():
+    "Test that the default method of move_nanranking matches 'strides'."
+    # The default changed from 'strides' to 'lags' in la 0.7
+    x = np.random.randint(0, 4, (3, 4, 9)).astype(float)
+    r = np.random.rand(*x.shape)
+    x[r < 0.2] = nan
+    x[r > 0.95] = np.inf
+    msg = '\ndecay %s | window %d | axis %d | ndim %d\n'
+    for arr in (x[0, 0], x[0], x):
+        for decay in (0.0, 0.1, 1.0, 5.0):
+            for axis in range(-1, arr.ndim):
+                for w in range(1, arr.shape[axis] + 1):
+                    with np.errstate(invalid='ignore', divide='ignore'):
+                        actual = move_nanranking(arr, w, axis=axis,
+                                                 decay=decay)
+                        desired = move_nanranking(arr, w, axis=axis,
+                                                  method='strides',
+                                                  decay=decay)
+                    err_msg = msg % (decay, w, axis, arr.ndim)
+                    if decay == 0:
+                        assert_equal(actual, desired, err_msg)
+                    else:
+                        assert_array_almost_equal(actual, desired, 10,
+                                                  err_msg)
+
+def test_move_fast():
+    "Test method='fast' of move_nanmedian and move_nanranking on 4d input."
+    x = np.random.randint(0, 4, (3, 4, 5, 6)).astype(float)
+    r = np.random.rand(*x.shape)
+    x[r < 0.2] = nan
+    x[r > 0.95] = np.inf
+    msg = '\nfunc %s | window %d | axis %d\n'
+    for func in (move_nanmedian, move_nanranking):
+        for axis in range(-1, x.ndim):
+            for w in range(1, x.shape[axis] + 1):
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    actual = func(x, window=w, axis=axis, method='fast')
+                    desired = func(x, window=w, axis=axis, method='loop')
+                err_msg = msg % (func.__name__, w, axis)
+                assert_array_almost_equal(actual, desired, 10, err_msg)
+
+def test_rollingstate():
+    "Test that RollingState gives the same result as a full recompute."
+    funcs = {'sum': bn.move_nansum,
+             'mean': bn.move_nanmean,
+             'std': bn.move_nanstd,
+             'median': lambda a, w, axis: move_nanmedian(a, w, axis),
+             'ranking': lambda a, w, axis: move_nanranking(a, w, axis)}
+    x = np.random.randn(3, 20, 4)
+    x[x > 1] = nan
+    xint = np.random.randint(0, 9, (3, 20, 4))
+    msg = '\nkind %s | window %d | axis %d | dtype %s\n'
+    for arr in (x, x.astype(np.float32), xint):
+        for axis in (1, 0, -1):
+            n = arr.shape[axis]
+            for kind, func in funcs.iteritems():
+                if kind in ('median', 'ranking') and arr.dtype == np.float32:
+                    continue
+                for w in (1, 2, n // 2):
+                    with np.errstate(invalid='ignore', divide='ignore'):
+                        desired = func(arr, w, axis=axis)
+                        state = RollingState(kind, w, axis=axis)
+                        # History shorter than the window, then single
+                        # slices, then a block
+                        actual = [state.update(arr.take(range(1), axis))]
+                        for i in range(1, n - 2):
+                            y = state.update(arr.take(i, axis))
+                            actual.append(np.expand_dims(y, axis))
+                        actual.append(state.update(arr.take([n-2, n-1],
+                                                            axis)))
+                    actual = np.concatenate(actual, axis)
+                    err_msg = msg % (kind, w, axis, arr.dtype)
+                    assert_equal(actual.dtype, desired.dtype, err_msg)
+                    # Bitwise identical
+                    assert_equal(np.ascontiguousarray(actual).view(np.uint8),
+                                 np.ascontiguousarray(desired).view(np.uint8),
+                                 err_msg)
+
+def test_rollingstate_raises():
+    "Test RollingState raises."
+    assert_raises(ValueError, RollingState, 'max', 2)
+    assert_raises(ValueError, RollingState, 'mean', 0)
+    state = RollingState('mean', 2)
+    state.update(np.ones((2, 3)))
+    assert_raises(ValueError, state.update, np.ones((3, 3)))
+    assert_raises(ValueError, state.update, np.ones((2, 2, 3)))
+
+def ew_brute(arr1, arr2, alpha, stat):
+    "Exponentially weighted moving mean or cov of 1d arrays by brute force."
+    y = np.empty(arr1.size)
+    y.fill(nan)
+    for i in range(arr1.size):
+        w = (1.0 - alpha) ** np.arange(i, -1, -1)
+        idx = ~np.isnan(arr1[:i+1]) & ~np.isnan(arr2[:i+1])
+        if not idx.any():
+            continue
+        w = w[idx]
+        a1 = arr1[:i+1][idx]
+        a2 = arr2[:i+1][idx]
+        m1 = (w * a1).sum() / w.sum()
+        m2 = (w * a2).sum() / w.sum()
+        if stat == 'mean':
+            y[i] = m1
+        else:
+            y[i] = (w * (a1 - m1) * (a2 - m2)).sum() / w.sum()
+    return y
+
+def test_move_nanew():
+    "Test exponentially weighted moving statistics."
+    arr1 = np.random.randn(4, 30)
+    arr1[arr1 > 1] = nan
+    arr1[:, :3] = nan
+    arr2 = np.random.randn(4, 30)
+    arr2[arr2 > 1.2] = nan
+    msg = '\nfunc %s | span %s | halflife %s | axis %d\n'
+    for span, halflife in [(1.5, None), (10, None), (None, 0.5), (None, 4)]:
+        if span is None:
+            alpha = 1.0 - 0.5 ** (1.0 / halflife)
+        else:
+            alpha = 2.0 / (span + 1.0)
+        for axis in (1, -1, 0):
+            a1 = arr1 if axis != 0 else arr1.T
+            a2 = arr2 if axis != 0 else arr2.T
+            for func, stat, args in [(move_nanewmean, 'mean', (a1,)),
+                                     (move_nanewvar, 'cov', (a1,)),
+                                     (move_nanewstd, 'std', (a1,)),
+                                     (move_nanewcov, 'cov', (a1, a2))]:
+                actual = func(*args, span=span, halflife=halflife, axis=axis)
+                if axis == 0:
+                    actual = actual.T
+                for i in range(arr1.shape[0]):
+                    x2 = arr1 if len(args) == 1 else arr2
+                    if stat == 'std':
+                        desired = np.sqrt(ew_brute(arr1[i], x2[i], alpha,
+                                                   'cov'))
+                    else:
+                        desired = ew_brute(arr1[i], x2[i], alpha, stat)
+                    err_msg = msg % (func.__name__, span, halflife, axis)
+                    assert_array_almost_equal(actual[i], desired, 10, err_msg)
+
+def test_move_nanew_raises():
+    "Test exponentially weighted moving statistics raises."
+    arr = np.arange(5.0)
+    assert_raises(ValueError, move_nanewmean, arr)
+    assert_raises(ValueError, move_nanewmean, arr, span=2, halflife=2)
+    assert_raises(ValueError, move_nanewmean, arr, span=0.5)
+    assert_raises(ValueError, move_nanewmean, arr, halflife=0)
+    assert_raises(ValueError, move_nanewmean, arr, span=2, axis=None)
@@ -1,78 +1,27 @@
 "label (list of lists) functions"
 
 from itertools import izip
+from collections import OrderedDict
 
 import numpy as np
 
+from la.deflabel import Label, ArrayLabel, RangeLabel, labelcopy
+
 try:
     # The c version is faster...
-    from la.cflabel import listmap
+    from la.cflabel import listmap as _listmap
 except ImportError:
     # ...but perhaps it did not compile when you built the la package? So
     # we'll use the python version. If you are unsure which version you are
-    # using, the doc string will tell you.
-    def listmap(list1, list2, ignore_unmappable=False):
+    # using, the doc string of _listmap will tell you.
+    def _listmap(list1, list2, ignore_unmappable=False):
         """
         Indices that map one list onto another list.
-        
-        Parameters
-        ----------
-        list1 : list
-            The list to map from.
-        list2 : list
-            The list to map to.
-        ignore_unmappable : bool, optional
-            If False (default) an element in `list2` that is not in `list1`
-            will raise a KeyError. If True the unmappable elements will be
-            ignored. The mapping is faster when `ignore_unmappable` is False.
-        
-        Returns
-        -------
-        idx : list
-            If `ignore_unmappable` is False then returns a list of indices
-            `idx` such that [list1[i] for i in idx] is `list2`. If
-            `ignore_unmappable` is True then [list1[i] for i in idx] will not
-            give `list2` if there are items in `list2` that are not in
-            `list1`.
-
-        See Also
-        --------
-        la.flable.listmap_nofill: Indices that map one list onto another list
-
-        Notes
-        ----- 
+
         This is the slower python version of the function; there is a faster
         C version that setup.py will automatically try to compile at build
         (setup.py) time of the la package. You can also compile it by hand.
-        
-        Examples
-        --------
-        A simple mapping:
-
-        >>> list1 = [1, 2, 3]
-        >>> list2 = [3, 1, 2]
-        >>> idx = listmap(list1, list2)
-        >>> idx
-        [2, 0, 1]
-        >>> [list1[i] for i in idx] == list2
-        True
-
-        A KeyError is raised if an element in the second list is not in the
-        first:
-
-        >>> listmap(['a', 'b'], ['a', 'b', 'unmappable element'])
-        Traceback (most recent call last):
-          File "<stdin>", line 1, in <module>
-          File "la/util/misc.py", line 55, in listmap
-            idx = [list1map[i] for i in list2]        
-        KeyError: 'unmappable element'
-        
-        If you wish to skip the unmappable element, then set
-        `ignore_unmappable` to True:
-        
-        >>> listmap(['a', 'b'], ['a', 'b', 'unmappable element'], ignore_unmappable=True)
-        [0, 1]
-                  
+
         """
         list1map = dict(izip(list1, xrange(len(list1))))
         if ignore_unmappable:
@@ -83,73 +32,19 @@ except ImportError:
 
 try:
     # The c version is faster...
-    from la.cflabel import listmap_fill
+    from la.cflabel import listmap_fill as _listmap_fill
 except ImportError:
     # ...but perhaps it did not compile when you built the la package? So
     # we'll use the python version. If you are unsure which version you are
-    # using, the doc string will tell you.
-    def listmap_fill(list1, list2, fill=0):
+    # using, the doc string of _listmap_fill will tell you.
+    def _listmap_fill(list1, list2, fill=0):
         """
         Indices that map one list onto another and indices of unmappable elements.
-        
-        Similar to listmap() but additionaly returns a second index that gives the
-        index values of the unmappable elements. The unmappable items are filled
-        in the first index retuned with `fill`.
-        
-        Parameters
-        ----------
-        list1 : list
-            The list to map from.
-        list2 : list
-            The list to map to.
-        fill : fill value, optional
-            Any element that cannot be mapped is given the index value `fill` in
-            the frist of two index lists returned.
-        
-        Returns
-        -------
-        index : list
-            An index such that [list1[i] for i in idx] is `list2`. If there are
-            items in `list2` that are not in `list1` then the correponding index
-            value is `fill`.
-        index_missing : list
-            The index values (relative to `list1`) of the elements in `list2` that
-            are not in `list1`.
-            
-        See Also
-        --------
-        la.flable.listmap: Indices that map one list onto another list
-
-        Notes
-        ----- 
+
         This is the slower python version of the function; there is a faster
         C version that setup.py will automatically try to compile at build
         (setup.py) time of the la package. You can also compile it by hand.
 
-        Examples
-        --------
-        A simple mapping where all elements are mappable:
-
-        >>> list1 = [1, 2, 3]
-        >>> list2 = [3, 1, 2]
-        >>> idx, idx_unmappable = listmap_fill(list1, list2)
-        >>> idx
-        [2, 0, 1]
-        >>> idx_unmappable
-        []
-        >>> [list1[i] for i in idx] == list2
-        True
-        
-        An example where list2 contains an element (4) that is not in list1:
-
-        >>> list1 = [1, 2, 3]
-        >>> list2 = [1, 2, 3, 4]
-        >>> idx, idx_unmappable = listmap_fill(list1, list2)
-        >>> idx
-        [0, 1, 2, 0]
-        >>> idx_unmappable
-        [3]
-        
         """
         list1map = dict(izip(list1, xrange(len(list1))))
         index_missing = []
@@ -163,6 +58,747 @@ except ImportError:
                 index_missing.append(i)    
         return index, index_missing
 
+def listmap(list1, list2, ignore_unmappable=False):
+    """
+    Indices that map one list onto another list.
+    
+    Parameters
+    ----------
+    list1 : list
+        The list to map from.
+    list2 : list
+        The list to map to.
+    ignore_unmappable : bool, optional
+        If False (default) an element in `list2` that is not in `list1`
+        will raise a KeyError. If True the unmappable elements will be
+        ignored. The mapping is faster when `ignore_unmappable` is False.
+    
+    Returns
+    -------
+    idx : list
+        If `ignore_unmappable` is False then returns a list of indices
+        `idx` such that [list1[i] for i in idx] is `list2`. If
+        `ignore_unmappable` is True then [list1[i] for i in idx] will not
+        give `list2` if there are items in `list2` that are not in
+        `list1`.
+
+    See Also
+    --------
+    la.flable.listmap_nofill: Indices that map one list onto another list
+
+    Notes
+    -----
+    If `list1` is a la.deflabel.Label (the labels of a larry are Labels)
+    then its cached index is used to do the mapping so that mapping many
+    lists onto the same Label does not rebuild the index each time. If
+    `list1` is a la.deflabel.ArrayLabel the mapping is done with Numpy's
+    searchsorted. Otherwise the C version of the function (la.cflabel) is
+    used if it was compiled when the la package was built; if not, a slower
+    python version is used.
+    
+    Examples
+    --------
+    A simple mapping:
+
+    >>> list1 = [1, 2, 3]
+    >>> list2 = [3, 1, 2]
+    >>> idx = listmap(list1, list2)
+    >>> idx
+    [2, 0, 1]
+    >>> [list1[i] for i in idx] == list2
+    True
+
+    A KeyError is raised if an element in the second list is not in the
+    first:
+
+    >>> listmap(['a', 'b'], ['a', 'b', 'unmappable element'])
+    Traceback (most recent call last):
+      File "<stdin>", line 1, in <module>
+      File "la/util/misc.py", line 55, in listmap
+        idx = [list1map[i] for i in list2]        
+    KeyError: 'unmappable element'
+    
+    If you wish to skip the unmappable element, then set
+    `ignore_unmappable` to True:
+    
+    >>> listmap(['a', 'b'], ['a', 'b', 'unmappable element'], ignore_unmappable=True)
+    [0, 1]
+              
+    """
+    if type(list1) is Label:
+        list1map = list1.indexmap()
+        if ignore_unmappable:
+            return [list1map[i] for i in list2 if i in list1map]
+        return map(list1map.__getitem__, list2)
+    if type(list1) is RangeLabel:
+        list1 = ArrayLabel._fromarray(list1.values, 'int')
+    if type(list1) is ArrayLabel:
+        values = _labelvalues(list2, list1.kind)
+        if values is not None:
+            idx, idx_miss = _arraymap(list1.values, list1.sorter(), values)
+            if len(idx_miss) > 0:
+                if not ignore_unmappable:
+                    raise KeyError(list2[idx_miss[0]])
+                idx = np.delete(idx, idx_miss)
+            return idx.tolist()
+        list1 = list1.tolist()
+    # The C version only accepts lists (not even subclasses of list)
+    if type(list1) is not list:
+        list1 = list(list1)
+    if type(list2) is not list:
+        list2 = list(list2)
+    return _listmap(list1, list2, ignore_unmappable)
+
+def listmap_fill(list1, list2, fill=0):
+    """
+    Indices that map one list onto another and indices of unmappable elements.
+    
+    Similar to listmap() but additionaly returns a second index that gives the
+    index values of the unmappable elements. The unmappable items are filled
+    in the first index retuned with `fill`.
+    
+    Parameters
+    ----------
+    list1 : list
+        The list to map from.
+    list2 : list
+        The list to map to.
+    fill : fill value, optional
+        Any element that cannot be mapped is given the index value `fill` in
+        the frist of two index lists returned.
+    
+    Returns
+    -------
+    index : list
+        An index such that [list1[i] for i in idx] is `list2`. If there are
+        items in `list2` that are not in `list1` then the correponding index
+        value is `fill`.
+    index_missing : list
+        The index values (relative to `list1`) of the elements in `list2` that
+        are not in `list1`.
+        
+    See Also
+    --------
+    la.flable.listmap: Indices that map one list onto another list
+
+    Notes
+    -----
+    If `list1` is a la.deflabel.Label (the labels of a larry are Labels)
+    then its cached index is used to do the mapping so that mapping many
+    lists onto the same Label does not rebuild the index each time. If
+    `list1` is a la.deflabel.ArrayLabel the mapping is done with Numpy's
+    searchsorted. Otherwise the C version of the function (la.cflabel) is
+    used if it was compiled when the la package was built; if not, a slower
+    python version is used.
+
+    Examples
+    --------
+    A simple mapping where all elements are mappable:
+
+    >>> list1 = [1, 2, 3]
+    >>> list2 = [3, 1, 2]
+    >>> idx, idx_unmappable = listmap_fill(list1, list2)
+    >>> idx
+    [2, 0, 1]
+    >>> idx_unmappable
+    []
+    >>> [list1[i] for i in idx] == list2
+    True
+    
+    An example where list2 contains an element (4) that is not in list1:
+
+    >>> list1 = [1, 2, 3]
+    >>> list2 = [1, 2, 3, 4]
+    >>> idx, idx_unmappable = listmap_fill(list1, list2)
+    >>> idx
+    [0, 1, 2, 0]
+    >>> idx_unmappable
+    [3]
+    
+    """
+    if type(list1) is Label:
+        list1map = list1.indexmap()
+        index_missing = []
+        index = [fill] * len(list2)
+        i = -1
+        for li2 in list2:
+            i += 1
+            try:
+                index[i] = list1map[li2]
+            except KeyError:
+                index_missing.append(i)
+        return index, index_missing
+    if type(list1) is RangeLabel:
+        list1 = ArrayLabel._fromarray(list1.values, 'int')
+    if type(list1) is ArrayLabel:
+        values = _labelvalues(list2, list1.kind)
+        if values is not None:
+            idx, idx_miss = _arraymap(list1.values, list1.sorter(), values,
+                                      fill)
+            return idx.tolist(), idx_miss.tolist()
+        list1 = list1.tolist()
+    if type(list1) is not list:
+        list1 = list(list1)
+    if type(list2) is not list:
+        list2 = list(list2)
+    return _listmap_fill(list1, list2, fill)
+
+def listmap_array(values1, values2, ignore_unmappable=False):
+    """
+    Indices that map one numeric array onto another numeric array.
+    
+    Vectorized version of listmap for arrays of int, float or date-ordinal
+    label values. The mapping is done with Numpy's searchsorted on a sorted
+    view of `values1`.
+    
+    Parameters
+    ----------
+    values1 : {array_like, ArrayLabel}
+        The 1d array (of unique values) to map from. If `values1` is a
+        la.deflabel.ArrayLabel its cached sort order is used.
+    values2 : {array_like, ArrayLabel}
+        The 1d array to map to.
+    ignore_unmappable : bool, optional
+        If False (default) an element in `values2` that is not in `values1`
+        will raise a KeyError. If True the unmappable elements will be
+        ignored.
+        
+    Returns
+    -------
+    idx : ndarray
+        An np.intp array of indices such that values1[idx] is `values2`
+        (with the unmappable elements dropped if `ignore_unmappable` is
+        True).
+
+    See Also
+    --------
+    la.flabel.listmap: Indices that map one list onto another list
+    la.flabel.listmap_fill_array: Indices and unmappable elements of arrays
+        
+    Examples
+    --------
+    >>> listmap_array([1, 2, 3], [3, 1, 2])
+    array([2, 0, 1])
+    >>> listmap_array([1, 2, 3], [3, 4], ignore_unmappable=True)
+    array([2])
+    
+    """
+    values1, sorter1 = _arraysorter(values1)
+    values2 = _arrayvalues(values2)
+    idx, idx_miss = _arraymap(values1, sorter1, values2)
+    if idx_miss.size > 0:
+        if not ignore_unmappable:
+            raise KeyError(values2[idx_miss[0]])
+        idx = np.delete(idx, idx_miss)
+    return idx
+
+def listmap_fill_array(values1, values2, fill=0):
+    """
+    Indices that map one numeric array onto another and indices of
+    unmappable elements.
+    
+    Vectorized version of listmap_fill for arrays of int, float or
+    date-ordinal label values.
+    
+    Parameters
+    ----------
+    values1 : {array_like, ArrayLabel}
+        The 1d array (of unique values) to map from. If `values1` is a
+        la.deflabel.ArrayLabel its cached sort order is used.
+    values2 : {array_like, ArrayLabel}
+        The 1d array to map to.
+    fill : int, optional
+        Any element that cannot be mapped is given the index value `fill` in
+        the frist of two index arrays returned.
+        
+    Returns
+    -------
+    index : ndarray
+        An np.intp array such that values1[index] is `values2`. If there are
+        items in `values2` that are not in `values1` then the correponding
+        index value is `fill`.
+    index_missing : ndarray
+        An np.intp array of the positions in `values2` of the elements that
+        are not in `values1`.
+
+    See Also
+    --------
+    la.flabel.listmap_fill: Indices that map one list onto another
+        
+    Examples
+    --------
+    >>> idx, idx_unmappable = listmap_fill_array([1, 2, 3], [1, 2, 3, 4])
+    >>> idx
+    array([0, 1, 2, 0])
+    >>> idx_unmappable
+    array([3])
+    
+    """
+    values1, sorter1 = _arraysorter(values1)
+    values2 = _arrayvalues(values2)
+    return _arraymap(values1, sorter1, values2, fill)
+
+def issorted(label):
+    """
+    True if the elements of `label` are unique and in ascending order.
+    
+    If `label` is a la.deflabel.Label, ArrayLabel or RangeLabel the cached
+    result is used.
+
+    Examples
+    --------
+    >>> issorted([1, 2, 3])
+    True
+    >>> issorted([1, 2, 2])
+    False
+    
+    """
+    typ = type(label)
+    if typ is not Label and typ is not ArrayLabel and typ is not RangeLabel:
+        label = Label(label)
+    return label.issorted()
+
+def mergejoin(list1, list2, join='inner', fill=0):
+    """
+    Join two sorted lists in a single pass.
+    
+    Both lists must contain unique elements in ascending order (see
+    issorted); this is not checked. The joined list and the indices that map
+    each input list onto it are found with one linear merge, so, unlike
+    joining with set intersection or union, no hashing or sorting is needed.
+    
+    Parameters
+    ----------
+    list1 : list
+        The first sorted list.
+    list2 : list
+        The second sorted list.
+    join : {'inner', 'outer', 'left', 'right'}, optional
+        The join method. The joined list contains the elements in both lists
+        ('inner', default), in either list ('outer'), in `list1` ('left'),
+        or in `list2` ('right'). The joined list is sorted.
+    fill : fill value, optional
+        Index value used for the elements of the joined list that are not in
+        the input list.
+        
+    Returns
+    -------
+    list3 : Label
+        The joined list.
+    idx1 : list
+        An index such that [list1[i] for i in idx1] is `list3` except at the
+        positions given by `idx1_miss` which are set to `fill`.
+    idx1_miss : list
+        Positions in `list3` of the elements that are not in `list1`.
+    idx2 : list
+        An index such that [list2[i] for i in idx2] is `list3` except at the
+        positions given by `idx2_miss` which are set to `fill`.
+    idx2_miss : list
+        Positions in `list3` of the elements that are not in `list2`.
+    
+    Examples
+    --------
+    >>> list3, idx1, idx1_miss, idx2, idx2_miss = mergejoin([1, 2, 4], [2, 3, 4], 'outer')
+    >>> list3
+    [1, 2, 3, 4]
+    >>> idx1, idx1_miss
+    ([0, 1, 0, 2], [2])
+    >>> idx2, idx2_miss
+    ([0, 0, 1, 2], [0])
+        
+    """
+    if join == 'inner':
+        keep1 = False
+        keep2 = False
+    elif join == 'outer':
+        keep1 = True
+        keep2 = True
+    elif join == 'left':
+        keep1 = True
+        keep2 = False
+    elif join == 'right':
+        keep1 = False
+        keep2 = True
+    else:
+        raise ValueError, 'join type not recognized'
+    # Index plain lists: Label.__getitem__ is Python code and would be
+    # called for every element
+    if type(list1) is not list:
+        list1 = list(list1)
+    if type(list2) is not list:
+        list2 = list(list2)
+    list3 = []
+    idx1 = []
+    idx2 = []
+    idx1_miss = []
+    idx2_miss = []
+    append3 = list3.append
+    append1 = idx1.append
+    append2 = idx2.append
+    append1_miss = idx1_miss.append
+    append2_miss = idx2_miss.append
+    n1 = len(list1)
+    n2 = len(list2)
+    i = 0
+    j = 0
+    k = 0
+    if n1 > 0 and n2 > 0:
+        a = list1[0]
+        b = list2[0]
+        while True:
+            if a < b:
+                if keep1:
+                    append3(a)
+                    append1(i)
+                    append2(fill)
+                    append2_miss(k)
+                    k += 1
+                i += 1
+                if i == n1:
+                    break
+                a = list1[i]
+            elif b < a:
+                if keep2:
+                    append3(b)
+                    append1(fill)
+                    append1_miss(k)
+                    append2(j)
+                    k += 1
+                j += 1
+                if j == n2:
+                    break
+                b = list2[j]
+            else:
+                append3(a)
+                append1(i)
+                append2(j)
+                k += 1
+                i += 1
+                j += 1
+                if i == n1 or j == n2:
+                    break
+                a = list1[i]
+                b = list2[j]
+    if keep1 and i < n1:
+        list3.extend(list1[i:])
+        idx1.extend(xrange(i, n1))
+        idx2.extend([fill] * (n1 - i))
+        idx2_miss.extend(xrange(k, k + n1 - i))
+    if keep2 and j < n2:
+        list3.extend(list2[j:])
+        idx1.extend([fill] * (n2 - j))
+        idx1_miss.extend(xrange(k, k + n2 - j))
+        idx2.extend(xrange(j, n2))
+    list3 = Label(list3)
+    list3._issorted = True
+    return list3, idx1, idx1_miss, idx2, idx2_miss
+
+def joinlabel(list1, list2, join='inner', fill=0):
+    """
+    Join two labels and find the indices that map each label onto the join.
+    
+    Two la.deflabel.RangeLabel with a step of one are joined without
+    looking at their elements (unless an outer join leaves a gap). Labels
+    that are ArrayLabels or RangeLabels (or one ArrayLabel or RangeLabel
+    and one list of compatible elements) are joined with vectorized Numpy
+    code; labels that are both sorted are joined with mergejoin; other
+    labels are joined with sets and then sorted. The inner or outer join of
+    a list and an ArrayLabel or RangeLabel is a Label, so it can be changed
+    in place.
+    
+    Parameters
+    ----------
+    list1 : {list, Label, ArrayLabel}
+        The first label.
+    list2 : {list, Label, ArrayLabel}
+        The second label.
+    join : {'inner', 'outer', 'left', 'right'}, optional
+        The join method. The joined label contains the elements in both
+        labels ('inner', default), in either label ('outer'), in `list1`
+        ('left'), or in `list2` ('right'). Inner and outer joins are
+        sorted.
+    fill : fill value, optional
+        Index value used for the elements of the joined label that are not
+        in the input label.
+        
+    Returns
+    -------
+    list3 : {Label, ArrayLabel, RangeLabel}
+        The joined label.
+    idx1 : {list, array}
+        An index such that [list1[i] for i in idx1] is `list3` except at the
+        positions given by `idx1_miss` which are set to `fill`.
+    idx1_miss : {list, array}
+        Positions in `list3` of the elements that are not in `list1`.
+    idx2 : {list, array}
+        An index such that [list2[i] for i in idx2] is `list3` except at the
+        positions given by `idx2_miss` which are set to `fill`.
+    idx2_miss : {list, array}
+        Positions in `list3` of the elements that are not in `list2`.
+    
+    See Also
+    --------
+    la.flabel.mergejoin: Join two sorted lists in a single pass.
+    la.align_cache: Opt-in cache of label joins.
+    
+    Examples
+    --------
+    >>> list3, idx1, idx1_miss, idx2, idx2_miss = joinlabel(['b', 'a'], ['c', 'b'], 'outer')
+    >>> list3
+    ['a', 'b', 'c']
+    >>> idx1, idx1_miss
+    ([1, 0, 0], [2])
+    >>> idx2, idx2_miss
+    ([0, 1, 0], [0])
+        
+    """
+    if align_cache.maxsize > 0:
+        plan = align_cache.get(list1, list2, join, fill)
+        if plan is None:
+            plan = _joinlabel(list1, list2, join, fill)
+            plan = align_cache.put(list1, list2, join, fill, plan)
+        # The cached indices are read-only arrays and can be shared; the
+        # joined label is copied since it could be changed in place
+        return (labelcopy(plan[0]),) + plan[1:]
+    return _joinlabel(list1, list2, join, fill)
+
+def _joinlabel(list1, list2, join, fill):
+    "joinlabel without the cache."
+    typ1 = type(list1)
+    typ2 = type(list2)
+    if typ1 is RangeLabel and typ2 is RangeLabel:
+        if list1.step == 1 and list2.step == 1:
+            out = _rangejoin(list1, list2, join, fill)
+            if out is not None:
+                return out
+    if typ1 is ArrayLabel:
+        kind = list1.kind
+    elif typ2 is ArrayLabel:
+        kind = list2.kind
+    elif typ1 is RangeLabel or typ2 is RangeLabel:
+        kind = 'int'
+    else:
+        kind = None
+        if typ1 is Label and typ2 is Label:
+            label1 = list1.asarraylabel()
+            if label1 is not None:
+                label2 = list2.asarraylabel()
+                if label2 is not None and label1.kind == label2.kind:
+                    return _numericjoin(list1, list2, label1, label2, join,
+                                        fill)
+    if kind is not None:
+        values1 = _labelvalues(list1, kind)
+        values2 = _labelvalues(list2, kind)
+        if values1 is not None and values2 is not None:
+            out = _arrayjoin(list1, list2, values1, values2, kind, join, fill)
+            if join in ('inner', 'outer') and not (_isarray(list1) and
+                                                   _isarray(list2)):
+                # One of the labels is a list; the joined label is a list
+                # too so that it can be changed in place
+                out = (_arraytolabel(out[0]),) + out[1:]
+            return out
+    if issorted(list1) and issorted(list2):
+        try:
+            return mergejoin(list1, list2, join, fill)
+        except TypeError:
+            # Each label is sorted but the elements of one label cannot be
+            # compared with those of the other (such as dates and ints);
+            # join with sets
+            pass
+    if join == 'inner':
+        list3 = list(set(list1).intersection(list2))
+        list3.sort()
+    elif join == 'outer':
+        list3 = list(set(list1).union(list2))
+        list3.sort()
+    elif join == 'left':
+        list3 = labelcopy(list1)
+        idx2, idx2_miss = listmap_fill(list2, list3, fill)
+        return list3, range(len(list1)), [], idx2, idx2_miss
+    elif join == 'right':
+        list3 = labelcopy(list2)
+        idx1, idx1_miss = listmap_fill(list1, list3, fill)
+        return list3, idx1, idx1_miss, range(len(list2)), []
+    else:
+        raise ValueError, 'join type not recognized'
+    list3 = Label(list3)
+    list3._issorted = True
+    idx1, idx1_miss = listmap_fill(list1, list3, fill)
+    idx2, idx2_miss = listmap_fill(list2, list3, fill)
+    return list3, idx1, idx1_miss, idx2, idx2_miss
+
+class AlignCache(object):
+    """
+    Size bounded LRU cache of label joins (alignment plans).
+    
+    When enabled, joinlabel, and therefore align_raw, align, binaryop, add,
+    subtract, multiply, divide and the binary operators of larry, stores
+    the joined label and the indices that map each label onto the join.
+    The next join of labels with the same elements (and the same join
+    method) reuses the stored plan instead of joining the labels again.
+    Plans are looked up by a hash of the label contents (cached by Label,
+    ArrayLabel and RangeLabel). A plan is used without looking at the label
+    elements if the labels are the label objects the plan was stored for
+    and they were not changed in place since; other labels are checked
+    against a copy of the stored labels (elements and their types), so
+    changing a label in place never gives a stale plan. While the cache is
+    enabled joinlabel returns the indices of a plan as shared, read-only
+    arrays; the joined label is copied.
+    
+    The cache is disabled (maxsize is 0) by default. Use la.align_cache,
+    the cache instance used by la, to enable it.
+    
+    Parameters
+    ----------
+    maxsize : int, optional
+        Maximum number of plans to store. When full, the least recently
+        used plan is discarded. The default (0) disables the cache.
+    
+    Examples
+    --------
+    >>> import la
+    >>> la.align_cache.enable(maxsize=100)
+    >>> y1 = la.larry([1, 2, 3], [['a', 'b', 'c']])
+    >>> y2 = la.larry([1, 2], [['c', 'a']])
+    >>> z = y1 + y2
+    >>> z = y1 - y2
+    >>> la.align_cache.hits, la.align_cache.misses
+    (1, 1)
+    >>> la.align_cache.disable()
+    
+    """
+
+    def __init__(self, maxsize=0):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._plans = OrderedDict()
+        
+    def enable(self, maxsize=128):
+        "Enable the cache; store at most `maxsize` plans (default 128)."
+        if maxsize < 0:
+            raise ValueError, 'maxsize must be non-negative'
+        self.maxsize = maxsize
+        self._evict()
+
+    def disable(self):
+        "Disable the cache and discard the stored plans."
+        self.maxsize = 0
+        self.clear()
+
+    def clear(self):
+        "Discard the stored plans and reset the hit and miss counters."
+        self._plans.clear()
+        self.hits = 0
+        self.misses = 0
+        
+    def __len__(self):
+        return len(self._plans)
+        
+    def __repr__(self):
+        msg = 'AlignCache(maxsize=%d, size=%d, hits=%d, misses=%d)'
+        return msg % (self.maxsize, len(self), self.hits, self.misses)
+
+    def get(self, list1, list2, join, fill):
+        "Stored plan for the given join; None if there is none."
+        key = _plankey(list1, list2, join, fill)
+        if key is not None:
+            entry = self._plans.get(key)
+            if entry is not None:
+                if (_isstored(list1, entry[0]) and
+                    _isstored(list2, entry[1])):
+                    # Move to the end; the most recently used
+                    del self._plans[key]
+                    self._plans[key] = entry
+                    self.hits += 1
+                    return entry[2]
+        self.misses += 1
+        return None
+
+    def put(self, list1, list2, join, fill, plan):
+        "Store the plan of the given join; returns the plan as stored."
+        plan = (plan[0],) + tuple(map(_readonly, plan[1:]))
+        key = _plankey(list1, list2, join, fill)
+        if key is None:
+            return plan
+        self._plans.pop(key, None)
+        self._plans[key] = (_storedlabel(list1), _storedlabel(list2), plan)
+        self._evict()
+        return plan
+
+    def _evict(self):
+        "Discard the least recently used plans until the cache fits."
+        plans = self._plans
+        while len(plans) > self.maxsize:
+            plans.popitem(last=False)
+
+align_cache = AlignCache()
+
+def _plankey(list1, list2, join, fill):
+    "Key of a join in the AlignCache; None if a label is unhashable."
+    try:
+        return (type(list1), _contenthash(list1), type(list2),
+                _contenthash(list2), join, fill)
+    except TypeError:
+        return None
+
+def _samelabel(label1, label2):
+    """
+    True if the two labels have the same elements of the same types; [1, 2]
+    and [1.0, 2.0], for example, are equal but not the same.
+    
+    """
+    if label1 != label2:
+        return False
+    typ1 = type(label1)
+    typ2 = type(label2)
+    if typ1 is ArrayLabel or typ2 is ArrayLabel:
+        return typ1 is typ2 and label1.kind == label2.kind
+    if typ1 is RangeLabel or typ2 is RangeLabel:
+        return typ1 is typ2
+    return map(type, label1) == map(type, label2)
+
+def _storedlabel(label):
+    """
+    The label object, its version and a copy of it, stored with a plan in
+    the AlignCache; see _isstored. ArrayLabels and RangeLabels cannot be
+    changed so the version is 0; lists have no version (None).
+    
+    """
+    typ = type(label)
+    if typ is Label:
+        return label, label._version, labelcopy(label)
+    if typ is ArrayLabel or typ is RangeLabel:
+        return label, 0, label
+    return label, None, labelcopy(label)
+
+def _isstored(label, stored):
+    "True if a plan stored for the label `stored` (see _storedlabel) fits."
+    obj, version, copy = stored
+    if label is obj and version is not None:
+        # The same label object; O(1) unless it was changed in place
+        if type(label) is not Label or label._version == version:
+            return True
+    return _samelabel(copy, label)
+
+def _readonly(idx):
+    "Read-only array of the indices (or positions of the misses) of a plan."
+    if isinstance(idx, np.ndarray):
+        idx = idx.view()
+    elif len(idx) == 0:
+        idx = np.zeros(0, dtype=np.intp)
+    else:
+        idx = np.array(idx)
+    idx.flags.writeable = False
+    return idx
+
+def _contenthash(label):
+    "Hash of the label elements."
+    typ = type(label)
+    if typ is Label or typ is ArrayLabel or typ is RangeLabel:
+        return label.contenthash()
+    return hash(tuple(label))
+
 def flattenlabel(label, order='C'):
     """
     Flatten label in row-major order 'C' (default) or column-major order 'F'.
@@ -193,3 +829,230 @@ def list2index(L):
     idx = dict((y, x) for x, y in enumerate(uL))
     return [idx[x] for x in L], uL
                 
+
+# Utility functions for ArrayLabel ------------------------------------------
+
+def _labelvalues(label, kind):
+    """
+    Array of label values comparable to those of an ArrayLabel of `kind`.
+    
+    None is returned if `label` cannot be converted, for example if the
+    ArrayLabel is a date label and `label` contains elements that are not
+    datetime.date objects.
+    
+    """
+    if type(label) is ArrayLabel:
+        if (label.kind == 'date') == (kind == 'date'):
+            return label.values
+        return None
+    if type(label) is RangeLabel:
+        if kind == 'date':
+            return None
+        return label.values
+    if kind == 'date':
+        try:
+            return ArrayLabel(label, kind='date').values
+        except TypeError:
+            return None
+    try:
+        values = np.asarray(label)
+    except ValueError:
+        return None
+    if values.ndim != 1:
+        return None
+    if values.size == 0:
+        return values.astype(np.int64)
+    if values.dtype.kind not in 'iuf':
+        return None
+    return values
+
+def _asarraylabel(label):
+    "ArrayLabel version of `label` if it is numeric, else None."
+    typ = type(label)
+    if typ is ArrayLabel:
+        return label
+    if typ is Label:
+        return label.asarraylabel()
+    if typ is RangeLabel:
+        return ArrayLabel._fromarray(label.values, 'int')
+    return None
+
+def _arrayvalues(values):
+    "1d array of the values of an ArrayLabel or an array_like."
+    if type(values) is ArrayLabel:
+        return values.values
+    values = np.asarray(values)
+    if values.ndim != 1:
+        raise ValueError, 'values must be 1d'
+    return values
+
+def _arraysorter(values):
+    "1d array of values and its sorter (None if values are sorted)."
+    if type(values) is ArrayLabel:
+        return values.values, values.sorter()
+    values = _arrayvalues(values)
+    return values, _sorter(values)
+
+def labelmap_fill(list1, list2, fill=0):
+    """
+    listmap_fill that uses listmap_fill_array for numeric labels.
+    
+    If both labels are numeric (ArrayLabels, RangeLabels, or Labels whose
+    elements are all ints, all floats or all dates) the two returned indices
+    are np.intp arrays; otherwise they are lists.
+    
+    """
+    label1 = _asarraylabel(list1)
+    if label1 is not None:
+        label2 = _asarraylabel(list2)
+        if label2 is not None:
+            if (label1.kind == 'date') == (label2.kind == 'date'):
+                return listmap_fill_array(label1, label2, fill)
+    return listmap_fill(list1, list2, fill)
+
+def _numericjoin(list1, list2, label1, label2, join, fill):
+    """
+    joinlabel of two numeric Labels done on their ArrayLabel versions.
+    
+    The joined label is a Label (with its ArrayLabel version cached), so
+    joining numeric lists does not change the type of the label elements.
+    
+    """
+    out = _arrayjoin(label1, label2, label1.values, label2.values,
+                     label1.kind, join, fill)
+    if join == 'left':
+        list3 = labelcopy(list1)
+    elif join == 'right':
+        list3 = labelcopy(list2)
+    else:
+        list3 = _arraytolabel(out[0])
+    return (list3,) + out[1:]
+
+def _isarray(label):
+    "True if `label` is an ArrayLabel or a RangeLabel."
+    typ = type(label)
+    return typ is ArrayLabel or typ is RangeLabel
+
+def _arraytolabel(label3):
+    """
+    Label of the sorted ArrayLabel or RangeLabel `label3` (an inner or
+    outer join) with its ArrayLabel version cached.
+    
+    """
+    list3 = Label(label3.tolist())
+    list3._issorted = True
+    if type(label3) is ArrayLabel:
+        list3._arraylabel = label3
+    return list3
+
+def _rangejoin(list1, list2, join, fill):
+    """
+    joinlabel for two RangeLabels with a step of one.
+    
+    None is returned for an outer join of two ranges that do not overlap or
+    touch since their union is not a range.
+    
+    """
+    start1 = list1.start
+    stop1 = list1.stop
+    start2 = list2.start
+    stop2 = list2.stop
+    if join == 'inner':
+        start3 = max(start1, start2)
+        stop3 = max(min(stop1, stop2), start3)
+    elif join == 'outer':
+        if max(start1, start2) > min(stop1, stop2):
+            return None
+        start3 = min(start1, start2)
+        stop3 = max(stop1, stop2)
+    elif join == 'left':
+        start3 = start1
+        stop3 = stop1
+    elif join == 'right':
+        start3 = start2
+        stop3 = stop2
+    else:
+        raise ValueError, 'join type not recognized'
+    idx1, idx1_miss = _rangemap(start1, stop1, start3, stop3, fill)
+    idx2, idx2_miss = _rangemap(start2, stop2, start3, stop3, fill)
+    return RangeLabel(start3, stop3), idx1, idx1_miss, idx2, idx2_miss
+
+def _rangemap(start1, stop1, start2, stop2, fill=0):
+    "Vectorized listmap_fill of range(start1, stop1), range(start2, stop2)."
+    idx = np.arange(start2 - start1, stop2 - start1)
+    idx_miss = np.flatnonzero((idx < 0) | (idx >= stop1 - start1))
+    if idx_miss.size > 0:
+        idx[idx_miss] = fill
+    return idx, idx_miss
+
+def _sorter(values):
+    "Stable argsort of `values`, None if already sorted (and unique)."
+    if (values[1:] > values[:-1]).all():
+        return None
+    return values.argsort(kind='mergesort')
+
+def _arraymap(values1, sorter1, values2, fill=0):
+    """
+    Vectorized listmap_fill of two arrays.
+    
+    `sorter1` is the stable argsort of `values1` or None if `values1` is
+    sorted. Returns an intp array that maps `values1` onto `values2` (with
+    `fill` for unmappable elements) and an array with the positions in
+    `values2` of the unmappable elements.
+    
+    """
+    n = values1.size
+    if n == 0:
+        idx = np.empty(values2.size, dtype=np.intp)
+        idx.fill(fill)
+        return idx, np.arange(values2.size)
+    idx = values1.searchsorted(values2, sorter=sorter1)
+    idx.clip(0, n - 1, out=idx)
+    if sorter1 is not None:
+        idx = sorter1.take(idx)
+    idx_miss = np.flatnonzero(values1.take(idx) != values2)
+    if idx_miss.size > 0:
+        idx[idx_miss] = fill
+    return idx, idx_miss
+
+def _arrayjoin(list1, list2, values1, values2, kind, join, fill):
+    "joinlabel for labels that can be converted to arrays."
+    if type(list1) is ArrayLabel:
+        sorter1 = list1.sorter()
+    elif type(list1) is RangeLabel and list1.step > 0:
+        sorter1 = None
+    else:
+        sorter1 = _sorter(values1)
+    if type(list2) is ArrayLabel:
+        sorter2 = list2.sorter()
+    elif type(list2) is RangeLabel and list2.step > 0:
+        sorter2 = None
+    else:
+        sorter2 = _sorter(values2)
+    if join == 'inner':
+        values3 = np.intersect1d(values1, values2, assume_unique=True)
+    elif join == 'outer':
+        values3 = np.union1d(values1, values2)
+    elif join == 'left':
+        idx2, idx2_miss = _arraymap(values2, sorter2, values1, fill)
+        return (labelcopy(list1), np.arange(values1.size), np.array([], int),
+                idx2, idx2_miss)
+    elif join == 'right':
+        idx1, idx1_miss = _arraymap(values1, sorter1, values2, fill)
+        return (labelcopy(list2), idx1, idx1_miss, np.arange(values2.size),
+                np.array([], int))
+    else:
+        raise ValueError, 'join type not recognized'
+    if kind == 'date':
+        values3 = values3.astype(np.int64)
+    elif values3.dtype.kind == 'f':
+        kind = 'float'
+        values3 = values3.astype(np.float64)
+    else:
+        kind = 'int'
+        values3 = values3.astype(np.int64)
+    list3 = ArrayLabel._fromarray(values3, kind)
+    list3._issorted = True
+    idx1, idx1_miss = _arraymap(values1, sorter1, values3, fill)
+    idx2, idx2_miss = _arraymap(values2, sorter2, values3, fill)
+    return list3, idx1, idx1_miss, idx2, idx2_miss
@@ -2,15 +2,21 @@
 
 import numpy as np
 
-from la.deflarry import larry
-from la.flabel import flattenlabel, listmap, listmap_fill
-from la.farray import covMissing
+from la.deflarry import larry, _broadcast_axes, _broadcast_view
+from la.deflabel import Label, labelcopy
+from la.flabel import flattenlabel, joinlabel, labelmap_fill, align_cache
+from la.farray import (covMissing, corrMissing, take_axes,
+                       set_num_threads, get_num_threads)
+from la.farray.parallel import blockmap, blockfunc, usethreads
+from la.farray.misc import _ixindex
 from la.missing import missing_marker, ismissing
 
-__all__ = ['align', 'align_axis', 'align_raw', 'lrange', 'empty', 'ones',
-           'zeros', 'isaligned', 'union', 'intersection', 'binaryop', 'add',
-           'sortby', 'subtract', 'multiply', 'divide', 'unique', 'stack',
-           'panel', 'cov', 'rand', 'randn']
+__all__ = ['align', 'align_axis', 'align_raw', 'align_cache', 'lrange',
+           'empty', 'ones', 'zeros', 'isaligned', 'union', 'intersection',
+           'binaryop', 'add', 'sortby', 'subtract', 'multiply', 'divide',
+           'unique', 'stack', 'panel', 'cov', 'corr', 'rand', 'randn',
+           'nansum_many', 'nanmean_many', 'set_num_threads',
+           'get_num_threads']
 
 
 # Alignment -----------------------------------------------------------------
@@ -109,7 +115,7 @@ def align(lar1, lar2, join='inner', cast=True):
     label1 = []
     for j, lab in enumerate(label):
         if lab is None:
-            label1.append(list(lar1.label[j]))
+            label1.append(list(lar1._label[j]))
         else:
             label1.append(list(lab))
     if x1isview:    
@@ -120,7 +126,7 @@ def align(lar1, lar2, join='inner', cast=True):
     label2 = []
     for j, lab in enumerate(label):
         if lab is None:
-            label2.append(list(lar2.label[j]))
+            label2.append(list(lar2._label[j]))
         else:
             label2.append(list(lab))
     if x2isview:    
@@ -259,123 +265,141 @@ def align_raw(lar1, lar2, join='inner', cast=True):
     else:
         raise TypeError, "`join` must be a string or a list."
         
-    # Initialize missing markers, set value later (in loop) only if needed.
-    # The weird initialization value ensures a user would never pick the same 
-    undefined = 'aB!@12#E~=-'
-    miss1 = undefined
-    miss2 = undefined
-        
-    # For loop initialization                         
+    # Loop: join the labels one axis at a time. The data arrays are not
+    # touched in the loop; all axes are taken at once after the loop so that
+    # each output array is allocated only once.
     label = []
-    x1 = lar1.x
-    x2 = lar2.x
-    label1 = lar1.label
-    label2 = lar2.label
-    x1isview = True
-    x2isview = True
-    
-    # Loop: align one axis at a time 
-    msg = "`fill` type not compatible with larry dtype"     
+    label1 = lar1._label
+    label2 = lar2._label
+    index1 = [None] * ndim
+    index2 = [None] * ndim
+    missing1 = []
+    missing2 = []
     for ax in range(ndim):    
         list1 = label1[ax]
         list2 = label2[ax]
         joinax = join[ax]        
-        if joinax == 'inner':
-            if list1 == list2:
-                list3 = list(list1)
+        if joinax == 'skip':
+            list3 = None
+        elif joinax not in ('inner', 'outer', 'left', 'right'):
+            raise ValueError, 'join type not recognized'  
+        elif list1 == list2:
+            if joinax == 'right':
+                list3 = labelcopy(list2)
             else:
-                list3 = list(set(list1).intersection(list2))
-                list3.sort()
-                idx1 = listmap(list1, list3)
-                idx2 = listmap(list2, list3)
-                x1 = x1.take(idx1, ax)
-                x2 = x2.take(idx2, ax)
-                x1isview = False
-                x2isview = False   
-        elif joinax == 'outer':
-            if list1 == list2:
-                list3 = list(list1)
-            else:                 
-                list3 = list(set(list1).union(list2))
-                list3.sort()
-                idx1, idx1_miss = listmap_fill(list1, list3, fill=0)
-                idx2, idx2_miss = listmap_fill(list2, list3, fill=0)
-                x1 = x1.take(idx1, ax)
-                x2 = x2.take(idx2, ax) 
+                list3 = labelcopy(list1)
+        else:
+            list3, idx1, idx1_miss, idx2, idx2_miss = \
+                                     joinlabel(list1, list2, joinax)
+            if joinax != 'left':
+                index1[ax] = idx1
                 if len(idx1_miss) > 0:
-                    if miss1 == undefined:
-                        miss1 = missing_marker(lar1)
-                    if miss1 == NotImplemented:
-                        if cast:
-                            x1 = x1.astype(float)
-                            miss1 = missing_marker(x1)   
-                        else:                         
-                            raise TypeError, msg
-                    index1 = [slice(None)] * ndim
-                    index1[ax] = idx1_miss      
-                    x1[index1] = miss1                                        
-                if len(idx2_miss) > 0:
-                    if miss2 == undefined:
-                        miss2 = missing_marker(lar2)
-                    if miss2 == NotImplemented:
-                        if cast:
-                            x2 = x2.astype(float)
-                            miss2 = missing_marker(x2)   
-                        else:
-                            raise TypeError, msg
-                    index2 = [slice(None)] * ndim
-                    index2[ax] = idx2_miss                             
-                    x2[index2] = miss2
-                x1isview = False
-                x2isview = False                     
-        elif joinax == 'left':
-            list3 = list(list1)
-            if list1 != list2:
-                idx2, idx2_miss = listmap_fill(list2, list3, fill=0)
-                x2 = x2.take(idx2, ax) 
+                    missing1.append((ax, idx1_miss))
+            if joinax != 'right':
+                index2[ax] = idx2
                 if len(idx2_miss) > 0:
-                    if miss2 == undefined:
-                        miss2 = missing_marker(lar2)
-                    if miss2 == NotImplemented:
-                        if miss2 is None:
-                            miss2 = missing_marker(lar2)
-                        if miss2 is None:
-                            miss2 = missing_marker(lar2)
-                        if cast:
-                            x2 = x2.astype(float)
-                            miss2 = missing_marker(x2)   
-                        else:
-                            raise TypeError, msg
-                    index2 = [slice(None)] * ndim
-                    index2[ax] = idx2_miss        
-                    x2[index2] = miss2
-                x2isview = False                    
-        elif joinax == 'right':
-            list3 = list(list2)
-            if list1 != list2:            
-                idx1, idx1_miss = listmap_fill(list1, list3, fill=0)
-                x1 = x1.take(idx1, ax) 
-                if len(idx1_miss) > 0:
-                    if miss1 == undefined:
-                        miss1 = missing_marker(lar1)
-                    if miss1 == NotImplemented:
-                        if cast:
-                            x1 = x1.astype(float)
-                            miss1 = missing_marker(x1)   
-                        else:
-                            raise TypeError, msg
-                    index1 = [slice(None)] * ndim
-                    index1[ax] = idx1_miss                            
-                    x1[index1] = miss1 
-                x1isview = False
-        elif joinax == 'skip':
-            list3 = None
-        else:
-            raise ValueError, 'join type not recognized'  
+                    missing2.append((ax, idx2_miss))
         label.append(list3)
+        
+    # Take all axes in a single pass and fill in the missing values
+    x1 = _takemissing(lar1, index1, missing1, cast)
+    x2 = _takemissing(lar2, index2, missing2, cast)
+    x1isview = all([idx is None for idx in index1])
+    x2isview = all([idx is None for idx in index2])
     
     return x1, x2, label, x1isview, x2isview
 
+def _takemissing(lar, indices, missing, cast):
+    """
+    Take `indices` from lar.x along all axes in a single pass (see
+    la.farray.take_axes) and fill the `missing` (axis, index) positions with
+    the missing value marker of the larry. Used by align_raw.
+    
+    """
+    x = take_axes(lar.x, indices)
+    if len(missing) > 0:
+        miss = missing_marker(lar)
+        if miss == NotImplemented:
+            if cast:
+                x = x.astype(float)
+                miss = missing_marker(x)   
+            else:                         
+                msg = "`fill` type not compatible with larry dtype"     
+                raise TypeError, msg
+        for ax, idx_miss in missing:
+            index = [slice(None)] * x.ndim
+            index[ax] = idx_miss
+            x[index] = miss
+    return x
+
+def _align_broadcast(lar1, lar2, join='inner', cast=True, axes=None):
+    """
+    Align two larrys with different number of dimensions for broadcasting.
+    
+    Only the axes that the two larrys share (see _broadcast_axes in
+    la.deflarry; `axes` are the axes of the larry with more dimensions that
+    the axes of the other larry line up with) are joined. The data array
+    of the larry with fewer dimensions is returned as a view that
+    broadcasts against the data array of the other larry. Returns the two
+    arrays and the label of the result. Used by binaryop.
+    
+    """
+    if lar1.ndim > lar2.ndim:
+        big, small = lar1, lar2
+    else:
+        big, small = lar2, lar1
+    axes = _broadcast_axes(big, small, axes)
+    ndim = big.ndim
+    typejoin = type(join)
+    if typejoin is str:
+        join = [join] * ndim
+    elif typejoin is list:
+        if len(join) != ndim:
+            msg = "Length of `join` list must equal the number of dimensions "
+            msg += "of the larry with more dimensions."
+            raise ValueError, msg
+    else:
+        raise TypeError, "`join` must be a string or a list."
+    label = [labelcopy(lab) for lab in big._label]
+    index1 = [None] * lar1.ndim
+    index2 = [None] * lar2.ndim
+    missing1 = []
+    missing2 = []
+    for i, ax in enumerate(axes):
+        if big is lar1:
+            ax1, ax2 = ax, i
+        else:
+            ax1, ax2 = i, ax
+        list1 = lar1._label[ax1]
+        list2 = lar2._label[ax2]
+        joinax = join[ax]
+        if joinax not in ('inner', 'outer', 'left', 'right'):
+            raise ValueError, 'join type not recognized'
+        elif list1 == list2:
+            if joinax == 'right':
+                list3 = labelcopy(list2)
+            else:
+                list3 = labelcopy(list1)
+        else:
+            list3, idx1, idx1_miss, idx2, idx2_miss = \
+                                     joinlabel(list1, list2, joinax)
+            if joinax != 'left':
+                index1[ax1] = idx1
+                if len(idx1_miss) > 0:
+                    missing1.append((ax1, idx1_miss))
+            if joinax != 'right':
+                index2[ax2] = idx2
+                if len(idx2_miss) > 0:
+                    missing2.append((ax2, idx2_miss))
+        label[ax] = list3
+    x1 = _takemissing(lar1, index1, missing1, cast)
+    x2 = _takemissing(lar2, index2, missing2, cast)
+    if big is lar1:
+        x2 = _broadcast_view(x2, axes, ndim)
+    else:
+        x1 = _broadcast_view(x1, axes, ndim)
+    return x1, x2, label
+
 def align_axis(lars, axis=0, join='inner', flag=False):
     """
     Align many larrys along potentially different axes.
@@ -497,17 +521,17 @@ def align_axis(lars, axis=0, join='inner', flag=False):
 
     # Alignment
     if join == 'left':
-        label = lars[0].label[axis[0]]
+        label = lars[0]._label[axis[0]]
     elif join == 'right':
-        label = lars[-1].label[axis[-1]]
+        label = lars[-1]._label[axis[-1]]
     else:
-        label = frozenset(lars[0].label[axis[0]])
+        label = frozenset(lars[0]._label[axis[0]])
         if join == 'inner': 
             for i, lar in enumerate(lars[1:]):
-                label = label.intersection(lar.label[axis[i]])
+                label = label.intersection(lar._label[axis[i]])
         elif join == 'outer':
             for i, lar in enumerate(lars[1:]):
-                label = label.union(lar.label[axis[i]])
+                label = label.union(lar._label[axis[i]])
         label = list(label)
         label.sort() 
     lars_out = []
@@ -563,9 +587,9 @@ def isaligned(lar1, lar2, axis=None):
     
     """
     if axis is None:
-        return lar1.label == lar2.label
+        return lar1._label == lar2._label
     else:
-        return lar1.label[axis] == lar2.label[axis]
+        return lar1._label[axis] == lar2._label[axis]
 
 def union(axis, *args):
     """
@@ -601,7 +625,7 @@ def union(axis, *args):
     rc = frozenset([])
     for arg in args:
         if isinstance(arg, larry):
-            rc = rc.union(arg.label[axis])
+            rc = rc.union(arg._label[axis])
         else:
             raise TypeError, 'One or more input is not a larry'
     rc = list(rc)
@@ -639,11 +663,11 @@ def intersection(axis, *args):
     ['d']
     
     """
-    rc = frozenset(args[0].label[axis])
+    rc = frozenset(args[0]._label[axis])
     for i in xrange(1, len(args)):
         arg = args[i]
         if isinstance(arg, larry):
-            rc = rc.intersection(arg.label[axis])
+            rc = rc.intersection(arg._label[axis])
         else:
             raise TypeError, 'One or more input is not a larry'
     rc = list(rc)
@@ -653,7 +677,7 @@ def intersection(axis, *args):
 # Binary-- -----------------------------------------------------------------
 
 def binaryop(func, lar1, lar2, join='inner', cast=True, missone='ignore',
-             misstwo='ignore', **kwargs):
+             misstwo='ignore', broadcast=None, **kwargs):
     """
     Binary operation on two larrys using given function and join method.
     
@@ -664,17 +688,18 @@ def binaryop(func, lar1, lar2, join='inner', cast=True, missone='ignore',
         array as output. For example: np.add. You can also pass keyword
         arguments to the function; see `**kwargs`.
     lar1 : larry
-        The larry on the left-hand side of the binary operation. Must have
-        the same number of dimensions as `lar2`.
+        The larry on the left-hand side of the binary operation. If it does
+        not have the same number of dimensions as `lar2` then the larry with
+        fewer dimensions is broadcast; see `broadcast`.
     lar2 : larry
-        The larry on the right-hand side of the binary operation. Must have
-        the same number of dimensions as `lar1`.
+        The larry on the right-hand side of the binary operation.
     join : {'inner', 'outer', 'left', 'right', list}, optional
         The method used to join the two larrys. The default join method along
         all axes is 'inner', i.e., the intersection of the labels. If `join`
         is a list of strings then the length of the list should be the number
-        of dimensions of the two larrys. The first element in the list is the
-        join method for axis=0, the second element is the join method for
+        of dimensions of the two larrys (of the larry with more dimensions if
+        the number of dimensions differ). The first element in the list is
+        the join method for axis=0, the second element is the join method for
         axis=1, and so on.
     cast : bool, optional
         Only float, str, and object dtypes have missing value markers (la.nan,
@@ -697,9 +722,20 @@ def binaryop(func, lar1, lar2, join='inner', cast=True, missone='ignore',
         If, however, `misstwo` is set to something other than 'ignore', such
         as 0, then all elements that are missing in both larrys are replaced
         by `misstwo`.  
+    broadcast : {None, int, list}, optional
+        Only used when the two larrys have different number of dimensions.
+        The axes of the larry with more dimensions that the axes of the larry
+        with fewer dimensions line up with, one axis for each dimension of
+        the larry with fewer dimensions. Only those axes are joined and the
+        larry with fewer dimensions is broadcast, Numpy style, along the
+        other axes without being copied (unless `missone` or `misstwo` is
+        used). By default (None) each axis lines up with the axis that has
+        the same (or else an overlapping) label; an IndexError is raised if
+        the labels do not single out one axis.
     **kwargs : Keyword arguments, optional
         Keyword arguments to pass to `func`. The keyword arguments passed to
-        `func` cannot have the following keys: join, cast, missone, misstwo.
+        `func` cannot have the following keys: join, cast, missone, misstwo,
+        broadcast.
         
     Returns
     -------
@@ -763,12 +799,34 @@ def binaryop(func, lar1, lar2, join='inner', cast=True, missone='ignore',
     """
     
     # Align
-    x1, x2, label, ign1, ign2 = align_raw(lar1, lar2, join=join, cast=cast)
+    if lar1.ndim != lar2.ndim:
+        x1, x2, label = _align_broadcast(lar1, lar2, join=join, cast=cast,
+                                         axes=broadcast)
+        if missone != 'ignore' or misstwo != 'ignore':
+            # Filling needs the full arrays
+            x1, x2 = np.broadcast_arrays(x1, x2)
+            x1 = x1.copy()
+            x2 = x2.copy()
+        x1isview = x2isview = False
+    else:
+        x1, x2, label, x1isview, x2isview = align_raw(lar1, lar2, join=join,
+                                                      cast=cast)
+    
+    # Fast path for the common arithmetic functions on float arrays
+    if (missone != 'ignore' or misstwo != 'ignore') and len(kwargs) == 0:
+        if func in _FUSED and x1.dtype.kind == 'f' and x2.dtype.kind == 'f':
+            x = _fusedfill(func, x1, x2, missone, misstwo)
+            return larry(x, label, validate=False)
     
     # Replacing missing values is slow, so only do if requested
     if missone != 'ignore' or misstwo != 'ignore':
         miss1 = ismissing(x1)
         miss2 = ismissing(x2)
+        # Do not fill the data of the input larrys
+        if x1isview:
+            x1 = x1.copy()
+        if x2isview:
+            x2 = x2.copy()
     if missone != 'ignore':    
         missone1 = miss1 & ~miss2
         if missone1.any():
@@ -782,24 +840,79 @@ def binaryop(func, lar1, lar2, join='inner', cast=True, missone='ignore',
             np.putmask(x1, misstwo12, misstwo)
             np.putmask(x2, misstwo12, misstwo)
             
-    # Binary function
-    x = func(x1, x2, **kwargs)
+    # Binary function; only ufuncs are known to be element-wise
+    if isinstance(func, np.ufunc):
+        x = blockfunc(func, x1.size)(x1, x2, **kwargs)
+    else:
+        x = func(x1, x2, **kwargs)
     
     return larry(x, label, validate=False)
+
+# Functions that binaryop computes with _fusedfill
+_FUSED = (np.add, np.subtract, np.multiply, np.divide)
+
+# Target number of elements in each block of the output that _fusedfill works
+# on; small enough that the masks of a block stay in cache
+_BLOCKSIZE = 65536
+
+def _fusedfill(func, x1, x2, missone, misstwo):
+    """
+    func(x1, x2) of float arrays with missone and misstwo fill.
+    
+    The output is computed one block of rows (axis 0) at a time, in the
+    thread pool for large arrays if multithreading is on. The fill, which
+    needs several masks, is only done for blocks in which the result
+    contains a NaN. So no full size mask is made and neither x1 nor x2 is
+    modified.
+    
+    """
+    dtype = np.result_type(x1, x2)
+    x = np.empty(x1.shape, dtype=dtype)
+    n = x.shape[0]
+    rowsize = 1
+    for ni in x.shape[1:]:
+        rowsize *= ni
+    step = max(_BLOCKSIZE // max(rowsize, 1), 1)
+    def fill(start):
+        stop = min(start + step, n)
+        a = x1[start:stop]
+        b = x2[start:stop]
+        y = x[start:stop]
+        func(a, b, y)
+        if np.isnan(y).any():
+            miss1 = np.isnan(a)
+            miss2 = np.isnan(b)
+            a = a.copy()
+            b = b.copy()
+            if missone != 'ignore':
+                np.putmask(a, miss1 & ~miss2, missone)
+                np.putmask(b, miss2 & ~miss1, missone)
+            if misstwo != 'ignore':
+                miss12 = miss1 & miss2
+                np.putmask(a, miss12, misstwo)
+                np.putmask(b, miss12, misstwo)
+            func(a, b, y)
+    starts = xrange(0, n, step)
+    if usethreads(x.size):
+        blockmap(fill, starts)
+    else:
+        for start in starts:
+            fill(start)
+    return x
     
 def add(lar1, lar2, join='inner', cast=True, missone='ignore',
-        misstwo='ignore'):
+        misstwo='ignore', broadcast=None):
     """
     Sum of two larrys using given join and fill methods. 
     
     Parameters
     ----------
     lar1 : larry
-        The larry on the left-hand side of the sum. Must have the same number
-        of dimensions as `lar2`.
+        The larry on the left-hand side of the sum. If it does not have the
+        same number of dimensions as `lar2` then the larry with fewer
+        dimensions is broadcast; see `broadcast`.
     lar2 : larry
-        The larry on the right-hand side of the sum. Must have the same number
-        of dimensions as `lar1`.
+        The larry on the right-hand side of the sum.
     join : {'inner', 'outer', 'left', 'right', list}, optional
         The method used to join the two larrys. The default join method along
         all axes is 'inner', i.e., the intersection of the labels. If `join`
@@ -828,6 +941,11 @@ def add(lar1, lar2, join='inner', cast=True, missone='ignore',
         If, however, `misstwo` is set to something other than 'ignore', such
         as 0, then all elements that are missing in both larrys are replaced
         by `misstwo`.
+    broadcast : {None, int, list}, optional
+        Only used when the two larrys have different number of dimensions.
+        The axes of the larry with more dimensions that the axes of the larry
+        with fewer dimensions line up with. By default (None) the axes are
+        found from the labels. See la.binaryop.
                
     Returns
     -------
@@ -905,21 +1023,21 @@ def add(lar1, lar2, join='inner', cast=True, missone='ignore',
 
     """    
     return binaryop(np.add, lar1, lar2, join=join, cast=cast, missone=missone,
-                    misstwo=misstwo)
+                    misstwo=misstwo, broadcast=broadcast)
 
 def subtract(lar1, lar2, join='inner', cast=True, missone='ignore',
-             misstwo='ignore'):
+             misstwo='ignore', broadcast=None):
     """
     Difference of two larrys using given join and fill methods. 
     
     Parameters
     ----------
     lar1 : larry
-        The larry on the left-hand side of the difference. Must have the same
-        number of dimensions as `lar2`.
+        The larry on the left-hand side of the difference. If it does not have
+        the same number of dimensions as `lar2` then the larry with fewer
+        dimensions is broadcast; see `broadcast`.
     lar2 : larry
-        The larry on the right-hand side of the difference. Must have the same
-        number of dimensions as `lar1`.
+        The larry on the right-hand side of the difference.
     join : {'inner', 'outer', 'left', 'right', list}, optional
         The method used to join the two larrys. The default join method along
         all axes is 'inner', i.e., the intersection of the labels. If `join`
@@ -948,6 +1066,11 @@ def subtract(lar1, lar2, join='inner', cast=True, missone='ignore',
         If, however, `misstwo` is set to something other than 'ignore', such
         as 0, then all elements that are missing in both larrys are replaced
         by `misstwo`.
+    broadcast : {None, int, list}, optional
+        Only used when the two larrys have different number of dimensions.
+        The axes of the larry with more dimensions that the axes of the larry
+        with fewer dimensions line up with. By default (None) the axes are
+        found from the labels. See la.binaryop.
                
     Returns
     -------
@@ -1025,21 +1148,21 @@ def subtract(lar1, lar2, join='inner', cast=True, missone='ignore',
 
     """    
     return binaryop(np.subtract, lar1, lar2, join=join, cast=cast,
-                    missone=missone, misstwo=misstwo)
+                    missone=missone, misstwo=misstwo, broadcast=broadcast)
                     
 def multiply(lar1, lar2, join='inner', cast=True, missone='ignore',
-             misstwo='ignore'):
+             misstwo='ignore', broadcast=None):
     """
     Multiply two larrys element-wise using given join and fill methods.
     
     Parameters
     ----------
     lar1 : larry
-        The larry on the left-hand side of the product. Must have the same
-        number of dimensions as `lar2`.
+        The larry on the left-hand side of the product. If it does not have
+        the same number of dimensions as `lar2` then the larry with fewer
+        dimensions is broadcast; see `broadcast`.
     lar2 : larry
-        The larry on the right-hand side of the product. Must have the same
-        number of dimensions as `lar1`.
+        The larry on the right-hand side of the product.
     join : {'inner', 'outer', 'left', 'right', list}, optional
         The method used to join the two larrys. The default join method along
         all axes is 'inner', i.e., the intersection of the labels. If `join`
@@ -1068,6 +1191,11 @@ def multiply(lar1, lar2, join='inner', cast=True, missone='ignore',
         If, however, `misstwo` is set to something other than 'ignore', such
         as 0, then all elements that are missing in both larrys are replaced
         by `misstwo`.
+    broadcast : {None, int, list}, optional
+        Only used when the two larrys have different number of dimensions.
+        The axes of the larry with more dimensions that the axes of the larry
+        with fewer dimensions line up with. By default (None) the axes are
+        found from the labels. See la.binaryop.
                
     Returns
     -------
@@ -1145,21 +1273,21 @@ def multiply(lar1, lar2, join='inner', cast=True, missone='ignore',
 
     """    
     return binaryop(np.multiply, lar1, lar2, join=join, cast=cast,
-                    missone=missone, misstwo=misstwo)                    
+                    missone=missone, misstwo=misstwo, broadcast=broadcast)
 
 def divide(lar1, lar2, join='inner', cast=True, missone='ignore',
-           misstwo='ignore'):
+           misstwo='ignore', broadcast=None):
     """
     Divide two larrys element-wise using given join and fill methods.
     
     Parameters
     ----------
     lar1 : larry
-        The larry on the left-hand side of the division. Must have the same
-        number of dimensions as `lar2`.
+        The larry on the left-hand side of the division. If it does not have
+        the same number of dimensions as `lar2` then the larry with fewer
+        dimensions is broadcast; see `broadcast`.
     lar2 : larry
-        The larry on the right-hand side of the division. Must have the same
-        number of dimensions as `lar1`.
+        The larry on the right-hand side of the division.
     join : {'inner', 'outer', 'left', 'right', list}, optional
         The method used to join the two larrys. The default join method along
         all axes is 'inner', i.e., the intersection of the labels. If `join`
@@ -1188,6 +1316,11 @@ def divide(lar1, lar2, join='inner', cast=True, missone='ignore',
         If, however, `misstwo` is set to something other than 'ignore', such
         as 0, then all elements that are missing in both larrys are replaced
         by `misstwo`.
+    broadcast : {None, int, list}, optional
+        Only used when the two larrys have different number of dimensions.
+        The axes of the larry with more dimensions that the axes of the larry
+        with fewer dimensions line up with. By default (None) the axes are
+        found from the labels. See la.binaryop.
                
     Returns
     -------
@@ -1265,7 +1398,336 @@ def divide(lar1, lar2, join='inner', cast=True, missone='ignore',
 
     """    
     return binaryop(np.divide, lar1, lar2, join=join, cast=cast,
-                    missone=missone, misstwo=misstwo)
+                    missone=missone, misstwo=misstwo, broadcast=broadcast)
+
+# N-ary ---------------------------------------------------------------------
+
+def nansum_many(lars, join='outer', missone='ignore', misstwo='ignore'):
+    """
+    Sum of many larrys, ignoring missing values, using given join method.
+    
+    The labels of all the larrys are joined once and each larry is added
+    into a single output array. Summing n larrys is therefore much faster
+    than calling la.add (which aligns the larrys and allocates a new larry)
+    n - 1 times.
+    
+    Parameters
+    ----------
+    lars : {list, tuple}
+        The larrys to sum. All must have the same number of dimensions and a
+        numeric (or bool) dtype.
+    join : {'outer', 'inner', 'left', 'right', list}, optional
+        The method used to join the larrys. The default join method along
+        all axes is 'outer', i.e., the union of the labels. 'left' uses the
+        label of the first larry and 'right' the label of the last larry.
+        If `join` is a list of strings then the length of the list should
+        be the number of dimensions of the larrys. The first element in the
+        list is the join method for axis=0, the second element is the join
+        method for axis=1, and so on.
+    missone : {scalar, 'ignore'}, optional
+        By default ('ignore') elements that are missing in some but not all
+        of the larrys are skipped; a label that a larry does not have counts
+        as a missing element. If `missone` is set to something other than
+        'ignore', such as 0, then the missing elements are filled exactly
+        as when the larrys are added one at a time with la.add (with the
+        same `join`, `missone` and `misstwo`; the 'right' join is the
+        exception since la.add would drop labels that are not in the next
+        larry). A missing element added to a non-missing element is
+        replaced by `missone`; two missing elements are replaced by
+        `misstwo` + `misstwo` (or the sum stays missing if `misstwo` is
+        'ignore'). Since the running sum is filled too, only the first
+        larrys can form a missing pair.
+    misstwo : {scalar, 'ignore'}, optional
+        By default ('ignore') the sum of an element that is missing in all
+        the larrys is NaN. If `missone` is 'ignore' and `misstwo` is set to
+        something other than 'ignore' then the sum of an element that is
+        missing in all n larrys is n * `misstwo`. If `missone` is not
+        'ignore', see `missone`.
+        
+    Returns
+    -------
+    y : larry
+        The sum of the larrys. The dtype is float unless the larrys have a
+        more precise inexact dtype.
+        
+    See Also
+    --------
+    la.nanmean_many: Mean of many larrys, ignoring missing values.
+    la.add: Sum of two larrys using given join and fill methods.
+    la.align_axis: Align many larrys along an axis.
+    
+    Examples
+    --------
+    >>> from la import nan
+    >>> y1 = larry([1, 2, nan], [['a', 'b', 'c']])
+    >>> y2 = larry([1, nan, nan], [['a', 'b', 'd']])
+    >>> y3 = larry([1, 1], [['b', 'd']])
+    >>> la.nansum_many([y1, y2, y3])
+    label_0
+        a
+        b
+        c
+        d
+    x
+    array([  2.,   3.,  NaN,   1.])
+    
+    With `missone` the result is the same as summing the larrys with
+    la.add:
+    
+    >>> la.nansum_many([y1, y2, y3], missone=0, misstwo=1)
+    label_0
+        a
+        b
+        c
+        d
+    x
+    array([ 2.,  3.,  2.,  3.])
+    >>> la.add(la.add(y1, y2, 'outer', missone=0, misstwo=1), y3, 'outer',
+    ...        missone=0, misstwo=1)
+    label_0
+        a
+        b
+        c
+        d
+    x
+    array([ 2.,  3.,  2.,  3.])
+    
+    """
+    total, count, absent, lead, label = _accumulate(lars, join,
+                                                    missone != 'ignore')
+    n = len(lars)
+    allmiss = count == 0
+    if missone == 'ignore':
+        if misstwo != 'ignore':
+            total[allmiss] = n * misstwo
+        else:
+            total[allmiss] = np.nan
+    elif n > 1:
+        # Fill as la.add does when the larrys are added one at a time. The
+        # leading larrys that do not have the label of an element act as a
+        # single missing element (the running sum does not have the label
+        # yet). Once the running sum is not missing, each missing element of
+        # a larry is replaced by missone.
+        start = absent > 0
+        lead += start - absent
+        nmiss = n - count + start - absent
+        if misstwo != 'ignore':
+            # The first pair is missing: misstwo + misstwo
+            two = lead >= 2
+            nmiss[two] -= 2
+            total[two] += 2 * misstwo
+        else:
+            # The running sum stays missing until the first larry that is
+            # not missing; that pair is filled with missone once
+            nmiss -= np.maximum(lead - 1, 0)
+            total[allmiss] = np.nan
+        total += missone * nmiss
+    else:
+        # A single larry is not added to anything
+        total[allmiss] = np.nan
+    return larry(total, label, validate=False)
+    
+def nanmean_many(lars, join='outer', missone='ignore', misstwo='ignore'):
+    """
+    Mean of many larrys, ignoring missing values, using given join method.
+    
+    The labels of all the larrys are joined once and each larry is added
+    into a single output array while the number of larrys that are not
+    missing is counted for each element.
+    
+    Parameters
+    ----------
+    lars : {list, tuple}
+        The larrys to average. All must have the same number of dimensions
+        and a numeric (or bool) dtype.
+    join : {'outer', 'inner', 'left', 'right', list}, optional
+        The method used to join the larrys. The default join method along
+        all axes is 'outer', i.e., the union of the labels. 'left' uses the
+        label of the first larry and 'right' the label of the last larry.
+        If `join` is a list of strings then the length of the list should
+        be the number of dimensions of the larrys. The first element in the
+        list is the join method for axis=0, the second element is the join
+        method for axis=1, and so on.
+    missone : {scalar, 'ignore'}, optional
+        By default ('ignore') elements that are missing in some but not all
+        of the larrys are not included in the mean; a label that a larry
+        does not have counts as a missing element. If `missone` is set to
+        something other than 'ignore', such as 0, then those missing
+        elements are replaced by `missone` and included in the mean, so
+        the mean is taken over all n larrys. Unlike nansum_many, missing
+        elements are not filled in pairs.
+    misstwo : {scalar, 'ignore'}, optional
+        By default ('ignore') the mean of an element that is missing in all
+        the larrys is NaN. If `misstwo` is set to something other than
+        'ignore' then the mean of the element is `misstwo`.
+        
+    Returns
+    -------
+    y : larry
+        The mean of the larrys. The dtype is float unless the larrys have a
+        more precise inexact dtype.
+        
+    See Also
+    --------
+    la.nansum_many: Sum of many larrys, ignoring missing values.
+    
+    Examples
+    --------
+    >>> from la import nan
+    >>> y1 = larry([1, 2, nan], [['a', 'b', 'c']])
+    >>> y2 = larry([3, nan, nan], [['a', 'b', 'd']])
+    >>> y3 = larry([1, 1], [['b', 'd']])
+    >>> la.nanmean_many([y1, y2, y3])
+    label_0
+        a
+        b
+        c
+        d
+    x
+    array([ 2. ,  1.5,  NaN,  1. ])
+    
+    """
+    total, count, absent, lead, label = _accumulate(lars, join)
+    n = len(lars)
+    allmiss = count == 0
+    if missone != 'ignore':
+        nmiss = n - count
+        nmiss[allmiss] = 0
+        total += missone * nmiss
+        count += nmiss
+    count[allmiss] = 1
+    total /= count
+    if misstwo != 'ignore':
+        total[allmiss] = misstwo
+    else:
+        total[allmiss] = np.nan
+    return larry(total, label, validate=False)
+
+def _accumulate(lars, join, leading=False):
+    """
+    Sum of the non-missing elements of many larrys, the number of larrys
+    that are not missing each element, the number of leading larrys that
+    do not have the label of each element, the number of leading larrys
+    that are missing each element (both None unless `leading` is True), and
+    the joined label. Used by nansum_many and nanmean_many.
+    
+    """
+    
+    # Check input
+    if len(lars) == 0:
+        raise ValueError, '`lars` must contain at least one larry.'
+    for lar in lars:
+        if not isinstance(lar, larry):
+            raise TypeError, 'Inputs must be larrys.'
+    ndim = lars[0].ndim
+    for lar in lars:
+        if lar.ndim != ndim:
+            msg = 'All larrys must have the same number of dimensions.'
+            raise ValueError, msg
+    typejoin = type(join)
+    if typejoin is str:
+        join = [join] * ndim
+    elif typejoin is list:
+        if len(join) != ndim:
+            msg = "Length of `join` list equal number of dimension of `lars`."
+            raise ValueError, msg
+    else:
+        raise TypeError, "`join` must be a string or a list."
+    dtype = np.result_type(*[lar.dtype for lar in lars])
+    if dtype.kind not in 'biuf':
+        raise TypeError, 'larrys must have a numeric or bool dtype.'
+    if dtype.kind != 'f':
+        dtype = np.dtype(np.float64)
+        
+    # Join the labels once
+    label = []
+    for ax in range(ndim):
+        label.append(_joinlabels([lar._label[ax] for lar in lars], join[ax]))
+    shape = tuple(map(len, label))
+    
+    # Add each larry into the output
+    total = np.zeros(shape, dtype=dtype)
+    count = np.zeros(shape, dtype=np.intp)
+    absent = lead = None
+    if leading:
+        # Positions along each axis in the label of the running sum
+        seen = [np.zeros(m, dtype=bool) for m in shape]
+        absent = np.zeros(shape, dtype=np.intp)
+        lead = np.zeros(shape, dtype=np.intp)
+    for lar in lars:
+        src = []
+        dst = []
+        for lab, lab3 in zip(lar._label, label):
+            if lab is lab3 or lab == lab3:
+                src.append(None)
+                dst.append(None)
+            else:
+                # Position in the joined label of each element of lab
+                pos, pos_miss = labelmap_fill(lab3, lab)
+                pos = np.asarray(pos, dtype=np.intp)
+                if len(pos_miss) > 0:
+                    keep = np.ones(len(lab), dtype=bool)
+                    keep[pos_miss] = False
+                    keep = keep.nonzero()[0]
+                    src.append(keep)
+                    dst.append(pos[keep])
+                else:
+                    src.append(None)
+                    dst.append(pos)
+        x = take_axes(lar.x, src)
+        present = 1
+        if issubclass(x.dtype.type, np.inexact):
+            miss = np.isnan(x)
+            if miss.any():
+                x = np.where(miss, 0, x)
+                present = ~miss
+        index = _ixindex(dst, shape)
+        if index is None:
+            total += x
+            count += present
+        else:
+            total[index] += x
+            count[index] += present
+        if leading:
+            have = True
+            for ax, pos in enumerate(dst):
+                if pos is None:
+                    seen[ax][:] = True
+                else:
+                    seen[ax][pos] = True
+                idx = [None] * ndim
+                idx[ax] = slice(None)
+                have = have & seen[ax][idx]
+            absent += ~have
+            lead += count == 0
+    
+    return total, count, absent, lead, label
+
+def _joinlabels(labels, join):
+    "Join many labels, one per larry, along one axis; used by _accumulate."
+    if join == 'left':
+        return labelcopy(labels[0])
+    elif join == 'right':
+        return labelcopy(labels[-1])
+    elif join not in ('inner', 'outer'):
+        raise ValueError, 'join type not recognized'
+    label = labels[0]
+    for lab in labels[1:]:
+        if lab != label:
+            break
+    else:
+        # All labels are the same
+        return labelcopy(label)
+    rc = frozenset(label)
+    if join == 'inner':
+        for lab in labels[1:]:
+            rc = rc.intersection(lab)
+    else:
+        for lab in labels[1:]:
+            rc = rc.union(lab)
+    rc = Label(sorted(rc))
+    rc._unique = True
+    return rc
 
 # Misc ----------------------------------------------------------------------
 
@@ -1463,11 +1925,11 @@ def panel(lar):
     if lar.ndim != 3:
         raise ValueError, "lar must be 3d."
     y = lar.copy()
-    y.label = [flattenlabel([y.label[1], y.label[2]])[0], y.label[0]]
+    y._label = [flattenlabel([y._label[1], y._label[2]])[0], y._label[0]]
     y.x = y.x.T.reshape(-1, y.shape[0], order="F")
     return y
 
-def cov(lar):
+def cov(lar, memory=None):
     """
     Covariance matrix adjusted for missing (NaN) values.
     
@@ -1477,10 +1939,17 @@ def cov(lar):
     and therefore the covariance is normalized by the number of columns,
     not by the number of columns minus 1.        
     
+    The matrix is computed tile by tile so that, apart from the output,
+    memory use is bounded by `memory`; the tiles are computed in parallel
+    if multithreading is on (see la.set_num_threads).
+    
     Parameters
     ----------
     lar : larry
         The larry you want to find the covariance of.
+    memory : {int, None}, optional
+        Approximate number of bytes of the temporary arrays. By default
+        (None) 128 MB is used. See la.farray.covMissing.
         
     Returns
     -------
@@ -1496,8 +1965,57 @@ def cov(lar):
     """
     if lar.ndim != 2:
         raise ValueError, 'This function only works on 2d larrys'      
-    label = [list(lar.label[0]), list(lar.label[0])]
-    x = covMissing(lar.x)
+    label = [list(lar._label[0]), list(lar._label[0])]
+    x = covMissing(lar.x, memory)
+    return larry(x, label, validate=False)
+
+def corr(lar, memory=None):
+    """
+    Pairwise correlation matrix of the rows of a 2d larry, ignoring NaNs.
+    
+    The correlation of two rows uses the columns in which neither row is
+    NaN. It is NaN if the two rows have fewer than two such columns in
+    common. Like la.cov, the matrix is computed tile by tile within a
+    memory budget.
+    
+    Parameters
+    ----------
+    lar : larry
+        A 2d larry of shape (N, T).
+    memory : {int, None}, optional
+        Approximate number of bytes of the temporary arrays. By default
+        (None) 128 MB is used. See la.farray.corrMissing.
+        
+    Returns
+    -------
+    out : larry
+        The NxN correlation matrix. Both axes have the labels of axis 0 of
+        the input.
+        
+    Raises
+    ------
+    ValueError
+        If input is not 2d.
+        
+    Examples
+    --------
+    >>> y = larry([[1.0, 2.0, 3.0], [2.0, nan, 1.0]], [['a', 'b'], [1, 2, 3]])
+    >>> la.corr(y)
+    label_0
+        a
+        b
+    label_1
+        a
+        b
+    x
+    array([[ 1., -1.],
+           [-1.,  1.]])
+
+    """
+    if lar.ndim != 2:
+        raise ValueError, 'This function only works on 2d larrys'
+    label = [list(lar._label[0]), list(lar._label[0])]
+    x = corrMissing(lar.x, memory)
     return larry(x, label, validate=False)
 
 # Random -----------------------------------------------------------    
@@ -1745,7 +2263,7 @@ def sortby(lar, element, axis, reverse=False):
     if lar.ndim != 2:
         raise ValueError("`lar` must be 2d.")
     if lar.size == 0:
-        if element in lar.label[axis]:
+        if element in lar._label[axis]:
             return lar.copy()
     if axis < 0:
         axis += lar.ndim
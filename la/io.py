@@ -9,6 +9,7 @@ from la.external.prettytable import indent
 from la.util.misc import randstring
 
 from la import larry
+from la.deflabel import ArrayLabel, RangeLabel
 
 __all__ = ['IO', 'save', 'load', 'repack', 'is_archived_larry',
            'archive_directory']
@@ -417,7 +418,7 @@ def save(file, lar, key):
     fkey.attrs['larry'] = True
     fkey['x'] = lar.x
     for i in range(lar.ndim):
-        fkey[str(i)], datetime_type = _list2array(lar.label[i])
+        fkey[str(i)], datetime_type = _list2array(lar._label[i])
         fkey[str(i)].attrs['datetime_type'] = datetime_type
     
     # Close if file is a filename   
@@ -623,7 +624,14 @@ def _load_label(group, ndim):
 
 def _list2array(x):
     "Convert list to array if elements are of the same type, raise otherwise."
-    if type(x) != list:
+    if isinstance(x, ArrayLabel):
+        # Already an array; dates are stored as ordinals
+        if x.kind == 'date':
+            return x.values, 'date'
+        return x.values, 'not_datetime'
+    if isinstance(x, RangeLabel):
+        return x.values, 'not_datetime'
+    if not isinstance(x, list):
         raise TypeError, 'x must be a list'
     type0 = type(x[0])
     if not all([type(i)==type0 for i in x]):
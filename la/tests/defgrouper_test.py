@@ -0,0 +1,94 @@
+"Grouper unit tests."
+
+import numpy as np
+from numpy.testing import assert_equal, assert_raises
+import bottleneck as bn
+
+from la import larry, Grouper
+from la.farray import demean, zscore
+from la.util.testing import assert_larry_equal as ale
+
+
+def lar(shape, axis):
+    "larry of random data; the labels along axis are a subset of range(12)"
+    x = np.random.randn(*shape)
+    x[x > 1.2] = np.nan
+    label = [range(n) for n in shape]
+    label[axis] = np.random.permutation(12)[:shape[axis]].tolist()
+    return larry(x, label)
+
+def bits(x):
+    "View of the bytes of an array"
+    return np.ascontiguousarray(x).view(np.uint8)
+
+def group_loop(func, lar, group, axis):
+    "Group statistic of each element, one group at a time."
+    g = group.morph(lar.label[axis], 0).x
+    x = np.rollaxis(lar.x, axis, 0)
+    y = np.nan * np.zeros(x.shape)
+    for name in set(g.tolist()) - set((None,)):
+        idx = np.flatnonzero(g == name)
+        y[idx] = func(x[idx])
+    return larry(np.rollaxis(y, 0, axis + 1), lar.label)
+
+def stats():
+    "Pairs of (name, function of the elements of a group along axis 0)"
+    def count(x):
+        return (x == x).sum(axis=0).astype(float)
+    def sum(x):
+        y = bn.nansum(x, axis=0)
+        return np.where(count(x) == 0, np.nan, y)
+    return [('sum', sum),
+            ('count', count),
+            ('min', lambda x: bn.nanmin(x, axis=0)),
+            ('max', lambda x: bn.nanmax(x, axis=0)),
+            ('std', lambda x: bn.nanstd(x, axis=0)),
+            ('demean', lambda x: demean(x, axis=0)),
+            ('zscore', lambda x: zscore(x, axis=0))]
+
+def grouper_test():
+    "Grouper test"
+    group = larry(['a', 'b', None, 'a', 'c', 'b', 'a', 'd', 'c', 'a', 'b',
+                   'c'], [range(12)])
+    msg = "Grouper.%s failed with shape %s, axis %d"
+    for shape, axis in [((10,), 0), ((10, 3), 0), ((3, 10), 1),
+                        ((4, 10, 2), 1)]:
+        a = lar(shape, axis)
+        grouper = Grouper(group, axis)
+        # Identical to the larry methods
+        for name in ('mean', 'median', 'ranking'):
+            desired = getattr(a, 'group_' + name)(group, axis)
+            actual = getattr(grouper, name)(a)
+            # Bitwise identical
+            yield (assert_equal, bits(actual.x), bits(desired.x),
+                   msg % (name, shape, axis))
+            yield assert_equal, actual.label, a.label, msg % (name, shape,
+                                                               axis)
+        for name, func in stats():
+            with np.errstate(invalid='ignore', divide='ignore'):
+                desired = group_loop(func, a, group, axis)
+                actual = getattr(grouper, name)(a)
+            yield ale, actual, desired, msg % (name, shape, axis)
+
+def grouper_reuse_test():
+    "Grouper reuse test"
+    group = larry([1, 2, 1, 2], [list('abcd')])
+    grouper = Grouper(group)
+    a = larry([1.0, 2.0, 3.0, 4.0], [list('abcd')])
+    b = larry([4.0, 3.0, 2.0], [list('dcb')])
+    ale(grouper.sum(a), larry([4.0, 6.0, 4.0, 6.0], [list('abcd')]))
+    ale(grouper.sum(b), larry([6.0, 3.0, 6.0], [list('dcb')]))
+    ale(grouper.sum(a), larry([4.0, 6.0, 4.0, 6.0], [list('abcd')]))
+    a.label[0][1] = 'c'
+    a.label[0][2] = 'b'
+    ale(grouper.sum(a), larry([3.0, 3.0, 7.0, 7.0], [list('acbd')]))
+    assert_equal(grouper.groups, [1, 2], 'Grouper.groups')
+
+def grouper_raises_test():
+    "Grouper raises test"
+    group = larry(['a', 'b'], [['x', 'y']])
+    assert_raises(TypeError, Grouper, ['a', 'b'])
+    assert_raises(ValueError, Grouper, larry([['a', 'b']]))
+    grouper = Grouper(group)
+    assert_raises(TypeError, grouper.mean, np.ones(2))
+    assert_raises(IndexError, grouper.mean, larry([1.0], [['z']]))
@@ -0,0 +1,440 @@
+"Label unit tests."
+
+import cPickle
+import datetime
+
+import numpy as np
+from numpy.testing import assert_equal, assert_raises
+
+from la import larry, lazy, align
+from la.deflabel import Label, ArrayLabel, RangeLabel, labelslice
+from la.util.testing import assert_larry_equal as ale
+from la.util.testing import noreference
+from la.flabel import listmap, listmap_fill, issorted
+
+# ---------------------------------------------------------------------------
+
+# Cached index
+
+def label_index_test():
+    "Label.index test"
+    list1 = range(10)
+    np.random.shuffle(list1)
+    label = Label(list1)
+    msg = "Label.index failed on %s"
+    for i in range(10):
+        yield assert_equal, label.index(i), list1.index(i), msg % list1
+    yield assert_equal, label.indexmap(), dict((z, i) for i, z in
+                                               enumerate(list1)), msg % list1
+
+def label_index_missing_test():
+    "Label.index missing test"
+    label = Label(['a', 'b'])
+    try:
+        label.index('c')
+        raised = False
+    except ValueError:
+        raised = True
+    assert raised, 'Label.index did not raise ValueError'
+    assert 'c' not in label, "'c' should not be in label"
+    assert 'a' in label, "'a' should be in label"
+
+def label_mutate_test():
+    "Label in place changes drop the cached index"
+    msg = "Label.index failed after %s"
+    funcs = [('append', lambda z: z.append('x')),
+             ('extend', lambda z: z.extend(['x', 'y'])),
+             ('insert', lambda z: z.insert(0, 'x')),
+             ('pop', lambda z: z.pop(0)),
+             ('remove', lambda z: z.remove('b')),
+             ('reverse', lambda z: z.reverse()),
+             ('sort', lambda z: z.sort(reverse=True)),
+             ('setitem', lambda z: z.__setitem__(0, 'x')),
+             ('delitem', lambda z: z.__delitem__(0)),
+             ('setslice', lambda z: z.__setslice__(0, 2, ['x'])),
+             ('delslice', lambda z: z.__delslice__(0, 2)),
+             ('iadd', lambda z: z.__iadd__(['x'])),
+             ('imul', lambda z: z.__imul__(1))]
+    for name, func in funcs:
+        label = Label(['c', 'b', 'a'])
+        label.indexmap()
+        func(label)
+        desired = [list(label).index(z) for z in label]
+        actual = [label.index(z) for z in label]
+        yield assert_equal, actual, desired, msg % name
+
+def label_copy_test():
+    "Label.copy test"
+    label = Label(['a', 'b'])
+    idx = label.indexmap()
+    label2 = label.copy()
+    assert label2 is not label, 'Label.copy returned a reference'
+    assert label2.indexmap() is idx, 'Label.copy did not share the index'
+    label2.append('c')
+    assert_equal(label.index('b'), 1, 'Original label changed')
+    assert_equal(label2.index('c'), 2, 'Copied label not updated')
+
+def label_pickle_test():
+    "Label pickle test"
+    label = Label(['a', 'b'])
+    label2 = cPickle.loads(cPickle.dumps(label, 2))
+    assert type(label2) is Label, 'Unpickled label is not a Label'
+    assert_equal(label2, label, 'Label pickle failed')
+
+# ---------------------------------------------------------------------------
+
+# listmap and listmap_fill with a Label
+
+def label_listmap_test():
+    "listmap Label test"
+    list1 = range(6)
+    list2 = range(5)
+    msg = "listmap failed on Label(%s) and %s"
+    for i in range(20):
+        np.random.shuffle(list2)
+        idx1 = listmap(list1, list2)
+        idx2 = listmap(Label(list1), list2)
+        yield assert_equal, idx2, idx1, msg % (list1, list2)
+        idx1 = listmap(list1, ['x'] + list2, True)
+        idx2 = listmap(Label(list1), ['x'] + list2, True)
+        yield assert_equal, idx2, idx1, msg % (list1, list2)
+
+def label_listmap_fill_test():
+    "listmap_fill Label test"
+    list1 = ['a', 2, 3]
+    list2 = Label(['a', 2, 3, 4])
+    msg = "listmap_fill failed on Label(%s) and %s"
+    actual = listmap_fill(Label(list1), list2, fill=-1)
+    desired = listmap_fill(list1, list(list2), fill=-1)
+    yield assert_equal, actual, desired, msg % (list1, list2)
+
+# ---------------------------------------------------------------------------
+
+# larry labels are Labels
+
+def larry_label_test():
+    "larry label type test"
+    y = larry([[1, 2], [3, 4]], [['a', 'b'], ['c', 'd']])
+    msg = "larry label along axis %d is not a Label"
+    for ax in range(y.ndim):
+        yield assert_equal, type(y.label[ax]), Label, msg % ax
+        yield assert_equal, type(y.copylabel()[ax]), Label, msg % ax
+        yield assert_equal, type(y.copy().label[ax]), Label, msg % ax
+        yield assert_equal, type((y + y).label[ax]), Label, msg % ax
+        yield assert_equal, type(y.morph(['b', 'a'], 0).label[ax]), Label, \
+                                                                     msg % ax
+
+def larry_label_mutate_test():
+    "larry labelindex after changing label in place"
+    y = larry([1, 2, 3], [['a', 'b', 'c']])
+    assert_equal(y.labelindex('c', 0), 2, 'labelindex failed')
+    y.label[0].reverse()
+    assert_equal(y.labelindex('c', 0), 0, 'labelindex failed after reverse')
+    assert_equal(y.lix[['a']], 3, 'lix failed after reverse')
+    assert_equal(y.get(['b']), 2, 'get failed after reverse')
+
+# ---------------------------------------------------------------------------
+
+# ArrayLabel
+
+def arraylabel_list_test():
+    "ArrayLabel list interface test"
+    d = datetime.date
+    labels = [[3, 1, 2], [0.5, 1.5, -2.0],
+              [d(2010, 1, 2), d(2009, 12, 31), d(2010, 1, 1)]]
+    msg = "ArrayLabel failed on %s"
+    for label in labels:
+        alabel = ArrayLabel(label)
+        yield assert_equal, alabel.tolist(), label, msg % label
+        yield assert_equal, list(alabel), label, msg % label
+        yield assert_equal, len(alabel), len(label), msg % label
+        yield assert_equal, alabel == label, True, msg % label
+        yield assert_equal, alabel != label, False, msg % label
+        yield assert_equal, alabel == label[::-1], False, msg % label
+        yield assert_equal, alabel[1], label[1], msg % label
+        yield assert_equal, alabel[-1], label[-1], msg % label
+        yield assert_equal, alabel[1:].tolist(), label[1:], msg % label
+        yield assert_equal, type(alabel[1:]), ArrayLabel, msg % label
+        yield assert_equal, map(alabel.index, label), [0, 1, 2], msg % label
+        yield assert_equal, label[2] in alabel, True, msg % label
+        yield assert_equal, 'a' in alabel, False, msg % label
+        yield assert_equal, alabel.issorted(), False, msg % label
+        yield assert_equal, alabel.take([1, 2]), label[1:], msg % label
+
+def arraylabel_kind_test():
+    "ArrayLabel kind test"
+    d = datetime.date
+    msg = "ArrayLabel kind failed on %s"
+    for label, kind in [([1, 2], 'int'), ([1, 2.0], 'float'),
+                        (np.array([1, 2], dtype=np.int32), 'int'),
+                        ([d(2010, 1, 1)], 'date')]:
+        yield assert_equal, ArrayLabel(label).kind, kind, msg % label
+    try:
+        ArrayLabel(['a', 'b'])
+        raised = False
+    except TypeError:
+        raised = True
+    assert raised, 'ArrayLabel did not raise TypeError on strings'
+    try:
+        ArrayLabel([d(2010, 1, 1), 1])
+        raised = False
+    except TypeError:
+        raised = True
+    assert raised, 'ArrayLabel did not raise TypeError on mixed dates'
+
+def arraylabel_listmap_test():
+    "listmap and listmap_fill ArrayLabel test"
+    msg = "listmap failed on ArrayLabel(%s) and %s"
+    for i in range(20):
+        list1 = range(10)
+        np.random.shuffle(list1)
+        list2 = list1[:6]
+        np.random.shuffle(list2)
+        list3 = [20] + list2 + [-1]
+        actual = listmap(ArrayLabel(list1), list2)
+        desired = listmap(list1, list2)
+        yield assert_equal, actual, desired, msg % (list1, list2)
+        actual = listmap(ArrayLabel(list1), list3, True)
+        desired = listmap(list1, list3, True)
+        yield assert_equal, actual, desired, msg % (list1, list3)
+        actual = listmap_fill(ArrayLabel(list1), list3, fill=-1)
+        desired = listmap_fill(list1, list3, fill=-1)
+        yield assert_equal, actual, desired, msg % (list1, list3)
+
+def arraylabel_larry_test():
+    "larry with ArrayLabel test"
+    d = datetime.date
+    msg = "%s failed with an ArrayLabel"
+    dates1 = [d(2010, 1, 4), d(2010, 1, 1), d(2010, 1, 5)]
+    dates2 = [d(2010, 1, 5), d(2010, 1, 6), d(2010, 1, 4)]
+    y1 = larry([1.0, 2.0, 3.0], [ArrayLabel(dates1)])
+    y2 = larry([4.0, 5.0, 6.0], [ArrayLabel(dates2)])
+    z1 = larry([1.0, 2.0, 3.0], [dates1])
+    z2 = larry([4.0, 5.0, 6.0], [dates2])
+    yield ale, y1 + y2, z1 + z2, msg % 'add'
+    for join in ('inner', 'outer', 'left', 'right'):
+        a1, a2 = align(y1, y2, join)
+        b1, b2 = align(z1, z2, join)
+        yield ale, a1, b1, msg % ('align %s' % join)
+        yield ale, a2, b2, msg % ('align %s' % join)
+    yield ale, y1.sortaxis(), z1.sortaxis(), msg % 'sortaxis'
+    yield ale, y1.sortaxis(reverse=True), z1.sortaxis(reverse=True), \
+                                                        msg % 'sortaxis'
+    label = [d(2010, 1, 5), d(2009, 1, 1), d(2010, 1, 4)]
+    yield ale, y1.morph(label, 0), z1.morph(label, 0), msg % 'morph'
+    yield ale, y1.merge(y2, update=True), z1.merge(z2, update=True), \
+                                                           msg % 'merge'
+    yield assert_equal, type((y1 + y2).label[0]), ArrayLabel, msg % 'add'
+
+# ---------------------------------------------------------------------------
+
+# RangeLabel
+
+def rangelabel_list_test():
+    "RangeLabel list interface test"
+    msg = "RangeLabel failed on range%s"
+    for args in [(5,), (2, 7), (1, 10, 3), (10, 1, -2), (3, 3), (0, 1)]:
+        label = range(*args)
+        rlabel = RangeLabel(*args)
+        yield assert_equal, rlabel.tolist(), label, msg % (args,)
+        yield assert_equal, list(rlabel), label, msg % (args,)
+        yield assert_equal, len(rlabel), len(label), msg % (args,)
+        yield assert_equal, rlabel == label, True, msg % (args,)
+        yield assert_equal, rlabel == label + [99], False, msg % (args,)
+        yield assert_equal, rlabel == RangeLabel(*args), True, msg % (args,)
+        yield assert_equal, map(rlabel.index, label), range(len(label)), \
+                                                           msg % (args,)
+        for i in range(-1, 12):
+            yield assert_equal, i in rlabel, i in label, msg % (args,)
+        for i in range(-len(label), len(label)):
+            yield assert_equal, rlabel[i], label[i], msg % (args,)
+        for s in [slice(1, None), slice(None, -1), slice(None, None, 2),
+                  slice(None, None, -1), slice(2, 1)]:
+            yield assert_equal, rlabel[s].tolist(), label[s], msg % (args,)
+            yield assert_equal, type(rlabel[s]), RangeLabel, msg % (args,)
+        yield assert_equal, rlabel.issorted(), issorted(label), msg % (args,)
+
+def rangelabel_larry_test():
+    "larry with RangeLabel test"
+    msg = "%s failed with a RangeLabel"
+    y1 = larry([1.0, 2.0, 3.0, 4.0])
+    y2 = larry([5.0, 6.0, 7.0], [RangeLabel(2, 5)])
+    y3 = larry([8.0, 9.0], [RangeLabel(7, 9)])
+    z1 = larry([1.0, 2.0, 3.0, 4.0], [[0, 1, 2, 3]])
+    z2 = larry([5.0, 6.0, 7.0], [[2, 3, 4]])
+    z3 = larry([8.0, 9.0], [[7, 8]])
+    yield assert_equal, type(y1.label[0]), RangeLabel, msg % 'larry'
+    yield ale, y1 + y2, z1 + z2, msg % 'add'
+    for join in ('inner', 'outer', 'left', 'right'):
+        for a, b, c, d in [(y1, y2, z1, z2), (y1, y3, z1, z3),
+                           (y3, y1, z3, z1)]:
+            a1, a2 = align(a, b, join)
+            b1, b2 = align(c, d, join)
+            yield ale, a1, b1, msg % ('align %s' % join)
+            yield ale, a2, b2, msg % ('align %s' % join)
+    yield ale, y1.morph([3, 9, 0], 0), z1.morph([3, 9, 0], 0), msg % 'morph'
+    yield ale, y1[1:], z1[1:], msg % 'slicing'
+    yield assert_equal, type(y1[1:].label[0]), RangeLabel, msg % 'slicing'
+    yield assert_equal, type((y1 + y2).label[0]), RangeLabel, msg % 'add'
+    y = larry(np.ones((2, 3)))
+    yield assert_equal, y.sum(0).label, [RangeLabel(3)], msg % 'sum'
+
+def mixed_join_label_test():
+    "join of an ArrayLabel or RangeLabel and a list test"
+    msg = "joined label of %s and a list is not a Label"
+    z = larry([1.0, 2.0], [[2, 1]])
+    for name, y in [('RangeLabel', larry([1.0, 2.0, 3.0])),
+                    ('ArrayLabel', larry([1.0, 2.0, 3.0],
+                                         [ArrayLabel([0, 1, 2])]))]:
+        for w in (y + z, z + y, align(y, z, 'outer')[0]):
+            lab = w.label[0]
+            yield assert_equal, type(lab), Label, msg % name
+            lab.append(9)
+            yield assert_equal, lab[-1], 9, msg % name
+            yield assert_equal, map(type, lab), [int] * len(lab), msg % name
+
+# ---------------------------------------------------------------------------
+
+# Copy-on-write labels
+
+def cow_test():
+    "copy-on-write label test"
+    msg = "copy-on-write failed: %s"
+    funcs = [('log', lambda y: y.log()),
+             ('copy', lambda y: y.copy()),
+             ('sum', lambda y: y.sum(axis=1)),
+             ('add', lambda y: y + y),
+             ('add aligned', lambda y: y + y[:, ::-1]),
+             ('morph', lambda y: y.morph(['b', 'a'], 0)),
+             ('demean', lambda y: y.demean(1))]
+    for name, func in funcs:
+        # Change the label of the new larry
+        y = larry([[1.0, 2.0], [3.0, 4.0]], [['a', 'b'], ['c', 'd']])
+        z = func(y)
+        z.label[-1].append('e')
+        yield assert_equal, y.label, [['a', 'b'], ['c', 'd']], msg % name
+        # Change the label of the original larry
+        y = larry([[1.0, 2.0], [3.0, 4.0]], [['a', 'b'], ['c', 'd']])
+        z = func(y)
+        label = z.copylabel()
+        y.label[-1].append('e')
+        yield assert_equal, z.label, label, msg % name
+        # noreference
+        y = larry([[1.0, 2.0], [3.0, 4.0]], [['a', 'b'], ['c', 'd']])
+        z = func(y)
+        if z.ndim == y.ndim:
+            yield assert_equal, noreference(z, y), True, msg % name
+
+def cow_reference_test():
+    "copy-on-write label reference test"
+    msg = "copy-on-write failed with a label reference: %s"
+    funcs = [('log', lambda y: y.log()),
+             ('copy', lambda y: y.copy()),
+             ('sum', lambda y: y.sum(axis=1)),
+             ('add', lambda y: y + y),
+             ('add aligned', lambda y: y + y[:, ::-1]),
+             ('add broadcast', lambda y: y + y[:, 0]),
+             ('lazy', lambda y: (lazy(y) + 1).evaluate()),
+             ('demean', lambda y: y.demean(1))]
+    for name, func in funcs:
+        # A reference to the label held across the operation
+        y = larry([[1.0, 2.0], [3.0, 4.0]], [['a', 'b'], ['c', 'd']])
+        lab = y.label[0]
+        z = func(y)
+        lab[0] = 'z'
+        lab.append('e')
+        yield assert_equal, z.label[0], ['a', 'b'], msg % name
+        yield assert_equal, z.shape[0], len(z.label[0]), msg % name
+        # The reference is still the label of the original larry
+        yield assert_equal, y.label[0], ['z', 'b', 'e'], msg % name
+        # Label assigned with the label attribute
+        y = larry([[1.0, 2.0], [3.0, 4.0]])
+        lab = ['a', 'b']
+        y.label[0] = lab
+        z = func(y)
+        lab.append('c')
+        yield assert_equal, z.label[0], ['a', 'b'], msg % name
+
+def cow_internal_test():
+    "copy-on-write internal label use test"
+    msg = "labels not shared after %s"
+    funcs = [('repr', repr),
+             ('index', lambda y: y[0]),
+             ('slice', lambda y: y[1:]),
+             ('tuple index', lambda y: y[:, ::-1]),
+             ('lix', lambda y: y.lix[['a']]),
+             ('maxlabel', lambda y: y.maxlabel()),
+             ('align', lambda y: align(y, y[:, 1:])),
+             ('sortaxis', lambda y: y.sortaxis())]
+    for name, func in funcs:
+        y = larry([[1.0, 2.0], [3.0, 4.0]], [['a', 'b'], ['c', 'd']])
+        func(y)
+        z = y.log()
+        yield assert_equal, z._label[0] is y._label[0], True, msg % name
+        yield assert_equal, z._label[1] is y._label[1], True, msg % name
+    # Labels shared by indexing are still copy-on-write
+    y = larry([[1.0, 2.0], [3.0, 4.0]], [['a', 'b'], ['c', 'd']])
+    z = y[0]
+    z.label[0].append('e')
+    assert_equal(y.label[1], ['c', 'd'], 'copy-on-write failed after index')
+
+def cow_pickle_test():
+    "copy-on-write pickle test"
+    y = larry([1, 2], [['a', 'b']])
+    z = y.log()
+    z2 = cPickle.loads(cPickle.dumps(z, 2))
+    ale(z2, z, 'pickle failed')
+    z2.label[0].append('c')
+    assert_equal(z.label, [['a', 'b']], 'pickle failed')
+
+# ---------------------------------------------------------------------------
+
+# Verified unique labels
+
+def label_unique_test():
+    "Label.isunique test"
+    msg = "isunique failed: %s"
+    label = Label(['a', 'b', 'c'])
+    yield assert_equal, label.isunique(), True, msg % 'unique'
+    yield assert_equal, label[1:].isunique(), True, msg % 'slice'
+    yield assert_equal, label[1:]._unique, True, msg % 'slice flag'
+    reverse = slice(None, None, -1)
+    yield (assert_equal, labelslice(label, reverse)._unique, True,
+           msg % 'reversed flag')
+    yield (assert_equal, labelslice(label, slice(1, None))._unique, True,
+           msg % 'slice object flag')
+    yield assert_equal, label.copy()._unique, True, msg % 'copy flag'
+    label.append('a')
+    yield assert_equal, label._unique, None, msg % 'append'
+    yield assert_equal, label.isunique(), False, msg % 'duplicate'
+    yield assert_equal, label[1:]._unique, None, msg % 'slice of duplicate'
+    yield assert_equal, label[1:].isunique(), True, msg % 'slice of duplicate'
+    label = Label([1, 2, 3])
+    label.issorted()
+    yield assert_equal, label[:2]._issorted, True, msg % 'sorted slice'
+    yield (assert_equal, labelslice(label, reverse)._issorted, None,
+           msg % 'reversed slice')
+    label = ArrayLabel([3, 1, 2])
+    yield assert_equal, label.isunique(), True, msg % 'ArrayLabel'
+    yield assert_equal, label[1:]._unique, True, msg % 'ArrayLabel slice'
+    yield assert_equal, ArrayLabel([1, 1]).isunique(), False, msg % 'ArrayLabel'
+    yield assert_equal, RangeLabel(3).isunique(), True, msg % 'RangeLabel'
+
+def label_asarraylabel_test():
+    "Label.asarraylabel test"
+    msg = "asarraylabel failed on %s"
+    d = datetime.date
+    for label, kind in [([2, 1], 'int'), ([2.0, 1.5], 'float'),
+                        ([d(2010, 1, 2), d(2010, 1, 1)], 'date'),
+                        ([], None), (['a', 'b'], None), ([1, 2.0], None),
+                        ([True, False], None), ([1.0, np.nan], None)]:
+        a = Label(label).asarraylabel()
+        if kind is None:
+            yield assert_equal, a, None, msg % label
+        else:
+            yield assert_equal, a.kind, kind, msg % label
+            yield assert_equal, a.tolist(), label, msg % label
+    label = Label([1, 2])
+    label.asarraylabel()
+    label.append('a')
+    yield assert_equal, label.asarraylabel(), None, msg % 'append'
@@ -4,13 +4,16 @@
 from __future__ import with_statement
 
 import numpy as np
-from numpy.testing import assert_array_almost_equal
+from numpy.testing import (assert_array_almost_equal, assert_equal,
+                           assert_raises)
 nan = np.nan
 
 import bottleneck as bn
 
 from la import larry
 from la.farray import move_nanranking, move_nanmedian 
+from la.farray import (move_nanewmean, move_nanewvar, move_nanewstd,
+                       move_nanewcov)
 
 
 def move_unit_maker(attr, func, methods):
@@ -74,10 +77,40 @@ def test_move_min():
 
 def test_move_ranking():
     "Test move_nanranking."
-    methods = ('strides', 'loop')
+    methods = ('lags', 'strides', 'loop', 'fast')
     yield move_unit_maker, 'move_ranking', move_nanranking, methods 
 
 def test_move_median():
     "Test move_median."
-    methods = ('strides', 'loop') 
+    methods = ('strides', 'loop', 'fast') 
     yield move_unit_maker, 'move_median', move_nanmedian, methods 
+
+def test_move_ew():
+    "Test move_ewmean, move_ewvar, move_ewstd."
+    arr = np.array([[9.0, 3.0, nan, nan, 9.0, nan],
+                    [1.0, 1.0, 1.0, nan, nan, nan],
+                    [2.0, 2.0, 0.1, nan, 1.0, nan],
+                    [3.0, 9.0, 2.0, nan, nan, nan]])
+    msg = '\nfunc %s | axis %d\n'
+    for attr, func in [('move_ewmean', move_nanewmean),
+                       ('move_ewvar', move_nanewvar),
+                       ('move_ewstd', move_nanewstd)]:
+        for axis in (0, 1):
+            desired = func(arr, halflife=2, axis=axis)
+            actual = getattr(larry(arr), attr)(halflife=2, axis=axis)
+            assert_array_almost_equal(actual.x, desired, 10,
+                                      msg % (attr, axis))
+
+def test_move_ewcov():
+    "Test move_ewcov."
+    lar1 = larry([[1.0, 2.0, nan, 4.0], [2.0, 1.0, 3.0, 5.0]],
+                 [['a', 'b'], [1, 2, 3, 4]])
+    lar2 = larry([[2.0, 1.0, 3.0, 9.0], [1.0, 5.0, 2.0, 2.0]],
+                 [['c', 'a'], [1, 2, 3, 4]])
+    actual = lar1.move_ewcov(lar2, span=3)
+    desired = move_nanewcov(lar1.x[:1], lar2.x[1:], span=3)
+    assert_equal(actual.label, [['a'], [1, 2, 3, 4]])
+    assert_array_almost_equal(actual.x, desired, 10)
+    actual = lar1.move_ewcov(lar1, span=3)
+    assert_array_almost_equal(actual.x, lar1.move_ewvar(span=3).x, 10)
+    assert_raises(TypeError, lar1.move_ewcov, lar2.x, span=3)
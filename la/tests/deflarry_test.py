@@ -650,6 +650,84 @@ class Test_binary(unittest.TestCase):
         self.assert_(noreference(p, self.l2), 'Reference found')
         self.assert_(noreference(p, self.l3), 'Reference found')
 
+    def test_inplace_1(self):
+        "larry in-place operators_1"
+        ops = [('+=', lambda a, b: a.__iadd__(b), lambda a, b: a + b),
+               ('-=', lambda a, b: a.__isub__(b), lambda a, b: a - b),
+               ('*=', lambda a, b: a.__imul__(b), lambda a, b: a * b),
+               ('/=', lambda a, b: a.__idiv__(b), lambda a, b: a / b)]
+        others = [('larry', self.l1), ('unaligned larry', self.l2),
+                  ('superset larry', larry(np.arange(20.0).reshape(4, 5))),
+                  ('array', self.x3), ('scalar', 2.0), ('int scalar', 2)]
+        for name, iop, op in ops:
+            for oname, other in others:
+                msg = "%s with %s failed" % (name, oname)
+                desired = op(self.l3, other)
+                actual = self.l3.copy()
+                x = actual.x
+                actual2 = iop(actual, other)
+                self.assert_(actual2 is actual, msg)
+                ale(actual, desired, msg)
+                if oname != 'unaligned larry':
+                    self.assert_(actual.x is x, msg + ' (buffer not reused)')
+
+    def test_inplace_2(self):
+        "larry in-place operators_2"
+        y = larry([1, 2], [['a', 'b']])
+        y += larry([0.5, 1.5], [['b', 'c']])
+        ale(y, larry([2.5], [['b']]), "int += float failed")
+        y = larry([1, 2], [['a', 'b']])
+        y2 = y
+        y2 += 1
+        ale(y, larry([2, 3], [['a', 'b']]), "in place += failed")
+        y = larry([1.0, 2.0], [['a', 'b']])
+        z = y.copy()
+        z += y
+        ale(y, larry([1.0, 2.0], [['a', 'b']]), "reference found")
+        self.failUnlessRaises(TypeError, y.__iadd__, 'a')
+        self.failUnlessRaises(IndexError, y.__iadd__, self.l1)
+
+    def test_broadcast_1(self):
+        "larry broadcasting binary operators_1"
+        x = np.arange(12.0).reshape(3, 4)
+        panel = larry(x, [['a', 'b', 'c'], [1, 2, 3, 4]])
+        bench = larry([40.0, 10, 20, 30, 50], [[4, 1, 2, 3, 0]])
+        b = np.array([10.0, 20, 30, 40])
+        ops = [('+', lambda p, b: p + b, np.add),
+               ('-', lambda p, b: p - b, np.subtract),
+               ('r-', lambda p, b: b - p, lambda p, b: b - p),
+               ('*', lambda p, b: p * b, np.multiply),
+               ('/', lambda p, b: p / b, np.divide),
+               ('<', lambda p, b: p < b, np.less)]
+        for name, op, func in ops:
+            msg = "broadcasting %s failed" % name
+            actual = op(panel, bench)
+            desired = larry(func(x, b), [['a', 'b', 'c'], [1, 2, 3, 4]])
+            ale(actual, desired, msg, original=panel)
+        # Labels of the row axis
+        rows = larry([1.0, 2.0], [['c', 'a']])
+        actual = panel * rows
+        desired = larry(x[[0, 2]] * [[2.0], [1.0]], [['a', 'c'], [1, 2, 3, 4]])
+        ale(actual, desired, "broadcasting along rows failed")
+        # In place
+        y = panel.copy()
+        y -= bench
+        desired = larry(x - b, [['a', 'b', 'c'], [1, 2, 3, 4]])
+        ale(y, desired, "in-place broadcasting failed")
+        
+    def test_broadcast_2(self):
+        "larry broadcasting binary operators_2"
+        y = larry(np.ones((2, 3, 4)), [['a', 'b'], [1, 2, 3], [5, 6, 7, 8]])
+        # Axes of z (labels 5..8 and 1..3) line up with axes 2 and 1 of y
+        z = larry(np.arange(12.0).reshape(4, 3), [[5, 6, 7, 8], [1, 2, 3]])
+        actual = y + z
+        desired = larry(y.x + z.x.T, y.label)
+        ale(actual, desired, "broadcasting with transposed axes failed")
+        # Ambiguous axes
+        sq = larry(np.ones((2, 2)))
+        self.failUnlessRaises(IndexError, sq.__add__, larry([1.0, 2.0]))
+        self.failUnlessRaises(IndexError, larry([1.0]).__iadd__, sq)
+
 
 class Test_reduce(unittest.TestCase):
     "Test reducing functions of the larry class"
@@ -1095,6 +1173,150 @@ class Test_reduce(unittest.TestCase):
         self.assert_(noreference(p, t), 'Reference found')                        
 
         
+class Test_out(unittest.TestCase):
+    "Test the out argument of larry methods"
+
+    def setUp(self):
+        self.lar = larry([[1.0, nan, 3.0], [4.0, 5.0, 6.0]],
+                         [['a', 'b'], [1, 2, 3]])
+
+    def test_out_1(self):
+        "larry out_1"
+        lar = self.lar
+        funcs = [('log', lambda y, **kw: y.log(**kw)),
+                 ('exp', lambda y, **kw: y.exp(**kw)),
+                 ('sqrt', lambda y, **kw: y.sqrt(**kw)),
+                 ('power', lambda y, **kw: y.power(2, **kw)),
+                 ('abs', lambda y, **kw: (-y).abs(**kw)),
+                 ('clip', lambda y, **kw: y.clip(2, 4, **kw)),
+                 ('cumsum', lambda y, **kw: y.cumsum(1, **kw)),
+                 ('demean', lambda y, **kw: y.demean(1, **kw)),
+                 ('zscore', lambda y, **kw: y.zscore(1, **kw)),
+                 ('push', lambda y, **kw: y.push(1, **kw))]
+        for name, func in funcs:
+            msg = "out failed on %s" % name
+            desired = func(lar)
+            out = lar.copy()
+            out.x.fill(0)
+            x = out.x
+            actual = func(lar, out=out)
+            self.assert_(actual is out, msg)
+            self.assert_(actual.x is x, msg)
+            ale(actual, desired, msg, original=lar)
+            x = np.zeros(lar.shape)
+            actual = func(lar, out=x)
+            self.assert_(actual.x is x, msg)
+            ale(actual, desired, msg, original=lar)
+
+    def test_out_2(self):
+        "larry out_2"
+        lar = self.lar
+        funcs = ['sum', 'prod', 'mean', 'median', 'std', 'var', 'max', 'min']
+        for name in funcs:
+            msg = "out failed on %s" % name
+            for axis in (0, 1):
+                desired = getattr(lar, name)(axis)
+                out = nan * desired
+                x = out.x
+                actual = getattr(lar, name)(axis, out=out)
+                self.assert_(actual is out, msg)
+                self.assert_(actual.x is x, msg)
+                ale(actual, desired, msg, original=lar)
+            assert_raises(ValueError, getattr(lar, name), out=out)
+
+    def test_out_3(self):
+        "larry out_3"
+        lar = self.lar
+        out = lar.copy()
+        lar.log(out=lar)
+        ale(lar, out.log(), "out is self failed")
+        y = larry([[1.0, nan, nan], [nan, 5.0, nan]])
+        desired = y.push(1)
+        y.push(1, out=y)
+        ale(y, desired, "push in place failed")
+        assert_raises(ValueError, lar.log, out=larry(np.ones((2, 3))))
+        assert_raises(ValueError, lar.log, out=np.ones((3, 2)))
+        assert_raises(TypeError, lar.log, out=[1.0, 2.0])
+        assert_raises(ValueError, lar.sum, 0, out=lar)
+
+
+class Test_threads(unittest.TestCase):
+    "Test element-wise larry methods with multithreading on"
+
+    def setUp(self):
+        x = np.random.randn(41, 7)
+        x[x > 1.2] = nan
+        self.lar1 = larry(x)
+        self.lar2 = larry(np.random.randn(43, 7))[::-1]
+        la.set_num_threads(4, threshold=0)
+
+    def tearDown(self):
+        la.set_num_threads(1, threshold=1 << 18)
+
+    def test_threads_1(self):
+        "larry threads_1"
+        y1 = self.lar1
+        y2 = self.lar2
+        funcs = [('log', lambda a, b: abs(a).log()),
+                 ('exp', lambda a, b: a.exp()),
+                 ('sqrt', lambda a, b: abs(a).sqrt()),
+                 ('sign', lambda a, b: a.sign()),
+                 ('power', lambda a, b: a.power(3)),
+                 ('neg', lambda a, b: -a),
+                 ('clip', lambda a, b: a.clip(-1, 0.5)),
+                 ('isnan', lambda a, b: a.isnan()),
+                 ('nan_replace', lambda a, b: a.nan_replace(-1)),
+                 ('add', lambda a, b: a + b),
+                 ('sub', lambda a, b: 1 - a),
+                 ('mul', lambda a, b: a * b.x[2:]),
+                 ('div', lambda a, b: a / b),
+                 ('and', lambda a, b: (a > 0) & (b > 0)),
+                 ('compare', lambda a, b: a <= b),
+                 ('compare scalar', lambda a, b: a == 0.5),
+                 ('iadd', lambda a, b: _iadd(a.copy(), b)),
+                 ('binaryop', lambda a, b: la.binaryop(np.maximum, a, b,
+                                                       join='outer')),
+                 ('add missone', lambda a, b: la.add(a, b, join='outer',
+                                                     missone=0))]
+        for name, func in funcs:
+            msg = "multithreaded %s failed" % name
+            la.set_num_threads(1)
+            desired = func(y1, y2)
+            la.set_num_threads(4)
+            actual = func(y1, y2)
+            ale(actual, desired, msg, original=y1)
+
+    def test_threads_2(self):
+        "larry threads_2"
+        # Without threads the ufunc is called by larry so its warnings
+        # point to larry and not to la.farray.parallel
+        import warnings
+        from la.farray import parallel
+        source = parallel.__file__.rstrip('co')
+        funcs = [('log', lambda a: a.log()),
+                 ('div', lambda a: a / 0),
+                 ('rdiv', lambda a: 0 / a),
+                 ('add', lambda a: la.add(a, a.log()))]
+        for n, threshold in [(1, 0), (4, 1 << 18)]:
+            la.set_num_threads(n, threshold=threshold)
+            for name, func in funcs:
+                msg = "%s warning, %d threads, failed" % (name, n)
+                with warnings.catch_warnings(record=True) as w:
+                    warnings.simplefilter('always')
+                    with np.errstate(divide='warn', invalid='warn'):
+                        func(larry([-1.0, 0.0]))
+                self.assert_(len(w) > 0, msg)
+                for warning in w:
+                    self.assert_(issubclass(warning.category, RuntimeWarning),
+                                 msg)
+                    filename = warning.filename.rstrip('co')
+                    self.assertNotEqual(filename, source, msg)
+
+def _iadd(a, b):
+    "a += b"
+    a += b
+    return a
+
 class Test_comparison(unittest.TestCase):
     "Test comparison functions of the larry class"
     
@@ -2892,7 +3114,37 @@ class Test_alignment(unittest.TestCase):
         self.assert_(label == p.label, printfail(label, p.label, 'label'))
         self.assert_(noreference(p, self.l), 'Reference found')
         self.assert_(noreference(p, self.l2), 'Reference found')         
-        
+
+    def test_morph_like_2(self):
+        "larry.morph_like_2"
+        # morph_like takes all axes in one pass; compare with morph
+        original = la.larry(np.arange(24).reshape(2, 3, 4))
+        lar = la.larry(np.ones((3, 3, 2)), [[1, 0, 5], [0, 1, 2], [3, 0]])
+        actual = original.morph_like(lar)
+        desired = original
+        for ax in range(3):
+            desired = desired.morph(lar.getlabel(ax), ax)
+        ale(actual, desired, "3d morph_like", original=original)
+        actual = original.morph_like(original)
+        ale(actual, original, "morph_like itself", original=original)
+        lar = la.larry(np.ones((1, 3, 4)), [[7], [0, 1, 2], [0, 1, 2, 3]])
+        actual = original.morph_like(lar)
+        desired = la.larry(np.nan * np.ones((1, 3, 4)), lar.copylabel())
+        ale(actual, desired, "morph_like all missing", original=original)
+
+    def test_morph_like_3(self):
+        "larry.morph_like_3"
+        # morph_like reads the labels of lar without exposing them, so lar
+        # can still share its labels copy on write
+        original = la.larry(np.arange(6).reshape(2, 3))
+        for label in ([[0, 1], [0, 1, 2]], [[1, 0], [0, 1, 2]]):
+            lar = la.larry(np.ones((2, 3)), label)
+            actual = original.morph_like(lar)
+            desired = original.morph(label[0], 0)
+            ale(actual, desired, "morph_like", original=original)
+            self.assert_(not lar._exposed, "morph_like exposed the label")
+            self.assert_(noreference(actual, lar), 'Reference found')
+
     def test_lag_1(self):
         "larry.lag_1"
         t = np.array([[nan], [2], [4.0/3.0]])
@@ -3628,3 +3880,51 @@ def take_test():
                 ygetitem = y[tuple(index)]
                 arg = (str(shape), str(axis), str(idx))
                 yield ale, ytake, ygetitem, msg % arg
+
+# verified unique labels ----------------------------------------------------
+
+# Labels made by larry methods remember that they are unique so they are not
+# checked again.
+
+def larry_unique_test():
+    "larry verified unique label test"
+    msg = "verified unique label failed: %s"
+    y = larry([[1.0, 2.0], [3.0, 4.0]], [['a', 'b'], ['c', 'd']])
+    funcs = [('slice', lambda y: y[1:]),
+             ('slice 2d', lambda y: y[:, ::-1]),
+             ('take', lambda y: y.take([1, 0], 0)),
+             ('list index', lambda y: y[[1, 0]]),
+             ('morph', lambda y: y.morph(['b', 'a'], 0)),
+             ('sortaxis', lambda y: y.sortaxis(reverse=True)),
+             ('add', lambda y: y + y[::-1])]
+    for name, func in funcs:
+        z = func(y)
+        for lab in z.label:
+            yield assert_equal, lab._unique or lab._issorted, True, msg % name
+        z = larry(z.x, z.label)
+        yield ale, z, func(y), msg % name
+    assert_raises(ValueError, larry, [1, 2], [['a', 'a']])
+    assert_raises(IndexError, y.take, [1, 1], 0)
+    assert_raises(IndexError, y.morph, ['a', 'a'], 0)
+    label = y.label[0][:]
+    label[1] = 'a'
+    assert_raises(ValueError, larry, [1, 2], [label])
+
+def larry_list_label_test():
+    "larry with a plain list assigned as a label test"
+    msg = "plain list label failed: %s"
+    y = larry([[1.0, 2.0, 3.0], [4.0, 5.0, 6.0]])
+    y.label[1] = ['c', 'a', 'b']
+    z = y.sortaxis()
+    yield assert_equal, z.label, [[0, 1], ['a', 'b', 'c']], msg % 'sortaxis'
+    yield assert_equal, z.x, [[2.0, 3.0, 1.0], [5.0, 6.0, 4.0]], \
+                                                         msg % 'sortaxis'
+    z = y.flipaxis()
+    yield assert_equal, z.label, [[1, 0], ['b', 'a', 'c']], msg % 'flipaxis'
+    y.label = [['b', 'a'], ['c', 'a', 'b']]
+    z = y.sortaxis(reverse=True)
+    yield assert_equal, z.label, [['b', 'a'], ['c', 'b', 'a']], \
+                                                         msg % 'sortaxis'
+    z = y.flipaxis(0)
+    yield assert_equal, z.label, [['a', 'b'], ['c', 'a', 'b']], \
+                                                         msg % 'flipaxis'
@@ -0,0 +1,121 @@
+"lazy unit tests."
+
+import numpy as np
+from numpy.testing import assert_equal, assert_raises
+
+from la import larry, lazy
+from la.deflazy import CHUNKSIZE
+from la.util.testing import assert_larry_equal as ale
+
+
+def lar(shape, labels):
+    "larry of random data with labels picked from the given lists"
+    x = np.random.randn(*shape)
+    x[x > 1.5] = np.nan
+    label = [np.random.permutation(l)[:n].tolist() for l, n in
+                                                         zip(labels, shape)]
+    return larry(x, label)
+
+def expressions(a, b, c, d):
+    "Pairs of (lazy, eager) functions"
+    funcs = [('(a - b) / c * d', lambda a, b, c, d: (a - b) / c * d),
+             ('a + a', lambda a, b, c, d: a + a),
+             ('-a * 2 + b', lambda a, b, c, d: -a * 2 + b),
+             ('2 - a / b', lambda a, b, c, d: 2 - a / b),
+             ('1 / (a + c)', lambda a, b, c, d: 1 / (a + c)),
+             ('abs(a - d).log()', lambda a, b, c, d: abs(a - d).log()),
+             ('(a * b).sqrt() ** 2', lambda a, b, c, d: (a * b).sqrt() ** 2),
+             ('a.exp() - b.power(3)',
+              lambda a, b, c, d: a.exp() - b.power(3))]
+    return funcs
+
+def lazy_test():
+    "lazy test"
+    labels = [range(8), list('abcdefgh'), range(5)]
+    msg = "lazy failed on %s with shape %s"
+    for shape in [(6,), (6, 7), (6, 7, 4)]:
+        a = lar(shape, labels)
+        b = lar(shape, labels)
+        c = lar(shape, labels)
+        d = lar(shape, labels)
+        for name, func in expressions(a, b, c, d):
+            with np.errstate(invalid='ignore', divide='ignore'):
+                desired = func(a, b, c, d)
+                actual = func(lazy(a), b, c, d).evaluate()
+            yield ale, actual, desired, msg % (name, shape)
+            # Bitwise identical
+            yield (assert_equal, actual.x.view(np.uint8),
+                   desired.x.view(np.uint8), msg % (name, shape))
+
+def lazy_broadcast_test():
+    "lazy test with larrys of different dimensions"
+    labels = [range(8), list('abcdefgh'), list('vwxyz')]
+    msg = "lazy broadcast failed on %s with shapes %s"
+    for shapes in [((6, 7), (6,)), ((6, 7), (7,)), ((6, 7, 4), (7,)),
+                   ((6, 7, 4), (6, 7)), ((6, 7, 4), (7, 4))]:
+        big = lar(shapes[0], labels)
+        if len(shapes[1]) == 1 and shapes[1][0] == 7:
+            small = lar(shapes[1], labels[1:2])
+        elif shapes[1] == (7, 4):
+            small = lar(shapes[1], labels[1:])
+        else:
+            small = lar(shapes[1], labels)
+        pairs = [('big + small', big, small), ('small + big', small, big),
+                 ('big * big', big, big), ('small - small', small, small)]
+        for name, a, b in pairs:
+            for fname, func in expressions(a, b, big, small)[:5]:
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    desired = func(a, b, big, small)
+                    actual = func(lazy(a), b, big, small).evaluate()
+                yield ale, actual, desired, msg % (name + ': ' + fname,
+                                                   shapes)
+    # The eager expression works so the lazy one does too
+    a = larry([1.0, 2.0])
+    b = larry([[1.0, 2.0]])
+    ale((lazy(a) + b).evaluate(), a + b, msg % ('a + b', ((2,), (1, 2))))
+
+def lazy_blocks_test():
+    "lazy test with many blocks"
+    n = CHUNKSIZE // 10 + 5
+    a = larry(np.random.rand(n, 30))
+    b = larry(np.random.rand(n + 1, 30))[::-1]
+    c = larry(np.arange(n * 30).reshape(n, 30))
+    desired = (a + b) * c - 1
+    actual = ((lazy(a) + b) * c - 1).evaluate()
+    ale(actual, desired, "lazy failed with many blocks")
+    # Broadcast along the rows and along the columns
+    a.label[1] = list('abcdefghijklmnopqrstuvwxyz0123')
+    rows = larry(np.random.rand(n + 2), [range(-2, n)])[::-1]
+    cols = larry(np.random.rand(30), [a.label[1][::-1]])
+    desired = (a - rows) / cols
+    actual = ((lazy(a) - rows) / cols).evaluate()
+    ale(actual, desired, "lazy broadcast failed with many blocks")
+
+def lazy_dtype_test():
+    "lazy dtype test"
+    a = larry([1, 2, 3])
+    b = larry([2, 2], [[1, 2]])
+    msg = "lazy dtype failed on %s"
+    for name, func in [('int', lambda a, b: a * b - 1),
+                       ('int div', lambda a, b: a / b),
+                       ('float', lambda a, b: a * b - 1.5)]:
+        desired = func(a, b)
+        actual = func(lazy(a), b).evaluate()
+        yield ale, actual, desired, msg % name
+        yield assert_equal, actual.dtype, desired.dtype, msg % name
+
+def lazy_cow_test():
+    "lazy copy-on-write test"
+    a = larry([1.0, 2.0], [['a', 'b']])
+    y = (lazy(a) + 1).evaluate()
+    y.label[0].append('c')
+    assert_equal(a.label, [['a', 'b']], 'lazy label is a reference')
+
+def lazy_raises_test():
+    "lazy raises test"
+    a = larry([1.0, 2.0])
+    b = larry([[1.0, 2.0], [3.0, 4.0]])
+    assert_raises(TypeError, lazy, [1, 2])
+    assert_raises(TypeError, lazy(a).__add__, [1, 2])
+    # Cannot tell which axis of b to broadcast a along
+    assert_raises(IndexError, (lazy(a) + b).evaluate)
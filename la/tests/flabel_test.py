@@ -1,9 +1,12 @@
 "flabel (list of lists) unit tests."
  
 import numpy as np
-from numpy.testing import assert_equal
+from numpy.testing import assert_equal, assert_raises
 
-from la.flabel import listmap, listmap_fill         
+from la.deflabel import Label, ArrayLabel, RangeLabel, labelcopy
+from la.flabel import (listmap, listmap_fill, mergejoin, issorted,
+                       listmap_array, listmap_fill_array, labelmap_fill,
+                       joinlabel)
 
 # ---------------------------------------------------------------------------
 
@@ -70,3 +73,195 @@ def listmap_fill_unmappable_test():
     msg = "listmap_fill failed on list1=%s and list2=%s"
     yield assert_equal, idx, idx2, msg % (list1, list2)
     yield assert_equal, idx_unmappable, idx2_unmappable, msg % (list1, list2)
+
+# ---------------------------------------------------------------------------
+
+# mergejoin unit tests
+
+def mergejoin_test():
+    "mergejoin test"
+    # mergejoin should give the same output as joining with sets and mapping
+    # the joined list with listmap_fill
+    msg = "mergejoin failed on list1=%s, list2=%s, join=%s"
+    for i in range(50):
+        list1 = sorted(set(np.random.randint(0, 20, 10).tolist()))
+        list2 = sorted(set(np.random.randint(0, 20, 10).tolist()))
+        for join in ('inner', 'outer', 'left', 'right'):
+            if join == 'inner':
+                list3 = sorted(set(list1).intersection(list2))
+            elif join == 'outer':
+                list3 = sorted(set(list1).union(list2))
+            elif join == 'left':
+                list3 = list1
+            elif join == 'right':
+                list3 = list2
+            idx1, idx1_miss = listmap_fill(list1, list3, fill=-1)
+            idx2, idx2_miss = listmap_fill(list2, list3, fill=-1)
+            desired = (list3, idx1, idx1_miss, idx2, idx2_miss)
+            actual = mergejoin(list1, list2, join, fill=-1)
+            yield assert_equal, actual, desired, msg % (list1, list2, join)
+
+class CountLabel(Label):
+    "Label that counts the calls of __getitem__"
+    calls = 0
+    def __getitem__(self, index):
+        CountLabel.calls += 1
+        return Label.__getitem__(self, index)
+
+def mergejoin_label_test():
+    "mergejoin Label indexing test"
+    # Indexing a Label one element at a time calls Python code; mergejoin
+    # must not do it or it is slower than joining with sets
+    msg = "mergejoin indexed a Label %d times, join=%s"
+    list1 = CountLabel(range(0, 1000, 2))
+    list2 = CountLabel(range(0, 1000, 3))
+    for join in ('inner', 'outer', 'left', 'right'):
+        CountLabel.calls = 0
+        actual = mergejoin(list1, list2, join, fill=-1)
+        desired = mergejoin(list(list1), list(list2), join, fill=-1)
+        yield assert_equal, actual, desired, "mergejoin failed"
+        yield (assert_equal, CountLabel.calls, 0,
+               msg % (CountLabel.calls, join))
+
+def joinlabel_incomparable_test():
+    "joinlabel of sorted labels whose elements cannot be compared test"
+    import datetime
+    from la import larry, align
+    msg = "joinlabel failed on dates and ints, join=%s"
+    dates = [datetime.date(2010, 1, i) for i in (1, 2, 3)]
+    ints = [1, 2, 3]
+    miss = [-1, -1, -1]
+    for join, desired in [('inner', ([], [], [], [], [])),
+                          ('left', (dates, [0, 1, 2], [], miss, [0, 1, 2])),
+                          ('right', (ints, miss, [0, 1, 2], [0, 1, 2], []))]:
+        actual = joinlabel(Label(dates), Label(ints), join, fill=-1)
+        yield assert_equal, actual, desired, msg % join
+    y1 = larry([1.0, 2.0, 3.0], [dates])
+    y2 = larry([1.0, 2.0, 3.0], [ints])
+    yield assert_equal, (y1 + y2).shape, (0,), msg % 'inner (add)'
+    a1, a2 = align(y1, y2, 'inner')
+    yield assert_equal, (a1.shape, a2.shape), ((0,), (0,)), \
+                                                    msg % 'inner (align)'
+
+def listmap_array_test():
+    "listmap_array test"
+    msg = "listmap_array failed on list1=%s and list2=%s"
+    for i in range(20):
+        list1 = np.random.permutation(10).tolist()
+        list2 = np.random.randint(0, 15, 8).tolist()
+        for dtype in (np.int64, np.float64):
+            a1 = np.array(list1, dtype=dtype)
+            a2 = np.array(list2, dtype=dtype)
+            actual = listmap_array(a1, a2, ignore_unmappable=True)
+            desired = listmap(list1, list2, ignore_unmappable=True)
+            yield assert_equal, actual, desired, msg % (list1, list2)
+            yield assert_equal, actual.dtype, np.intp, msg % (list1, list2)
+            actual = listmap_fill_array(a1, a2, fill=-1)
+            desired = listmap_fill(list1, list2, fill=-1)
+            yield assert_equal, actual, desired, msg % (list1, list2)
+    assert_raises(KeyError, listmap_array, [1, 2], [3])
+
+def labelmap_fill_test():
+    "labelmap_fill test"
+    msg = "labelmap_fill failed on list1=%s and list2=%s"
+    for list1, list2 in [([3, 1, 2], [1, 4]), ([1.5, 0.5], [0.5, 1.0]),
+                         (['a', 'b'], ['b', 'c']), ([1, 2.0], [2, 3]),
+                         ([1, 2], ['a', 2])]:
+        actual = labelmap_fill(Label(list1), list2, fill=-1)
+        desired = listmap_fill(list1, list2, fill=-1)
+        yield assert_equal, actual, desired, msg % (list1, list2)
+
+def numericjoin_test():
+    "joinlabel of numeric Labels test"
+    msg = "joinlabel failed on list1=%s, list2=%s, join=%s"
+    for list1, list2 in [([3, 1, 2], [2, 4, 3]), ([0.5, 2.5], [2.5, 1.5])]:
+        for join in ('inner', 'outer', 'left', 'right'):
+            actual = joinlabel(Label(list1), Label(list2), join, fill=-1)
+            desired = joinlabel(list1, list2, join, fill=-1)
+            yield assert_equal, actual, desired, msg % (list1, list2, join)
+            types = (map(type, actual[0]), map(type, desired[0]))
+            yield assert_equal, types[0], types[1], msg % (list1, list2, join)
+
+def issorted_test():
+    "issorted test"
+    msg = "issorted failed on %s"
+    for label, desired in [([], True), ([1], True), ([1, 2], True),
+                           ([2, 1], False), ([1, 1], False),
+                           (['a', 'b'], True), ([1, 'a', (1,)], True)]:
+        yield assert_equal, issorted(label), desired, msg % label
+
+# ---------------------------------------------------------------------------
+
+# align_cache unit tests
+
+def align_cache_test():
+    "align_cache test"
+    from la import larry, add
+    from la.util.testing import assert_larry_equal as ale
+    from la.flabel import align_cache
+    align_cache.enable(maxsize=2)
+    try:
+        y1 = larry([1, 2, 3], [['a', 'b', 'c']])
+        y2 = larry([1, 2], [['c', 'a']])
+        desired = larry([3, 4], [['a', 'c']])
+        ale(y1 + y2, desired, 'align_cache miss')
+        assert_equal((align_cache.hits, align_cache.misses), (0, 1),
+                     'align_cache hits and misses')
+        ale(y1 + y2.copy(), desired, 'align_cache hit')
+        ale(add(y1, y2), desired, 'align_cache hit')
+        assert_equal((align_cache.hits, align_cache.misses), (2, 1),
+                     'align_cache hits and misses')
+        # A changed label must not use a stale plan
+        y2.label[0].reverse()
+        ale(y1 + y2, larry([2, 5], [['a', 'c']]), 'align_cache stale')
+        # The result's label is not the cached label
+        z = y1 + y2
+        z.label[0].append('d')
+        ale(y1 + y2, larry([2, 5], [['a', 'c']]), 'align_cache changed')
+        # Size is bounded
+        for i in range(5):
+            y1 + larry([1], [[i]])
+        assert_equal(len(align_cache), 2, 'align_cache size')
+        # The indices handed out are read-only; the label is a copy
+        align_cache.clear()
+        for i in range(3):
+            list3, idx1, idx1_miss, idx2, idx2_miss = joinlabel(
+                                       ['a', 'b', 'c'], ['d', 'a'], 'outer')
+            assert_equal((list3, idx1, idx1_miss, idx2, idx2_miss),
+                         (['a', 'b', 'c', 'd'], [0, 1, 2, 0], [3],
+                          [1, 0, 0, 0], [1, 2]), 'align_cache indices')
+            assert_raises(ValueError, idx1.__setitem__, 0, 99)
+            assert_raises(ValueError, idx2_miss.sort)
+            list3.append('e')
+        assert_equal(align_cache.hits, 2, 'align_cache hits')
+        # A hit on the label objects the plan was stored for does not look
+        # at the stored copy of the labels (None here) unless the label was
+        # changed in place
+        from la.flabel import _storedlabel, _isstored
+        for label in (Label(['a', 'b']), ArrayLabel([1, 2]), RangeLabel(2)):
+            obj, version, copy = _storedlabel(label)
+            assert_equal(_isstored(label, (obj, version, None)), True,
+                         'align_cache identity hit')
+            assert_equal(_isstored(labelcopy(label), (obj, version, copy)),
+                         True, 'align_cache hit on a copy')
+        label = Label([1, 2])
+        stored = _storedlabel(label)
+        label[0] = 1.0
+        assert_equal(_isstored(label, stored), False,
+                     'align_cache changed label')
+        label[0] = 1
+        assert_equal(_isstored(label, stored), True,
+                     'align_cache restored label')
+        # Labels that are equal but whose elements have other types do not
+        # share a plan
+        z = larry([1, 2], [[1, 2]]) + larry([1, 2], [[1, 2]])
+        z = larry([1, 2], [[1.0, 2.0]]) + larry([1, 2], [[2.0, 1.0]])
+        assert_equal(map(type, z.label[0]), [float, float],
+                     'align_cache label type')
+        z = larry([1, 2], [[2, 1]]) + larry([1, 2], [[1, 2]])
+        z = larry([1, 2], [[2.0, 1.0]]) + larry([1, 2], [[1.0, 2.0]])
+        assert_equal(map(type, z.label[0]), [float, float],
+                     'align_cache label type')
+    finally:
+        align_cache.disable()
+    assert_equal(len(align_cache), 0, 'align_cache disable')
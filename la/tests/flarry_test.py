@@ -8,9 +8,11 @@ nan = np.nan
 from numpy.testing import assert_array_equal
 
 from la import larry, rand
-from la import (union, intersection, panel, stack, cov, align, isaligned,
+from la import (union, intersection, panel, stack, cov, corr, align,
+                isaligned,
                 binaryop, add, subtract, multiply, divide, unique, sortby,
-                align_axis, lrange, ones, zeros, empty)
+                align_axis, lrange, ones, zeros, empty, nansum_many,
+                nanmean_many)
 from la.util.testing import assert_larry_equal as ale
 
 
@@ -159,6 +161,34 @@ class Test_func(unittest.TestCase):
         actual = cov(original)
         ale(actual, desired, msg='cov test #2', original=original) 
 
+    def test_cov_3(self):
+        "func.cov_3"
+        original = larry([[nan, 2.0, 1.0, 3.0],
+                          [2.0, 3.0, 1.0, nan],
+                          [4.0, 1.0, 1.0, 2.0]], [['a', 'b', 'c'], range(4)])
+        desired = cov(original)
+        actual = cov(original, memory=1)
+        ale(actual, desired, msg='cov test #3', original=original)
+        self.assert_(actual.label == [['a', 'b', 'c']] * 2, 'cov label')
+
+    def test_corr_1(self):
+        "func.corr_1"
+        original = larry([[nan, 2.0, 1.0, 3.0],
+                          [2.0, 3.0, 1.0, nan],
+                          [4.0, 1.0, 1.0, 2.0]], [['a', 'b', 'c'], range(4)])
+        x = original.x
+        desired = np.ones((3, 3))
+        for i in range(3):
+            for j in range(3):
+                idx = ~np.isnan(x[i] + x[j])
+                desired[i, j] = np.corrcoef(x[i, idx], x[j, idx])[0, 1]
+        desired = larry(desired, [['a', 'b', 'c'], ['a', 'b', 'c']])
+        actual = corr(original)
+        ale(actual, desired, msg='corr test #1', original=original)
+        actual = corr(original, memory=1)
+        ale(actual, desired, msg='corr test #2', original=original)
+        self.assertRaises(ValueError, corr, larry([1.0, 2.0]))
+
     def test_unique_1(self):
         arr = unique(larry([1, 1, 2, 2, 3, 3]))
         assert_array_equal(arr, np.array([1, 2, 3]), "la.unique failed")
@@ -516,6 +546,58 @@ class Test_align_2d(unittest.TestCase):
         ale(a1, d1, msg % 'left', original=y1)
         ale(a2, d2, msg % 'right', original=y2)            
 
+    def test_2d12(self):
+        "align 2d test #12"
+        # Sorted labels are joined with a merge join; compare with morph
+        y1 = larry([[1, 2, 3], [4, 5, 6]], [['a', 'c'], [1, 3, 4]])
+        y2 = larry([[1, 2], [3, 4], [5, 6]], [['b', 'c', 'd'], [2, 3]])
+        msg = "align 2d fail on %s larry with join='%s'"
+        for join in ('inner', 'outer', 'left', 'right'):
+            a1, a2 = align(y1, y2, join)
+            if join == 'inner':
+                label = [sorted(set(l1) & set(l2)) for l1, l2 in
+                                                  zip(y1.label, y2.label)]
+            elif join == 'outer':
+                label = [sorted(set(l1) | set(l2)) for l1, l2 in
+                                                  zip(y1.label, y2.label)]
+            elif join == 'left':
+                label = y1.copylabel()
+            elif join == 'right':
+                label = y2.copylabel()
+            d1 = y1.morph(label[0], 0).morph(label[1], 1)
+            d2 = y2.morph(label[0], 0).morph(label[1], 1)
+            ale(a1, d1, msg % ('left', join), original=y1)
+            ale(a2, d2, msg % ('right', join), original=y2)
+
+    def test_2d13(self):
+        "align 3d test #13"
+        # All axes are taken in one pass; compare with morph
+        y1 = larry(np.arange(24.0).reshape(2, 3, 4))
+        y2 = larry(np.ones((3, 3, 2), dtype=int), [[1, 0, 5], [0, 1, 2],
+                                                   [3, 0]])
+        msg = "align 3d fail on %s larry with join='%s'"
+        for join in ('inner', 'outer', 'left', 'right'):
+            a1, a2 = align(y1, y2, join)
+            if join == 'inner':
+                label = [sorted(set(l1) & set(l2)) for l1, l2 in
+                                                  zip(y1.label, y2.label)]
+            elif join == 'outer':
+                label = [sorted(set(l1) | set(l2)) for l1, l2 in
+                                                  zip(y1.label, y2.label)]
+            elif join == 'left':
+                label = y1.copylabel()
+            elif join == 'right':
+                label = y2.copylabel()
+            d1 = y1
+            d2 = y2
+            for ax in range(3):
+                d1 = d1.morph(label[ax], ax)
+                d2 = d2.morph(label[ax], ax)
+            ale(a1, d1, msg % ('left', join), original=y1)
+            ale(a2, d2, msg % ('right', join), original=y2)
+            if join == 'inner':
+                ale(y1 + y2, d1 + d2, 'add 3d fail', original=y1)
+
 class Test_align_axis(unittest.TestCase):
     "Test align_axis on larrys"
 
@@ -957,6 +1039,82 @@ class Test_binaryop(unittest.TestCase):
         ale(actual, desired, msg, original=y1)
         ale(actual, desired, msg, original=y2) 
 
+    def test_binaryop_23(self):
+        "binaryop test #23"
+        # The fill of add, subtract, multiply, and divide is done block by
+        # block; compare with the fill of any other function
+        from la.flarry import _BLOCKSIZE
+        n = _BLOCKSIZE // 10 + 3
+        x1 = np.random.randn(n, 20)
+        x1[x1 > 1] = nan
+        x2 = np.random.randn(n + 2, 20)
+        x2[x2 > 1] = nan
+        y1 = larry(x1)
+        y2 = larry(x2)[::-1]
+        y3 = larry(x1[:, :5].astype(np.float32))
+        msg = "binaryop failed with %s, missone=%s, misstwo=%s"
+        funcs = [np.add, np.subtract, np.multiply, np.divide]
+        for func in funcs:
+            for missone, misstwo in [(0, 0), (1, 'ignore'), ('ignore', 2)]:
+                for join in ('inner', 'outer'):
+                    for lar in (y2, y3):
+                        desired = binaryop(lambda a, b: func(a, b), y1, lar,
+                                           join, missone=missone,
+                                           misstwo=misstwo)
+                        actual = binaryop(func, y1, lar, join,
+                                          missone=missone, misstwo=misstwo)
+                        ale(actual, desired,
+                            msg % (func.__name__, missone, misstwo),
+                            original=y1)
+
+    def test_binaryop_24(self):
+        "binaryop test #24"
+        # Filling missing values must not change the input larrys
+        y1 = larry([1.0, nan, nan])
+        y2 = larry([nan, 2.0, nan])
+        for func in (np.add, np.maximum):
+            actual = binaryop(func, y1, y2, missone=0, misstwo=0)
+            desired = larry([1.0, 2.0, 0.0])
+            msg = "binaryop failed with %s" % func.__name__
+            ale(actual, desired, msg, original=y1)
+            ale(y1, larry([1.0, nan, nan]), msg + "; input was modified")
+            ale(y2, larry([nan, 2.0, nan]), msg + "; input was modified")
+
+    def test_binaryop_25(self):
+        "binaryop test #25"
+        # Larrys with different number of dimensions
+        y1 = larry([[1.0, 2.0], [3.0, nan]], [['a', 'b'], [1, 2]])
+        y2 = larry([10.0, 20.0], [[2, 3]])
+        actual = binaryop(np.add, y1, y2)
+        desired = larry([[12.0], [nan]], [['a', 'b'], [2]])
+        ale(actual, desired, "broadcast binaryop failed", original=y1)
+        actual = binaryop(np.add, y1, y2, join='outer')
+        desired = larry([[nan, 12.0, nan], [nan, nan, nan]],
+                        [['a', 'b'], [1, 2, 3]])
+        ale(actual, desired, "broadcast outer binaryop failed", original=y1)
+        actual = binaryop(np.subtract, y2, y1, join='outer', missone=0,
+                          misstwo=-1)
+        desired = larry([[-1.0, 8.0, 20.0], [-3.0, 10.0, 20.0]],
+                        [['a', 'b'], [1, 2, 3]])
+        ale(actual, desired, "broadcast fill binaryop failed", original=y1)
+        ale(y2, larry([10.0, 20.0], [[2, 3]]), "binaryop changed input")
+        
+    def test_binaryop_26(self):
+        "binaryop test #26"
+        # The axis to broadcast along cannot be inferred
+        y1 = larry(np.ones((2, 2)))
+        y2 = larry([1.0, 2.0])
+        self.assertRaises(IndexError, binaryop, np.add, y1, y2)
+        actual = binaryop(np.add, y1, y2, broadcast=0)
+        desired = larry([[2.0, 2.0], [3.0, 3.0]])
+        ale(actual, desired, "broadcast=0 failed", original=y1)
+        actual = add(y1, y2, broadcast=-1)
+        desired = larry([[2.0, 3.0], [2.0, 3.0]])
+        ale(actual, desired, "broadcast=-1 failed", original=y1)
+        self.assertRaises(ValueError, binaryop, np.add, y1, y2,
+                          broadcast=[0, 1])
+        self.assertRaises(IndexError, binaryop, np.add, y1, y2, broadcast=2)
+
 class Test_add(unittest.TestCase):
     "Test la.add()"   
 
@@ -1229,6 +1387,91 @@ class Test_divide(unittest.TestCase):
         ale(actual, desired, msg, original=y1)
         ale(actual, desired, msg, original=y2)
                     
+class Test_nansum_many(unittest.TestCase):
+    "Test la.nansum_many() and la.nanmean_many()"
+    
+    def setUp(self):
+        self.y1 = larry([1,   2, nan], [['a', 'b', 'c']])
+        self.y2 = larry([1, nan, nan], [['a', 'b', 'd']])
+        self.y3 = larry([1, 1], [['b', 'd']])
+        
+    def test_nansum_many_01(self):
+        "nansum_many test #01"
+        actual = nansum_many([self.y1, self.y2, self.y3])
+        desired = larry([2, 3, nan, 1], [['a', 'b', 'c', 'd']])
+        msg = "nansum_many failed"
+        ale(actual, desired, msg, original=self.y1)
+        
+    def test_nansum_many_02(self):
+        "nansum_many test #02"
+        kw = {'join': 'outer', 'missone': 0, 'misstwo': 0}
+        lars = [larry(np.random.randn(4, 5)), larry(np.random.rand(3, 6)),
+                larry(np.arange(20).reshape(5, 4))[::-1],
+                larry([[1.0, nan], [nan, nan]], [[1, 7], [0, 3]])]
+        desired = add(lars[0], lars[1], **kw)
+        for lar in lars[2:]:
+            desired = add(desired, lar, **kw)
+        actual = nansum_many(lars, **kw)
+        msg = "nansum_many failed with missone and misstwo"
+        ale(actual, desired, msg)
+        
+    def test_nansum_many_03(self):
+        "nansum_many test #03"
+        lars = [self.y1, self.y2, self.y3]
+        actual = nansum_many(lars, join='inner')
+        desired = larry([3.0], [['b']])
+        ale(actual, desired, "nansum_many failed with inner join")
+        actual = nansum_many(lars, join='left')
+        desired = larry([2.0, 3, nan], [['a', 'b', 'c']])
+        ale(actual, desired, "nansum_many failed with left join")
+        actual = nansum_many(lars, join=['right'])
+        desired = larry([3.0, 1], [['b', 'd']])
+        ale(actual, desired, "nansum_many failed with right join")
+        
+    def test_nansum_many_04(self):
+        "nansum_many test #04"
+        y = larry([[1, 2], [3, 4]], [['a', 'b'], [1, 2]])
+        actual = nansum_many([y, y, y])
+        desired = larry([[3.0, 6], [9, 12]], [['a', 'b'], [1, 2]])
+        ale(actual, desired, "nansum_many failed", original=y)
+
+    def test_nansum_many_05(self):
+        "nansum_many test #05"
+        lars = [larry([[1.0, nan], [nan, nan]], [['a', 'b'], [0, 1]]),
+                larry([[nan, 2.0]], [['c'], [1, 2]]),
+                larry([[3.0, nan], [nan, 4.0]], [['a', 'c'], [0, 2]]),
+                larry([[nan]], [['b'], [2]])]
+        msg = "nansum_many failed with join=%s, missone=%s, misstwo=%s"
+        for join in ('outer', 'inner', 'left'):
+            for missone, misstwo in [(0, 1), (1, 0), (2, 3), (2, 'ignore')]:
+                kw = {'join': join, 'missone': missone, 'misstwo': misstwo}
+                desired = add(lars[0], lars[1], **kw)
+                for lar in lars[2:]:
+                    desired = add(desired, lar, **kw)
+                actual = nansum_many(lars, **kw)
+                ale(actual.sortaxis(), desired.sortaxis(),
+                    msg % (join, missone, misstwo))
+
+    def test_nanmean_many_01(self):
+        "nanmean_many test #01"
+        y2 = larry([3, nan, nan], [['a', 'b', 'd']])
+        actual = nanmean_many([self.y1, y2, self.y3])
+        desired = larry([2, 1.5, nan, 1], [['a', 'b', 'c', 'd']])
+        ale(actual, desired, "nanmean_many failed", original=y2)
+        actual = nanmean_many([self.y1, y2, self.y3], missone=0, misstwo=5)
+        desired = larry([4.0 / 3, 1, 5, 1.0 / 3], [['a', 'b', 'c', 'd']])
+        ale(actual, desired, "nanmean_many failed with missone and misstwo")
+        
+    def test_nansum_many_raises(self):
+        "nansum_many raises test"
+        y = larry([1.0, 2.0])
+        self.assertRaises(ValueError, nansum_many, [])
+        self.assertRaises(TypeError, nansum_many, [y, [1.0, 2.0]])
+        self.assertRaises(ValueError, nansum_many, [y, larry([[1.0]])])
+        self.assertRaises(ValueError, nansum_many, [y, y], join='outside')
+        self.assertRaises(ValueError, nanmean_many, [y], join=['outer'] * 2)
+        self.assertRaises(TypeError, nanmean_many, [larry(['a', 'b'])])
+                    
 class Test_sortby(unittest.TestCase):
     "Test la.sortby()"
     